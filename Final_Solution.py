@@ -5,20 +5,30 @@ proper board configuration to solve the puzzle.
 '''
 
 import numpy as np
-from more_itertools import distinct_permutations as idp
+import contextlib
+import heapq
+import itertools
+import json
+import multiprocessing
+from collections import OrderedDict, deque, namedtuple
 import time
 import os
+import sys
 import glob
+import tempfile
+from Read_in_bff_file import Puzzle, parse_bff, read_bff
 
 
 class Grid:
-    def __init__(self, fname):
+    def __init__(self, fname, metrics=None):
         '''
         A grid class for the lazor puzzle.
 
         **Attributes**
             fname: *str*
-                The file name to read in
+                The file name to read in, None if built from a Puzzle
+            puzzle: *Puzzle*
+                The parsed bff file, see Read_in_bff_file.parse_bff()
             grid: *np.array*
                 Array of lazor grid, with 'o', 'x', and ' ' values
             block_dict: *dictionary*
@@ -30,17 +40,40 @@ class Grid:
             point_dict: *dictionary*
                 A dictionary that contains the goal point number and it's
                 corresponding coordinates.
+            compiled: *CompiledBoard*
+                The open slots and their edge positions, computed once per
+                puzzle, with a reusable board buffer.
+            tracer: *LaserTracer*
+                The transition tables used to trace lasers through the
+                compiled board.
+            metrics: *SolverMetrics*
+                Counters and phase timings, updated by find_solution()
 
         **Parameters**
 
-            fname: *str*
-                The file name to read in
+            fname: *str or Puzzle*
+                The file name to read in, or a Puzzle already parsed from
+                text or bytes with parse_bff()
+            metrics: *SolverMetrics, optional*
+                Where to record counters and timings, for example one with
+                a progress callback. Defaults to a new one.
         '''
-        self.fname = fname
+        self.metrics = metrics if metrics is not None else SolverMetrics()
+        with self.metrics.phase('parse'):
+            if isinstance(fname, Puzzle):
+                self.fname = None
+                self.puzzle = fname
+            else:
+                self.fname = fname
+                self.puzzle = read_bff(fname)
         self.grid = self.get_grid()
         self.block_dict = self.get_blocks()
         self.laser_dict = self.get_laser_pos()
         self.point_dict = self.get_goal_points()
+        with self.metrics.phase('compile'):
+            self.compiled = CompiledBoard(self.grid)
+            self.tracer = LaserTracer(self.compiled, self.laser_dict,
+                                      self.point_dict, self.get_block_types())
 
     def get_grid(self):
         '''
@@ -48,8 +81,8 @@ class Grid:
 
         **Parameters**
 
-            fname: *str*
-                The file name to read in
+            puzzle: *Puzzle*
+                The parsed bff file
 
         **Returns**
 
@@ -58,24 +91,7 @@ class Grid:
                 ' ' is between blocks
                 spot.
         '''
-        infile = open(self.fname)
-        # do not start searching for grid elements
-        start_search = False
-        grid_list = []
-
-        for line in infile:
-            # start searching for grid elements if the line GRID START appears
-            if line.strip() == "GRID START":
-                start_search = True
-                continue
-            # stop searching when the line GRID STOP appears
-            elif line.strip() == "GRID STOP":
-                start_search = False
-                continue
-            # if searching, add all non-space elements to list
-            elif start_search:
-                grid_list.append([i for i in line.strip() if i != ' '])
-
+        grid_list = self.puzzle.grid
         num_cols = len(grid_list[0])
         num_rows = len(grid_list)
 
@@ -100,8 +116,8 @@ class Grid:
 
         **Parameters**
 
-            fname: *str*
-                The file name to read in
+            puzzle: *Puzzle*
+                The parsed bff file
 
         **Returns**
 
@@ -109,42 +125,7 @@ class Grid:
                 A dictionary of blocks. Keys are block types and values are the
                 number of blocks.
         '''
-        dict_A = {}
-        dict_B = {}
-        dict_C = {}
-        # do not start searching for blocks
-        start_search = False
-
-        for line in open(self.fname):
-            # do not read lines that begin with #
-            if '#' in line:
-                continue
-            # start searching after GRID STOP appears
-            elif line.strip() == 'GRID STOP':
-                start_search = True
-            # if searching, add the type of block and number to dict
-            elif start_search:
-                if 'A ' in line:
-                    A_line = [i for i in line.strip() if i != ' ']
-                    dict_A['reflective_blocks'] = int(A_line[1])
-                elif 'B ' in line:
-                    B_line = [i for i in line.strip() if i != ' ']
-                    dict_B['opaque_blocks'] = int(B_line[1])
-                elif 'C ' in line:
-                    C_line = [i for i in line.strip() if i != ' ']
-                    dict_C['refractive_blocks'] = int(C_line[1])
-
-        block_dict = {}
-        # if the dictionaries for A, B, or C contain elements
-        # add them to the block dictionary
-        if len(dict_A) != 0:
-            block_dict.update(dict_A)
-        if len(dict_B) != 0:
-            block_dict.update(dict_B)
-        if len(dict_C) != 0:
-            block_dict.update(dict_C)
-
-        return block_dict
+        return self.puzzle.block_dict()
 
     def get_laser_pos(self):
         '''
@@ -153,8 +134,8 @@ class Grid:
 
         **Parameters**
 
-            fname: *str*
-                The file name to read in
+            puzzle: *Puzzle*
+                The parsed bff file
 
         **Returns**
 
@@ -162,43 +143,7 @@ class Grid:
                 A dictionary that contains the laser number and its
                 corresponding integer x, y, vx, vy values as a tuple.
         '''
-        infile = open(self.fname)
-        x_list = []
-        y_list = []
-        vx_list = []
-        vy_list = []
-        # do not start searching for laser
-        start_search = False
-
-        for line in infile:
-            # do not read lines that start with #
-            if '#' in line:
-                continue
-            # start searching after GRID STOP appears
-            elif line.strip() == 'GRID STOP':
-                start_search = True
-            # if searching, add laser and its elements to according lists
-            elif start_search:
-                if 'L ' in line:
-                    laser_pos_raw = [i for i in line.strip().split(' ')]
-                    x_list.append(int(laser_pos_raw[1]))
-                    y_list.append(int(laser_pos_raw[2]))
-                    vx_list.append(int(laser_pos_raw[3]))
-                    vy_list.append(int(laser_pos_raw[4]))
-
-        # assemble dictionary for lasers
-        laser_num = len(x_list)
-        laser_dict = {}
-        keys = range(laser_num)
-
-        for i in keys:
-            x = x_list[i]
-            y = y_list[i]
-            vx = vx_list[i]
-            vy = vy_list[i]
-            laser_dict[i] = (x, y, vx, vy)
-
-        return laser_dict
+        return self.puzzle.laser_dict()
 
     def get_goal_points(self):
         '''
@@ -207,8 +152,8 @@ class Grid:
 
         **Parameters**
 
-            fname: *str*
-                The file name to read in
+            puzzle: *Puzzle*
+                The parsed bff file
 
         **Returns**
 
@@ -216,60 +161,54 @@ class Grid:
                 A dictionary that contains the goal point number and it's
                 corresponding coordinates.
         '''
-        infile = open(self.fname)
-        x_list = []
-        y_list = []
-        # do not start searching for goal points
-        start_search = False
-
-        for line in infile:
-            # do not read lines that contain #
-            if '#' in line:
-                continue
-            # start searching after GRID STOP appears
-            elif line.strip() == 'GRID STOP':
-                start_search = True
-            # if searching, add goal points to according lists
-            elif start_search:
-                if 'P ' in line:
-                    point_pos_raw = [i for i in line.strip().split(' ')]
-                    x_list.append(int(point_pos_raw[1]))
-                    y_list.append(int(point_pos_raw[2]))
+        return self.puzzle.point_dict()
 
-        # assemble dictionary for goal points
-        point_num = len(x_list)
-        point_dict = {}
-        keys = range(point_num)
+    def get_block_types(self):
+        '''
+        Find the integer aliases of the block types that can be placed.
 
-        for i in keys:
-            x = x_list[i]
-            y = y_list[i]
-            point_dict[i] = (x, y)
+        **Returns**
 
-        return point_dict
+            block_types: *tuple*
+                Sorted aliases (1, 2 or 3) of every block type with at least
+                one block
+        '''
+        return tuple(sorted(BLOCK_ALIASES[key]
+                            for key, val in self.block_dict.items() if val))
 
-    def get_permutations(self, list_for_perm):
+    def get_permutations(self, list_for_perm, start=0, order='lex'):
         '''
-        Find all the permutations of the avaliable spots on the board
+        Find all the permutations of the avaliable spots on the board.
+        * permutations are streamed lazily, so no configuration is built
+          until it is asked for
+        * order 'lex' streams them in lexicographic order, order 'gray' in
+          an order where each differs from the last by swapping two spots
 
         **Parameters**
 
             list_for_perm: *list*
                 The list of options for open spots
+            start: *int*
+                The rank of the first permutation to produce. With order
+                'gray' every permutation is still produced, starting from
+                the one at this lexicographic rank. Defaults to 0.
+            order: *str*
+                'lex' or 'gray'. Defaults to 'lex'.
 
         **Returns**
 
-            config_list: *list*
-                A list containing all lists of permutations of the availabe
-                spots.
+            config_list: *ConfigStream or GrayConfigStream*
+                A stream of all permutations of the availabe spots. Its
+                length is the total number of configurations.
         '''
-        config_list = []
-        # use idp to find all unique permutations of a list
-        perm = idp(list_for_perm)
-        config_list = list(perm)
-        return config_list
-
-    def get_configs(self):
+        if order == 'gray':
+            return GrayConfigStream(list_for_perm,
+                                    ConfigStream(list_for_perm).unrank(start))
+        if order != 'lex':
+            raise ValueError("Unknown order %r" % order)
+        return ConfigStream(list_for_perm, start)
+
+    def get_configs(self, start=0, order='lex'):
         '''
         Find all the configurations of the available spots on the board
         * elements are aliased as integers to save time
@@ -284,12 +223,16 @@ class Grid:
                 The grid of board elements
             blocks: *dict*
                 A dictionary containing the types and number of blocks
+            start: *int*
+                The rank of the first configuration to produce, used to
+                resume a search. Defaults to 0.
+            order: *str*
+                'lex' or 'gray', see get_permutations(). Defaults to 'lex'.
 
         **Returns**
 
-            config_list: *list*
-                A list containing all lists of configurations of the availabe
-                spots.
+            config_list: *ConfigStream or GrayConfigStream*
+                A lazy stream of all configurations of the availabe spots.
         '''
 
         available = 0
@@ -328,7 +271,7 @@ class Grid:
                     list_for_perm.append(int(3))
 
         # import the get permutations function to find all configurations
-        configs = self.get_permutations(list_for_perm)
+        configs = self.get_permutations(list_for_perm, start, order)
 
         return configs
 
@@ -336,7 +279,8 @@ class Grid:
         '''
         Converts config to board/grid layout and converts elements to
         Block/Edge types.
-        * This uses the Block class defined later in the code.
+        * This uses the precompiled Edge objects of the CompiledBoard, so no
+          Block or Edge is built per config.
 
         **Parameters**
 
@@ -348,21 +292,19 @@ class Grid:
             boards: *np.array*
                 An array containing the configuration on the grid
         '''
-        board = np.empty(self.grid.shape, dtype=object)
-        idx = 0
-
-        for i, row in enumerate(self.grid):  # y
-            for j, ele in enumerate(row):  # x
-                if ele == 'o':
-                    block = Block(config[idx], j, i)
-                    board = block.add_to_board(board)
-                    idx += 1
-
-        return board
+        return self.compiled.place(config).copy()
 
     def get_laser_path(self, board, slow=False):
         '''
-        Finds the path of the laser given a board configuration.
+        Finds the path of the laser given a board configuration. Lasers are
+        traced one at a time from a work queue, and lasers started by
+        refractive blocks are added to the back of it.
+        * every (x, y, vx, vy) state traced is remembered, and a laser
+          entering a state already traced is dropped, so lasers that meet
+          are not traced twice and a laser caught in a loop stops. No board
+          takes more than 4 steps per grid position.
+        * neighbouring blocks share an edge position, which holds the Edge
+          of only one of them, see facing_edge()
 
         **Parameters**
 
@@ -376,86 +318,60 @@ class Grid:
                 configuration. 0 for no laser, 1 for laser.
         '''
         laser_path = np.zeros_like(self.grid, dtype=int)
-        active_lasers = self.laser_dict.copy()
-
-        positions = []
-        # list of all coords the laser hits except for refracted ones
-        while len(active_lasers) != 0:
-            key, val = next(iter(active_lasers.items()))
-            temp_path = np.zeros_like(self.grid, dtype=int)
-            positions.append([val[0], val[1]])  # [x,y]
-            vx, vy, = val[2], val[3]
-            ref_positions = []
-
-            if isinstance(key, int):
-                while self.in_grid(positions[-1]):
-                    origin = positions[-1]
-                    # np arrays are arr[y][x]
-
-                    if isinstance(board[positions[-1][1]][positions[-1][0]],
-                                  Edge):
-                        new_pos, vx, vy, active_lasers = board[
-                            positions[-1][1]][positions[-1][0]
-                                              ].laser(vx, vy, active_lasers)
-                        positions.append(new_pos)
-                    else:
-                        positions.append([origin[0] + vx, origin[1] + vy])
-                if key in active_lasers.keys():
-                    del active_lasers[key]
+        # lasers left to trace as (x, y, vx, vy), and the states traced
+        beams = deque(self.laser_dict.values())
+        visited = set()
+
+        while beams:
+            x, y, vx, vy = beams.popleft()
+            while self.in_grid((x, y)) and (x, y, vx, vy) not in visited:
+                visited.add((x, y, vx, vy))
+                # np arrays are arr[y][x]
+                laser_path[y][x] = 1
+                space = board[y][x]
+                if isinstance(space, Edge) and not space.hit_edge(vx, vy):
+                    space = self.facing_edge(board, space)
+                if isinstance(space, Edge):
+                    (x, y), vx, vy, beams = space.laser(vx, vy, beams)
                 else:
-                    pass
-
-            # check if refractory block
-            if isinstance(key, float):
-                refracted_laser = active_lasers.pop(key)  # x, y, vx, vy
-                ref_active_lasers = {key: refracted_laser}
-                ref_positions.append([refracted_laser[0], refracted_laser[1]])
-                ref_vx, ref_vy = refracted_laser[2], refracted_laser[3]
-
-                while self.in_grid(ref_positions[-1]):
-                    ref_origin = ref_positions[-1]
-
-                    # handling refract blocks separately
-                    if isinstance(board[ref_positions[-1][1]][ref_positions[
-                            -1][0]], Edge):
-                        ref_new_pos, ref_vx, ref_vy, ref_active_lasers = board[
-                            ref_positions[-1][1]][ref_positions[-1][0]].laser(
-                                ref_vx, ref_vy, ref_active_lasers)
-
-                        ref_positions.append(ref_new_pos)
-
-                        if self.in_grid(ref_new_pos):
-                            ref_space = board[ref_new_pos[1]][ref_new_pos[0]]
-                            if isinstance(ref_space, Edge):
-                                if ref_space.value == 1:
-                                    if abs(ref_space.side[0]) == 1:
-                                        ref_vx = ref_vx * (-1)
-                                    if abs(ref_space.side[1]) == 1:
-                                        ref_vy = ref_vy * (-1)
-
-                                    ref_positions.append([
-                                        ref_new_pos[0] + ref_vx, ref_new_pos[
-                                            1]+ref_vy])
-
-                                if ref_space.value == 2:
-                                    ref_positions.append([-1, -1])
-                    else:
-                        ref_positions.append([ref_origin[0] +
-                                              ref_vx, ref_origin[1] + ref_vy])
-                del ref_active_lasers[key]
-                active_lasers.update(ref_active_lasers)
+                    x, y = x + vx, y + vy
 
-        for coord in positions:
-            if self.in_grid(coord):
-                temp_path[coord[1]][coord[0]] = 1
+        return laser_path
 
-        for coord in ref_positions:
-            if self.in_grid(coord):
-                temp_path[coord[1]][coord[0]] = 1
+    def facing_edge(self, board, edge):
+        '''
+        Finds the edge of the block on the far side of an edge position. A
+        block next to another one loses the Edge they share on the board, so
+        it is recognised by any of its other three edges instead.
 
-        laser_path = laser_path + temp_path
+        **Parameters**
 
-        return laser_path
+            board: *np.array*
+                An array containing block information.
+            edge: *Edge*
+                The Edge on the board at the shared position
+
+        **Returns**
+
+            *Edge or None*
+                An Edge of the block on the other side, at the same position
+                and facing the other way, or None if there is no block
+        '''
+        side = edge.side
+        x = edge.pos[0] + side[0]
+        y = edge.pos[1] + side[1]
+
+        for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            if (dx, dy) == (-side[0], -side[1]) or \
+                    not self.in_grid((x + dx, y + dy)):
+                continue
+            other = board[y + dy][x + dx]
+            # an Edge belongs to the block at its position minus its side
+            if isinstance(other, Edge) and other.side == (dx, dy) and \
+                    other.value != 0:
+                return Edge(other.value, (-side[0], -side[1]), edge.pos)
+
+        return None
 
     def in_grid(self, pos):
         '''
@@ -525,16 +441,150 @@ class Grid:
 
         return True
 
-    def find_solution(self, configs, slow=False):
+    def get_block_counts(self):
+        '''
+        Find how many blocks of every type have to be placed.
+
+        **Returns**
+
+            block_counts: *dict*
+                Keys are block aliases (1, 2 or 3), values are the number of
+                blocks
+        '''
+        block_counts = {}
+        for key, val in self.block_dict.items():
+            block_counts[BLOCK_ALIASES[key]] = val
+
+        return block_counts
+
+    def check_feasible(self):
+        '''
+        Raises ValueError("No Solution Found (reason)") if
+        prove_infeasible() finds a reason.
+        '''
+        with self.metrics.phase('analysis'):
+            reason = self.prove_infeasible()
+        if reason is not None:
+            raise ValueError("No Solution Found (%s)" % reason)
+
+    def prove_infeasible(self):
+        '''
+        Looks for a cheap proof that the puzzle has no solution, so
+        find_solution() can fail without checking any configs.
+        * more blocks than open spots
+        * a goal point no laser can reach whatever blocks go in the open
+          spots, see LaserTracer.reach
+        * more diagonal lines needed to cover the goal points than the
+          lasers can travel along. A laser travels one line, and every hit
+          on a reflective or refractive block starts at most one more. A
+          block has 4 edges and each is hit from at most 2 directions.
+
+        **Returns**
+
+            reason: *str or None*
+                Why the puzzle can not be solved, or None if no proof was
+                found (the puzzle may still have no solution)
+        '''
+        counts = self.get_block_counts()
+        slots = len(self.compiled.slots)
+        if sum(counts.values()) > slots:
+            return "%d blocks for %d open spots" % (sum(counts.values()),
+                                                     slots)
+
+        tracer = self.tracer
+        reach = 0
+        for s in tracer.starts:
+            reach |= tracer.reach[s]
+        if reach != tracer.goal_mask:
+            index = self.compiled.index
+            missed = [point for point in sorted(set(self.point_dict.values()))
+                      if not self.in_grid(point) or
+                      not tracer.goal_bits[index(*point)] & reach]
+            return "goal points %s can not be reached" % missed
+
+        lasers = len(tracer.starts)
+        bouncing = counts.get(1, 0) + counts.get(3, 0)
+        bouncing += sum(1 for t in self.compiled.template if t in (1, 3))
+        lines = lasers + 8 * bouncing
+        needed = min_line_cover(set(self.point_dict.values()))
+        if needed > lines:
+            return "goal points need %d laser lines, at most %d possible" % (
+                needed, lines)
+
+        return None
+
+    def get_solution(self, config):
+        '''
+        Builds the outputs of find_solution() for one configuration.
+
+        **Parameters**
+
+            config: *tuple*
+                A configuration of the available spots.
+
+        **Returns**
+
+            board_int: *np.array*
+                The board configuration, see board_to_int()
+            laser_path: *np.array*
+                The laser path of the configuration
+            config: *tuple*
+                The configuration itself
+        '''
+        with self.metrics.phase('solution'):
+            board = self.compiled.place(config)
+            hits = self.tracer.trace(self.compiled.cells)
+            return (self.board_to_int(board), self.tracer.path_array(hits),
+                    config)
+
+    def find_solution(self, configs=None, slow=False, engine='scan',
+                      cache=None, timeout=None, batch_size=4096,
+                      checkpoint=None):
         '''
         Checks all possible configs until a solution to the lazor puzzle
         is found.
+        * engine 'scan' checks configs in order
+        * engine 'backtrack' ignores configs and follows the lasers instead,
+          choosing a block only for open spots a laser reaches, see
+          BacktrackSearch
+        * engine 'numpy' checks configs batch_size at a time with
+          BatchTracer
+        * engine 'incremental' checks configs in order with an
+          IncrementalTracer, which only traces again after the first open
+          spot that changed. It works best on get_configs(order='gray'),
+          its default, where each config swaps two spots.
+        * engine 'bestfirst' is 'backtrack' with the most promising partial
+          placement branched on first, see BestFirstSearch
+        * puzzles prove_infeasible() can rule out fail at once
+        * counters and timings are kept in metrics, see SolverMetrics
 
         **Parameters**
 
-            configs: *list*
-                A list containing all lists of configurations of the
-                availabe spots.
+            configs: *iterable*
+                The configurations of the availabe spots, usually the
+                ConfigStream from get_configs(). They are consumed one at a
+                time. Defaults to get_configs().
+            slow: *bool*
+                Trace with the Edge objects of get_laser_path() instead of
+                the LaserTracer tables. Defaults to False.
+            engine: *str*
+                The search engine, 'scan', 'backtrack', 'bestfirst',
+                'numpy' or 'incremental'. Defaults to 'scan'.
+            cache: *TraceCache, optional*
+                Reuse trace results between configs that agree on the open
+                spots the lasers reach ('scan' only). A ConfigStream is also
+                fast-forwarded past configs that only rearrange spots after
+                the last one reached.
+            timeout: *float, optional*
+                Seconds to search before raising TimeoutError. Checked every
+                1024 configs.
+            batch_size: *int*
+                Configs per batch for engine 'numpy'. Defaults to 4096.
+            checkpoint: *SearchCheckpoint, optional*
+                Save the search position to a file as the search goes, and
+                carry on from the position already saved there, if any
+                ('scan' without a cache, and 'backtrack' only). A search
+                that finished is answered from the file at once.
 
         **Returns**
 
@@ -543,49 +593,618 @@ class Grid:
             laser_path: *np.array*
                 The laser path of the solution
         '''
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine %r" % engine)
+        deadline = None if timeout is None else time.time() + timeout
+        self.check_feasible()
+        state = None
+        if checkpoint is not None:
+            if engine not in ('scan', 'backtrack') or slow or \
+                    cache is not None:
+                raise ValueError("Checkpoints need engine 'scan' or "
+                                 "'backtrack', without a cache")
+            state = checkpoint.begin(self, engine)
+            if state is not None and state['status'] == 'solved':
+                print("SOLVED LAZOR!")
+                return self.get_solution(tuple(state['config']))
+            if state is not None and state['status'] == 'no_solution':
+                raise ValueError(state['error'])
+            if engine == 'scan':
+                # carry on from the saved rank
+                rank = state['position']['rank'] if state else 0
+                if configs is None:
+                    configs = self.get_configs(rank)
+                elif isinstance(configs, ConfigStream):
+                    configs = ConfigStream(configs.items,
+                                           max(rank, configs.start),
+                                           configs.stop)
+                else:
+                    raise ValueError("Checkpoints need configs from "
+                                     "get_configs()")
+        if configs is None and engine == 'incremental':
+            configs = self.get_configs(order='gray')
+        elif configs is None and engine not in ('backtrack', 'bestfirst'):
+            configs = self.get_configs()
+        try:
+            total = len(configs)
+        except (TypeError, OverflowError):
+            total = None
+        self.metrics.start(total, self.tracer, cache)
+
+        with self.metrics.phase('search'):
+            if checkpoint is not None:
+                return self._find_solution_checkpoint(engine, configs,
+                                                      deadline, checkpoint,
+                                                      state)
+            if engine == 'backtrack':
+                return self._find_solution_backtrack(deadline)
+            if engine == 'bestfirst':
+                return self._find_solution_backtrack(deadline, BestFirstSearch)
+            if engine == 'numpy':
+                return self._find_solution_batched(configs, batch_size,
+                                                   deadline)
+            if engine == 'incremental':
+                return self._find_solution_incremental(configs, deadline)
+            if slow:
+                return self._find_solution_slow(configs, deadline)
+            if cache is not None:
+                return self._find_solution_cached(configs, cache, deadline)
+            return self._find_solution_scan(configs, deadline)
+
+    def _find_solution_scan(self, configs, deadline):
+        # scan engine, see find_solution()
+        metrics = self.metrics
+        compiled = self.compiled
+        trace_goals = self.tracer.trace_goals
+        goal_mask = self.tracer.goal_mask
+        check = 0
+        i = -1
+
+        for i, config in enumerate(configs):
+            if i >= check:
+                check = metrics.checkpoint(i, deadline)
+            # stops as soon as the config is known to pass or fail
+            if trace_goals(compiled.place_cells(config)) == goal_mask:
+                metrics.update(i + 1)
+                print("SOLVED LAZOR!")
+                return self.get_solution(config)
+
+        metrics.update(i + 1)
+        raise ValueError("No Solution Found")
+
+    def _find_solution_slow(self, configs, deadline):
+        # scan engine with the Edge tracer, see find_solution()
+        metrics = self.metrics
+        compiled = self.compiled
+        check = 0
+        i = -1
+
         for i, config in enumerate(configs):
-            board = self.config_to_board(config)
-            laser_path = self.get_laser_path(board, slow)
+            if i >= check:
+                check = metrics.checkpoint(i, deadline)
+            # blocks are written into the reusable board in place
+            board = compiled.place(config)
+            laser_path = self.get_laser_path(board, True)
 
             if self.check_solution(laser_path):
+                metrics.update(i + 1)
                 print("SOLVED LAZOR!")
                 return self.board_to_int(board), laser_path, config
 
+        metrics.update(i + 1)
+        raise ValueError("No Solution Found")
+
+    def _find_solution_backtrack(self, deadline, search_class=None,
+                                 checkpoint=None, path=None):
+        # backtrack and bestfirst engines, see find_solution()
+        search_class = search_class or BacktrackSearch
+        search = search_class(self.tracer, self.get_block_counts(),
+                              deadline, self.metrics)
+        if checkpoint is not None:
+            search.replay(path)
+            checkpoint.watch(self.metrics,
+                             lambda count: {'path': list(search.path)})
+        solutions = search.solutions()
+        try:
+            for assignment in solutions:
+                print("SOLVED LAZOR!")
+                return self.get_solution(search.complete(assignment))
+        finally:
+            # flush the step counts of the branches still open
+            solutions.close()
+            self.metrics.update(search.nodes)
+
+        raise ValueError("No Solution Found")
+
+    def _find_solution_checkpoint(self, engine, configs, deadline,
+                                  checkpoint, state):
+        # scan and backtrack engines saving to a SearchCheckpoint, see
+        # find_solution()
+        try:
+            if engine == 'scan':
+                checkpoint.watch(self.metrics, lambda count: {
+                    'rank': configs.start + count})
+                result = self._find_solution_scan(configs, deadline)
+            else:
+                path = state['position']['path'] if state else None
+                result = self._find_solution_backtrack(
+                    deadline, checkpoint=checkpoint, path=path)
+        except ValueError as e:
+            if str(e).startswith("No Solution Found"):
+                checkpoint.save('no_solution', error=str(e))
+            raise
+        except BaseException:
+            # timed out, interrupted or stopped: keep the last position
+            checkpoint.save()
+            raise
+        finally:
+            self.metrics.saver = None
+
+        checkpoint.save('solved', result[2])
+        return result
+
+    def _find_solution_cached(self, configs, cache, deadline):
+        # scan engine with a TraceCache, see find_solution()
+        cache.bind(self.tracer)
+        metrics = self.metrics
+        compiled = self.compiled
+        trace_signature = self.tracer.trace_signature
+        goal_mask = self.tracer.goal_mask
+        configs_iter = iter(configs)
+        skip = isinstance(configs, ConfigStream)
+        check = 0
+        i = -1
+
+        for i, config in enumerate(configs_iter):
+            if i >= check:
+                check = metrics.checkpoint(i, deadline)
+            result = cache.lookup(config)
+            if result is None:
+                covered, touched = trace_signature(
+                    compiled.place_cells(config))
+                result = cache.store(config, touched, covered)
+
+            if result[0] == goal_mask:
+                metrics.update(i + 1)
+                print("SOLVED LAZOR!")
+                return self.get_solution(config)
+            # spots after the last one reached can not change the result
+            if skip and result[1] + 1 < len(config):
+                metrics.configs_skipped += configs_iter.send(result[1])
+
+        metrics.update(i + 1)
+        raise ValueError("No Solution Found")
+
+    def _find_solution_incremental(self, configs, deadline):
+        # incremental engine, see find_solution()
+        metrics = self.metrics
+        compiled = self.compiled
+        values = compiled.values
+        tracer = IncrementalTracer(self.tracer)
+        goal_mask = self.tracer.goal_mask
+        if isinstance(configs, GrayConfigStream):
+            changes = configs.changes()
+        else:
+            # work out the spots that changed by comparing
+            changes = ((config, [k for k, val in enumerate(config)
+                                 if values[k] != val])
+                       for config in configs)
+        check = 0
+        i = -1
+
+        for i, (config, changed) in enumerate(changes):
+            if i >= check:
+                check = metrics.checkpoint(i, deadline)
+            if i == 0:
+                covered = tracer.trace(compiled.place_cells(config))
+            else:
+                covered = tracer.update(
+                    compiled.place_slots(config, changed), changed)
+            if covered == goal_mask:
+                metrics.update(i + 1)
+                print("SOLVED LAZOR!")
+                return self.get_solution(tuple(config))
+
+        metrics.update(i + 1)
         raise ValueError("No Solution Found")
 
-    def output_solution(self):
+    def _find_solution_batched(self, configs, batch_size, deadline):
+        # numpy engine, see find_solution()
+        metrics = self.metrics
+        batch_tracer = BatchTracer(self.tracer)
+        configs_iter = iter(configs)
+        done = 0
+
+        while True:
+            batch = list(itertools.islice(configs_iter, batch_size))
+            if not batch:
+                break
+            metrics.checkpoint(done, deadline)
+            solved = np.flatnonzero(batch_tracer.solves(batch))
+            if len(solved):
+                metrics.update(done + int(solved[0]) + 1)
+                print("SOLVED LAZOR!")
+                return self.get_solution(batch[solved[0]])
+            done += len(batch)
+
+        metrics.update(done)
+        raise ValueError("No Solution Found")
+
+    def find_solution_parallel(self, processes=None, chunks=None):
         '''
-        This function takes the output of find_solution() and converts it
-        to an array that is more easily readable.
+        Checks all possible configs on several processes until a solution
+        to the lazor puzzle is found. The ranks of get_configs() are split
+        into ranges, and every worker unranks the start of its range
+        directly, so no worker enumerates configs before its own. Once one
+        worker finds a solution the others are stopped.
+        * ranges are handed out in order and their results taken in order,
+          so the solution returned is the one with the lowest rank, the
+          one find_solution() returns, whichever worker finishes first
+        * workers send their counters back with every range, so metrics
+          (and its progress callback) is updated one range at a time
 
         **Parameters**
-            board_int: **arr**
-                output array from the board_to_int() function
-        **Outputs**
-            solved_board: **arr**
-                Solution array formattted for easier reading
+
+            processes: *int, optional*
+                Number of worker processes. Defaults to the CPU count.
+            chunks: *int, optional*
+                Number of rank ranges to split the configs into. Defaults to
+                32 per process, so faster workers pick up more ranges.
+
+        **Returns**
+
+            *np.array*
+                The board configuration that solves the puzzle.
+            laser_path: *np.array*
+                The laser path of the solution
+            config: *tuple*
+                The configuration of the available spots
         '''
-        infile = open(self.fname)
-        # do not start search
-        start_search = False
-        grid_list = []
+        self.check_feasible()
+        configs = self.get_configs()
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if chunks is None:
+            chunks = processes * 32
+        ranges = split_ranks(configs.total, chunks)
+        metrics = self.metrics
+        metrics.start(configs.total)
+
+        stop = multiprocessing.Event()
+        with metrics.phase('search'), \
+                multiprocessing.Pool(processes, _init_worker,
+                                     (self.puzzle, stop)) as pool:
+            for config, counters in pool.imap(
+                    _scan_range, [(configs.items, start, end)
+                                  for start, end in ranges]):
+                metrics.merge(counters)
+                if config is not None:
+                    # every range before this one had no solution; tell
+                    # busy workers to stop, then tear the pool down
+                    stop.set()
+                    print("SOLVED LAZOR!")
+                    return self.get_solution(config)
 
-        for line in infile:
-            # start search if GRID START appears
-            if line.strip() == "GRID START":
-                start_search = True
-                continue
-            # stop search when GRID STOP appears
-            elif line.strip() == "GRID STOP":
-                start_search = False
-                continue
-            # if searching, add elements into grid list
-            elif start_search:
-                grid_list.append([i for i in line.strip() if i != ' '])
+        raise ValueError("No Solution Found")
+
+    def scan_range(self, items, start, stop, cache, stopped=None):
+        '''
+        Checks the configs in one rank range of a ConfigStream, the way the
+        workers of find_solution_parallel() do. Configs that only rearrange
+        open spots after the last one the lasers reached are skipped.
+        metrics is updated with the counts of this range only, so call
+        metrics.start() before each range and add up metrics.counters().
+
+        **Parameters**
+
+            items: *tuple*
+                The items of the ConfigStream, see get_configs()
+            start, stop: *int*
+                The rank range to check, stop excluded
+            cache: *TraceCache*
+                Trace results to reuse, kept from range to range
+            stopped: *function, optional*
+                Called every 1024 configs; the scan ends early if it returns
+                True
+
+        **Returns**
+
+            config: *tuple or None*
+                The first solution in the range, or None if there is none or
+                the scan was stopped
+        '''
+        metrics = self.metrics
+        cache.bind(self.tracer)
+        compiled = self.compiled
+        trace_signature = self.tracer.trace_signature
+        goal_mask = self.tracer.goal_mask
+        configs_iter = iter(ConfigStream(items, start, stop))
+        solution = None
+        evaluated = 0
+
+        for config in configs_iter:
+            if evaluated % 1024 == 0 and stopped is not None and stopped():
+                break
+            evaluated += 1
+            result = cache.lookup(config)
+            if result is None:
+                covered, touched = trace_signature(
+                    compiled.place_cells(config))
+                result = cache.store(config, touched, covered)
+            if result[0] == goal_mask:
+                solution = config
+                break
+            if result[1] + 1 < len(config):
+                metrics.configs_skipped += configs_iter.send(result[1])
+
+        metrics.update(evaluated)
+        return solution
+
+    def solve_anytime(self, timeout=None, max_configs=None, max_steps=None,
+                      cursor=0):
+        '''
+        Searches within a budget and returns the best configuration found,
+        the one hitting the most goal points, when the budget runs out.
+        Configs are checked in the order of get_configs() and every result
+        covers all configs that agree on the open spots the lasers reached,
+        so the rest of them are skipped, see ConfigStream. The cursor of the
+        result continues the search where it stopped.
+        * the budget is checked every 16 configs, and at least one config
+          is checked
+        * with no budget at all, this runs until a solution is found or
+          every config has been checked
+
+        **Parameters**
+
+            timeout: *float, optional*
+                Seconds to search for
+            max_configs: *int, optional*
+                Most configs to check
+            max_steps: *int, optional*
+                Most laser steps to trace, see SolverMetrics.tracer_steps
+            cursor: *int*
+                Rank of the first config to check, from an earlier result.
+                Defaults to 0.
+
+        **Returns**
+
+            result: *AnytimeResult*
+                The best configuration, how many goal points it hits, the
+                cursor to continue from and the search statistics
+        '''
+        started = time.perf_counter()
+        deadline = None if timeout is None else started + timeout
+        metrics = self.metrics
+        tracer = self.tracer
+        compiled = self.compiled
+        trace_signature = tracer.trace_signature
+        goal_mask = tracer.goal_mask
+        goals = bin(goal_mask).count('1')
+        best_config = None
+        best = -1
+        solved = False
+        evaluated = 0
+
+        if sum(self.get_block_counts().values()) > len(compiled.slots):
+            configs = ()
+        else:
+            configs = self.get_configs(cursor)
+        metrics.start(len(configs), tracer)
+        steps = tracer.steps
+        configs_iter = iter(configs)
+
+        with metrics.phase('search'):
+            for config in configs_iter:
+                cursor += 1
+                evaluated += 1
+                # trace every laser fully, for the number of goals hit
+                covered, touched = trace_signature(
+                    compiled.place_cells(config), False)
+                hits = bin(covered).count('1')
+                if hits > best:
+                    best = hits
+                    best_config = config
+                if covered == goal_mask:
+                    solved = True
+                    break
+                last = max(touched) if touched else -1
+                if last + 1 < len(config):
+                    skipped = configs_iter.send(last)
+                    metrics.configs_skipped += skipped
+                    cursor += skipped
+
+                if max_configs is not None and evaluated >= max_configs:
+                    break
+                if evaluated % 16 == 0:
+                    if deadline is not None and \
+                            time.perf_counter() >= deadline:
+                        break
+                    if max_steps is not None and \
+                            tracer.steps - steps >= max_steps:
+                        break
+            else:
+                cursor = None
+
+        metrics.update(evaluated)
+        if cursor is not None and cursor >= getattr(configs, 'stop', 0):
+            cursor = None
 
+        return AnytimeResult(solved, best_config, max(best, 0), goals, cursor,
+                             metrics.snapshot())
+
+    def iter_solutions(self, engine='backtrack', timeout=None,
+                       processes=None, chunks=None):
+        '''
+        Finds every configuration that solves the puzzle, streaming each one
+        as soon as it is found. Nothing but the configurations is built, see
+        get_solution() for the board and laser path of one.
+        * 'backtrack' finds every partial configuration whose lasers hit all
+          goal points, then fills the spots no laser reached every way
+        * 'bestfirst' does the same, most promising placements first, so
+          the first solutions tend to come sooner, see BestFirstSearch
+        * 'scan' checks every config, but never traces past the last spot a
+          laser reached, see ConfigStream
+        * with processes the 'scan' is split into rank ranges on a pool of
+          worker processes, like find_solution_parallel(); solutions still
+          come out in lexicographic order
+
+        **Parameters**
+
+            engine: *str*
+                'backtrack', 'bestfirst' or 'scan'. Defaults to 'backtrack'.
+            timeout: *float, optional*
+                Seconds allowed before TimeoutError is raised
+            processes: *int, optional*
+                Number of worker processes for a parallel 'scan'. Defaults to
+                searching in this process.
+            chunks: *int, optional*
+                Number of rank ranges for a parallel 'scan'. Defaults to 32
+                per process.
+
+        **Returns**
+
+            *generator*
+                Every solving configuration, as a tuple, exactly once
+        '''
+        for config, count in self._solutions(engine, timeout, processes,
+                                             chunks, True):
+            yield config
+
+    def count_solutions(self, engine='backtrack', timeout=None,
+                        processes=None, chunks=None):
+        '''
+        Counts the configurations that solve the puzzle, without listing
+        them. A partial configuration found by 'backtrack' counts for all
+        the ways its undecided spots can be filled, and a 'scan' counts
+        every config it skips after a solution as a solution too, since
+        they only differ in spots no laser reached.
+
+        **Parameters**
+
+            engine, timeout, processes, chunks:
+                See iter_solutions()
+
+        **Returns**
+
+            count: *int*
+                Number of solving configurations, 0 if there is none
+        '''
+        return sum(count for config, count in self._solutions(
+            engine, timeout, processes, chunks, False))
+
+    def _solutions(self, engine, timeout, processes, chunks, expand):
+        # (config, n) for iter_solutions() and count_solutions(), where
+        # config stands for n solutions (always 1 if expand)
+        if engine not in ('backtrack', 'bestfirst', 'scan'):
+            raise ValueError("Unknown engine %r" % engine)
+        if processes is not None and engine != 'scan':
+            raise ValueError("Only the 'scan' engine runs on processes")
+        deadline = None if timeout is None else time.time() + timeout
+        try:
+            self.check_feasible()
+        except ValueError:
+            return
+
+        if processes is not None:
+            found = self._solutions_parallel(processes, chunks, deadline,
+                                             expand)
+        elif engine != 'scan':
+            self.metrics.start(None, self.tracer)
+            found = self._solutions_backtrack(
+                deadline, expand,
+                BestFirstSearch if engine == 'bestfirst' else BacktrackSearch)
+        else:
+            configs = self.get_configs()
+            self.metrics.start(configs.total, self.tracer)
+            found = self._solutions_scan(configs, deadline, expand)
+
+        with self.metrics.phase('search'):
+            yield from found
+
+    def _solutions_backtrack(self, deadline, expand, search_class):
+        # backtrack and bestfirst engines, see _solutions()
+        search = search_class(self.tracer, self.get_block_counts(),
+                              deadline, self.metrics)
+        solutions = search.solutions()
+        try:
+            for assignment in solutions:
+                if expand:
+                    for config in search.completions(assignment):
+                        yield config, 1
+                else:
+                    yield (search.complete(assignment),
+                           search.count_completions(assignment))
+        finally:
+            solutions.close()
+            self.metrics.update(search.nodes)
+
+    def _solutions_scan(self, configs, deadline, expand):
+        # scan engine, see _solutions(). configs the lasers never tell apart
+        # from the one traced are skipped, unless they are solutions that
+        # have to be listed
+        metrics = self.metrics
+        compiled = self.compiled
+        trace_signature = self.tracer.trace_signature
+        goal_mask = self.tracer.goal_mask
+        configs_iter = iter(configs)
+        check = 0
+        i = -1
+
+        try:
+            for i, config in enumerate(configs_iter):
+                if i >= check:
+                    check = metrics.checkpoint(i, deadline)
+                covered, touched = trace_signature(
+                    compiled.place_cells(config))
+                last = max(touched) if touched else -1
+                skipped = 0
+                if last + 1 < len(config) and not \
+                        (expand and covered == goal_mask):
+                    skipped = configs_iter.send(last)
+                    metrics.configs_skipped += skipped
+                if covered == goal_mask:
+                    yield config, skipped + 1
+        finally:
+            metrics.update(i + 1)
+
+    def _solutions_parallel(self, processes, chunks, deadline, expand):
+        # parallel scan engine, see _solutions(). ranges are handed out in
+        # order and their solutions passed on in order
         configs = self.get_configs()
-        board_int, laser_path, soln_config = self.find_solution(configs)
-        soln_config = list(soln_config)
+        if chunks is None:
+            chunks = processes * 32
+        ranges = split_ranks(configs.total, chunks)
+        metrics = self.metrics
+        metrics.start(configs.total)
+
+        stop = multiprocessing.Event()
+        with multiprocessing.Pool(processes, _init_worker,
+                                  (self.puzzle, stop)) as pool:
+            for found, counters in pool.imap(
+                    _solutions_range, [(configs.items, start, end, expand)
+                                       for start, end in ranges]):
+                metrics.merge(counters)
+                if deadline is not None and time.time() > deadline:
+                    stop.set()
+                    raise TimeoutError("Solutions not all found in time "
+                                       "(%d checked)"
+                                       % metrics.configs_evaluated)
+                yield from found
+
+    def get_solved_board(self, config):
+        '''
+        Converts a configuration to an array of the grid with the placed
+        blocks, using the same letters as the bff file.
+
+        **Parameters**
+            config: **tuple**
+                A configuration of the available spots.
+        **Returns**
+            solved_board: **arr**
+                Solution array formattted for easier reading
+        '''
+        grid_list = [list(row) for row in self.puzzle.grid]
+        soln_config = list(config)
 
         rows = len(grid_list)
         cols = len(grid_list[0])
@@ -610,11 +1229,77 @@ class Grid:
                     grid_list[row][col] = 'C'
         solved_board = np.array(grid_list)
 
+        return solved_board
+
+    def is_solution(self, config):
+        '''
+        Checks that a configuration, for example one read back from a
+        SolutionStore, places the puzzle's blocks and hits every goal point.
+
+        **Parameters**
+            config: **tuple**
+                A configuration of the available spots.
+        **Returns**
+            *bool*
+                True if the configuration solves the puzzle
+        '''
+        if len(config) != len(self.compiled.slots):
+            return False
+        counts = dict((val, 0) for val in self.get_block_counts())
+        for val in config:
+            if val:
+                if val not in counts:
+                    return False
+                counts[val] += 1
+        if counts != self.get_block_counts():
+            return False
+
+        cells = self.compiled.place_cells(config)
+        return self.tracer.trace_goals(cells) == self.tracer.goal_mask
+
+    def output_solution(self, store=None):
+        '''
+        This function takes the output of find_solution() and converts it
+        to an array that is more easily readable.
+
+        **Parameters**
+            store: **SolutionStore, optional**
+                Solutions of puzzles solved before. The puzzle is looked up
+                by its content first, and only searched for if it is not
+                there; the result of a search is then stored.
+        **Outputs**
+            solved_board: **arr**
+                Solution array formattted for easier reading
+        '''
+        soln_config = None
+        if store is not None:
+            soln_config = store.get(self.puzzle)
+            # a stale or damaged entry is searched for again
+            if soln_config is not None and not self.is_solution(soln_config):
+                soln_config = None
+
+        if soln_config is not None:
+            print("SOLVED LAZOR!")
+        else:
+            configs = self.get_configs()
+            try:
+                board_int, laser_path, soln_config = \
+                    self.find_solution(configs)
+            except ValueError as e:
+                if store is not None and \
+                        str(e).startswith("No Solution Found"):
+                    store.put(self.puzzle, None, str(e))
+                raise
+            if store is not None:
+                store.put(self.puzzle, soln_config)
+        solved_board = self.get_solved_board(soln_config)
+
         # write board configuration solution to text file
-        solution_fname = self.fname + '_solution.txt'
-        with open(solution_fname, 'w') as file:
-            file.write(str(solved_board))
-            file.close()
+        if self.fname is not None:
+            solution_fname = self.fname + '_solution.txt'
+            with open(solution_fname, 'w') as file:
+                file.write(str(solved_board))
+                file.close()
 
         return solved_board
 
@@ -667,11 +1352,9 @@ class Edge:
                 X laser direction
             vy: **int**
                 Y laser direction
-            active_lasers: **dict**
-                Dictionary of active lasers that haven't hit edge of grid yet.
-                Values are x,y,vx,vy
-            temp_path: **np.array**
-                An array of the current laser path
+            active_lasers: **deque**
+                Queue of lasers still to trace, as (x, y, vx, vy). A
+                refractive block adds the laser that carries on straight.
 
         Returns:
             new_pos: **tuple**
@@ -680,9 +1363,8 @@ class Edge:
                 X laser direction
             vy: **int**
                 Y laser direction
-            active_lasers: **dict**
-                Dictionary of active lasers that haven't hit edge of grid yet.
-                Values are x,y,vx,vy
+            active_lasers: **deque**
+                Queue of lasers still to trace
         """
         def no_change():
             # returns new_pos, vx, vy, and active_lasers if no special block
@@ -723,9 +1405,8 @@ class Edge:
         if self.value == 3:
             if self.hit_edge(vx, vy):
                 dupe_pos, dupe_vx, dupe_vy, dupe_active_lasers = no_change()
-                active_lasers[float(max(active_lasers.keys())
-                                    + 1)] = (dupe_pos[0], dupe_pos[1], dupe_vx,
-                                             dupe_vy)
+                active_lasers.append((dupe_pos[0], dupe_pos[1], dupe_vx,
+                                      dupe_vy))
                 # if left or right edge, vx direction filps
                 if abs(self.side[0]) == 1:
                     vx = vx*-1
@@ -797,6 +1478,2462 @@ class Block:
         return edges
 
 
+class CompiledBoard:
+    def __init__(self, grid):
+        '''
+        A precompiled board for one puzzle. The open slots, their edge
+        positions and the Edge objects each block type would put there are
+        found once, so placing a configuration only writes a few small ints
+        into a reusable buffer.
+        * the int buffer is padded by one cell on every side, so any
+          position next to the grid still has a valid index
+        * fixed blocks ('A', 'B', 'C' in the grid) are part of the template,
+          and their Edge objects are on the Edge board from the start
+
+        **Attributes**
+            width: *int*
+                Number of columns of the grid
+            height: *int*
+                Number of rows of the grid
+            stride: *int*
+                Row length of the padded buffer
+            slots: *tuple*
+                (x, y) of every open spot, in the same order as configs
+            slot_cells: *tuple*
+                Padded buffer index of every open spot
+            slot_of: *list*
+                For every padded buffer index, the number of the open spot
+                there, or -1
+            slot_edges: *tuple*
+                For every open spot, the (x, y) positions of its four edges
+            template: *bytearray*
+                Padded buffer with the fixed blocks and no placed blocks
+            cells: *bytearray*
+                Padded buffer of block types for the current configuration
+            values: *list*
+                The current configuration
+            board: *np.array*
+                Reusable Edge board for the current configuration, laid out
+                like the one config_to_board() used to build
+
+        **Parameters**
+
+            grid: *np.array*
+                Array of lazor grid, with 'o', 'x', and ' ' values
+        '''
+        fixed = {'A': 1, 'B': 2, 'C': 3}
+        self.height, self.width = grid.shape
+        self.stride = self.width + 2
+        self.template = bytearray(self.stride * (self.height + 2))
+
+        slots = []
+        # Edge objects of the fixed blocks, and who owns every edge
+        # position: (slot, edge) for open spots, (-1 - fixed block, edge)
+        # for fixed blocks, later blocks in the grid first like in
+        # add_to_board()
+        self._fixed_edges = []
+        owners = {}
+        for i, row in enumerate(grid):  # y
+            for j, ele in enumerate(row):  # x
+                if ele == 'o':
+                    slots.append((j, i))
+                    owner = len(slots) - 1
+                    edges = Block(1, j, i).edges
+                elif ele in fixed:
+                    self.template[self.index(j, i)] = fixed[ele]
+                    owner = -1 - len(self._fixed_edges)
+                    edges = Block(fixed[ele], j, i).edges
+                    self._fixed_edges.append(edges)
+                else:
+                    continue
+                for k, edge in enumerate(edges):
+                    owners.setdefault(edge.pos, []).insert(0, (owner, k))
+
+        self.slots = tuple(slots)
+        self.slot_cells = tuple(self.index(x, y) for x, y in self.slots)
+        self.slot_of = [-1] * len(self.template)
+        for i, cell in enumerate(self.slot_cells):
+            self.slot_of[cell] = i
+
+        # Edge objects for every slot and block type
+        self._edges = []
+        for x, y in self.slots:
+            per_type = [None]
+            for block_type in (1, 2, 3):
+                per_type.append(Block(block_type, x, y).edges)
+            self._edges.append(per_type)
+
+        self.slot_edges = tuple(
+            tuple(edge.pos for edge in per_type[1])
+            for per_type in self._edges)
+        self._owners = owners
+        # flat index of every edge position in the Edge board
+        self._edge_flat = dict((pos, pos[1] * self.width + pos[0])
+                               for pos in owners)
+
+        self.cells = bytearray(self.template)
+        self.values = [0] * len(self.slots)
+        self._dirty = set()
+        self.board = np.empty(grid.shape, dtype=object)
+        self._flat = self.board.reshape(-1)
+        # the edges of the fixed blocks are there from the start
+        for pos, flat in self._edge_flat.items():
+            self._flat[flat] = self._owner_edge(pos)
+
+    def index(self, x, y):
+        '''
+        Padded buffer index of a grid position.
+
+        **Parameters**
+            x: **int**
+                x position
+            y: **int**
+                y position
+
+        **Returns**
+            *int*
+                Index into template and cells
+        '''
+        return (y + 1) * self.stride + x + 1
+
+    def place(self, config):
+        '''
+        Writes a configuration into the buffers in place. Only slots whose
+        block changed since the last call are touched.
+
+        **Parameters**
+            config: **list**
+                A list containing one configuration of the available spots.
+
+        **Returns**
+            board: **np.array**
+                The reusable Edge board. It is overwritten by the next call,
+                copy it to keep it.
+        '''
+        self.place_cells(config)
+
+        # open spots changed since the last call, and their edges
+        positions = set()
+        for i in self._dirty:
+            positions.update(self.slot_edges[i])
+        for pos in positions:
+            self._flat[self._edge_flat[pos]] = self._owner_edge(pos)
+        self._dirty.clear()
+
+        return self.board
+
+    def place_cells(self, config):
+        '''
+        Writes a configuration into the int buffer only. The Edge board is
+        brought up to date by the next place() call.
+
+        **Parameters**
+            config: **list**
+                A list containing one configuration of the available spots.
+
+        **Returns**
+            cells: **bytearray**
+                The padded buffer of block types
+        '''
+        values = self.values
+        cells = self.cells
+        slot_cells = self.slot_cells
+
+        for i, val in enumerate(config):
+            if values[i] != val:
+                values[i] = val
+                cells[slot_cells[i]] = val
+                self._dirty.add(i)
+
+        return cells
+
+    def place_slots(self, config, changed):
+        '''
+        Like place_cells(), but only looks at some of the open spots, for
+        configurations known to differ from the current one only there.
+
+        **Parameters**
+            config: **list**
+                A list containing one configuration of the available spots.
+            changed: **iterable**
+                Numbers of the open spots that may have changed
+
+        **Returns**
+            cells: **bytearray**
+                The padded buffer of block types
+        '''
+        values = self.values
+        cells = self.cells
+
+        for i in changed:
+            val = config[i]
+            if values[i] != val:
+                values[i] = val
+                cells[self.slot_cells[i]] = val
+                self._dirty.add(i)
+
+        return cells
+
+    def _owner_edge(self, pos):
+        # the last block in the grid that has an edge here wins
+        for i, k in self._owners[pos]:
+            if i < 0:
+                return self._fixed_edges[-1 - i][k]
+            if self.values[i] != 0:
+                return self._edges[i][self.values[i]][k]
+        return None
+
+
+class LaserTracer:
+    def __init__(self, compiled, laser_dict, point_dict=None,
+                 block_types=(1, 2, 3)):
+        '''
+        A table-driven laser tracer for one puzzle. Every laser state is a
+        single int (padded position * 4 + direction), and where a state goes
+        next for each block type is looked up in a flat table built once, so
+        tracing a configuration is a loop of list lookups.
+        * directions are numbered by the signs of vx and vy, see direction()
+        * a next state of -1 means the laser left the grid or was stopped
+        * a refractive block continues the laser like an empty spot and
+          starts a second laser like a reflective block
+        * a laser that meets a block in a state already traced is dropped,
+          so lasers that merge are traced once and lasers caught in a loop
+          stop. Lasers can only loop or merge at blocks, since straight
+          paths leave the grid.
+        * trace_goals(), trace_signature() and the other fast tracers jump
+          between decision states, see get_jumps(), and all share the loop
+          in follow()
+
+        **Attributes**
+            compiled: *CompiledBoard*
+                The board the tables were built for
+            front: *list*
+                For every state, the padded index of the block the laser is
+                about to hit. States that can not hit a block point at the
+                top left padding cell, which is always empty.
+            trans: *list*
+                Next state, indexed by state * 4 + block type
+            starts: *tuple*
+                The state of every laser in laser_dict that starts in the grid
+            pending_starts: *tuple or None*
+                starts as a linked list of (state, rest) tuples, first laser
+                first, the way follow() keeps the lasers left to trace
+            goal_bits: *list*
+                For every padded position, a bitmask of the goal points there
+            goal_mask: *int*
+                Bitmask of all goal points, one bit per distinct point
+            reach: *list*
+                For every state, a bitmask of the goal points a laser in that
+                state could still pass under any placement of the blocks
+            jump, jump_goals, jump_bent: *list*
+                For every state, where the laser next meets a block that
+                depends on the configuration, see get_jumps()
+            jump_front: *list*
+                For every state, the padded index the decision state it
+                jumps to faces, or 0 (always empty) if there is none
+            jump_straight: *list*
+                For every state, where the laser goes if the spot faced
+                after the jump is empty, -1 if there is no decision state
+            steps: *int*
+                Laser steps taken by all traces so far, see SolverMetrics
+            spawned: *int*
+                Lasers started by refractive blocks in all traces so far
+
+        **Parameters**
+
+            compiled: *CompiledBoard*
+                The precompiled board of the puzzle
+            laser_dict: *dictionary*
+                A dictionary that contains the laser number and its
+                corresponding integer x, y, vx, vy values as a tuple.
+            point_dict: *dictionary, optional*
+                A dictionary that contains the goal point number and it's
+                corresponding coordinates.
+            block_types: *tuple*
+                Aliases of the block types that can be placed in open spots.
+                Defaults to all three.
+        '''
+        self.compiled = compiled
+        size = len(compiled.template) * 4
+        self.front = [0] * size
+        self.trans = [-1] * (size * 4)
+
+        for y in range(compiled.height):
+            for x in range(compiled.width):
+                for vx, vy in DIRECTIONS:
+                    s = self.state(x, y, vx, vy)
+                    straight = self.state(x + vx, y + vy, vx, vy)
+                    if x % 2 == 0 and y % 2 == 1:
+                        # on a left or right edge, reflection flips vx
+                        front = compiled.index(x + vx, y)
+                        bounce = self.state(x - vx, y + vy, -vx, vy)
+                    elif x % 2 == 1 and y % 2 == 0:
+                        # on a top or bottom edge, reflection flips vy
+                        front = compiled.index(x, y + vy)
+                        bounce = self.state(x + vx, y - vy, vx, -vy)
+                    else:
+                        # corners and block centers never touch an edge
+                        front = 0
+                        bounce = straight
+                    self.front[s] = front
+                    self.trans[s * 4] = straight
+                    self.trans[s * 4 + 1] = bounce
+                    self.trans[s * 4 + 2] = -1
+                    self.trans[s * 4 + 3] = bounce
+
+        starts = []
+        for x, y, vx, vy in laser_dict.values():
+            s = self.state(x, y, vx, vy)
+            if s >= 0:
+                starts.append(s)
+        self.starts = tuple(starts)
+        self.pending_starts = None
+        for s in reversed(self.starts):
+            self.pending_starts = (s, self.pending_starts)
+
+        self.goal_bits = [0] * len(compiled.template)
+        self.goal_mask = 0
+        bits = {}
+        for x, y in (point_dict or {}).values():
+            # one bit per distinct goal point
+            bit = bits.setdefault((x, y), 1 << len(bits))
+            self.goal_mask |= bit
+            if self.state(x, y, 1, 1) >= 0:
+                self.goal_bits[compiled.index(x, y)] |= bit
+        self.reach = self.get_reach(block_types)
+        self.jump, self.jump_goals, self.jump_bent = self.get_jumps()
+        self.jump_front = [self.front[d] if d >= 0 else 0 for d in self.jump]
+        self.jump_straight = [self.trans[d << 2] if d >= 0 else -1
+                              for d in self.jump]
+        self.steps = 0
+        self.spawned = 0
+
+    def get_reach(self, block_types):
+        '''
+        Find the goal points every state could still pass, whatever blocks
+        go in the open spots ahead of it. Goal bits are spread backwards
+        along every possible transition until nothing changes.
+
+        **Parameters**
+            block_types: **tuple**
+                Aliases of the block types that can be placed in open spots
+
+        **Returns**
+            reach: **list**
+                For every state, a bitmask of reachable goal points
+        '''
+        compiled = self.compiled
+        slot_cells = set(compiled.slot_cells)
+        open_types = (0,) + tuple(block_types)
+        size = len(self.front)
+        reach = [0] * size
+        preds = [[] for _ in range(size)]
+
+        for s in range(size):
+            front = self.front[s]
+            if front in slot_cells:
+                types = open_types
+            else:
+                types = (compiled.template[front],)
+            nexts = set()
+            for t in types:
+                nexts.add(self.trans[s * 4 + t])
+                if t == 3:
+                    nexts.add(self.trans[s * 4])
+            for nxt in nexts:
+                if nxt >= 0:
+                    preds[nxt].append(s)
+
+        work = []
+        for s in range(size):
+            reach[s] = self.goal_bits[s >> 2]
+            if reach[s]:
+                work.append(s)
+
+        while work:
+            s = work.pop()
+            for pred in preds[s]:
+                if reach[s] & ~reach[pred]:
+                    reach[pred] |= reach[s]
+                    work.append(pred)
+
+        return reach
+
+    def get_jumps(self):
+        '''
+        Find, for every state, the next state in which the laser faces an
+        open spot or a fixed refractive block, the only places where what
+        happens depends on the configuration (or the laser splits). Until
+        then the path is fixed by the grid walls and fixed blocks, so the
+        tracers jump straight from one such decision state to the next.
+        * a state that already faces an open spot jumps to itself
+        * lasers that loop among fixed blocks are found here, and jump to
+          -1 with the goal points of the loop
+
+        **Returns**
+            jump: **list**
+                The next decision state, or -1 if the laser leaves the grid,
+                is stopped or loops before meeting one
+            jump_goals: **list**
+                Bitmask of the goal points passed on the way, including the
+                positions of the state and of the decision state
+            jump_bent: **list**
+                True if a fixed block reflected the laser on the way, which
+                is the only way a laser can come back to a state through
+                open spots that are left empty
+        '''
+        compiled = self.compiled
+        template = compiled.template
+        slot_cells = set(compiled.slot_cells)
+        front = self.front
+        trans = self.trans
+        goal_bits = self.goal_bits
+        size = len(front)
+        # -2 marks states not worked out yet
+        jump = [-2] * size
+        jump_goals = [0] * size
+        jump_bent = [False] * size
+
+        for first in range(size):
+            path = []
+            on_path = {}
+            s = first
+            # follow the fixed path until its end is known
+            while True:
+                if s < 0:
+                    end = (-1, 0, False)
+                    break
+                if jump[s] != -2:
+                    end = (jump[s], jump_goals[s], jump_bent[s])
+                    break
+                if s in on_path:
+                    # a loop, which never meets a decision state
+                    loop = path[on_path[s]:]
+                    goals = 0
+                    for state in loop:
+                        goals |= goal_bits[state >> 2]
+                    for state in loop:
+                        jump[state] = -1
+                        jump_goals[state] = goals
+                        jump_bent[state] = True
+                    del path[on_path[s]:]
+                    end = (-1, goals, True)
+                    break
+                cell = front[s]
+                if cell in slot_cells or template[cell] == 3:
+                    jump[s] = s
+                    jump_goals[s] = goal_bits[s >> 2]
+                    end = (s, jump_goals[s], False)
+                    break
+                on_path[s] = len(path)
+                path.append(s)
+                s = trans[(s << 2) | template[cell]]
+
+            target, goals, bent = end
+            for state in reversed(path):
+                goals |= goal_bits[state >> 2]
+                bent = bent or template[front[state]] == 1
+                jump[state] = target
+                jump_goals[state] = goals
+                jump_bent[state] = bent
+
+        return jump, jump_goals, jump_bent
+
+    def state_pos(self, s):
+        '''
+        Decodes the grid position of a state.
+
+        **Parameters**
+            s: **int**
+                A laser state
+
+        **Returns**
+            *tuple*
+                (x, y), or None if the state is not in the grid
+        '''
+        y, x = divmod(s >> 2, self.compiled.stride)
+        if 0 < x <= self.compiled.width and 0 < y <= self.compiled.height:
+            return x - 1, y - 1
+        return None
+
+    def state(self, x, y, vx, vy):
+        '''
+        Encodes a laser position and direction as a state.
+
+        **Parameters**
+            x, y: **int**
+                Laser position in grid
+            vx, vy: **int**
+                Laser direction
+
+        **Returns**
+            *int*
+                The state, or -1 if the position is outside the grid
+        '''
+        if x < 0 or y < 0 or x >= self.compiled.width or \
+                y >= self.compiled.height:
+            return -1
+        return self.compiled.index(x, y) * 4 + direction(vx, vy)
+
+    def trace(self, cells):
+        '''
+        Traces every laser through a board to the edge of the grid.
+
+        **Parameters**
+            cells: **bytearray**
+                Padded buffer of block types, see CompiledBoard
+
+        **Returns**
+            hits: **set**
+                Padded indices of every grid position a laser passed
+        '''
+        front = self.front
+        trans = self.trans
+        hits = set()
+        seen = set()
+        stack = list(self.starts)
+        steps = spawned = 0
+
+        while stack:
+            s = stack.pop()
+            while s >= 0:
+                steps += 1
+                hits.add(s >> 2)
+                t = cells[front[s]]
+                if t:
+                    if s in seen:
+                        break
+                    seen.add(s)
+                if t == 3:
+                    # the refracted laser carries on straight
+                    stack.append(trans[s << 2])
+                    spawned += 1
+                s = trans[(s << 2) | t]
+
+        self.steps += steps
+        self.spawned += spawned
+        return hits
+
+    def follow(self, cells, s, pending, covered, seen, marked, fail_fast=True,
+               touch=None):
+        '''
+        The loop every fast tracer runs. Laser s and then the pending lasers
+        jump from one decision state to the next (see get_jumps()), until
+        every goal point is hit, the lasers run out, or a laser faces an
+        open spot that is still UNDECIDED, where tracing pauses so the
+        caller can decide it and call follow() again from there.
+        * a laser that meets a block in a state marked in seen is dropped;
+          states are marked as they are met and listed in marked, so the
+          caller can unmark them again
+        * with fail_fast, tracing also stops once the lasers left can not
+          reach the goal points not hit yet, checked every time a laser
+          meets a block
+
+        **Parameters**
+            cells: **bytearray**
+                Padded buffer of block types, see CompiledBoard. Open spots
+                may hold UNDECIDED.
+            s: **int**
+                The laser state to go on from, -1 to start with pending
+            pending: **tuple or None**
+                The lasers left to trace, as a linked list of (state, rest)
+                tuples. Refracted lasers are pushed on its front.
+            covered: **int**
+                Bitmask of the goal points hit so far
+            seen: **bytearray**
+                One byte per state, set for the states met at a block
+            marked: **list**
+                The states follow() sets in seen are appended to it
+            fail_fast: **bool**
+                Stop early on boards that can no longer be solved.
+                Defaults to True.
+            touch: **function, optional**
+                Called with (s, open spot number, covered, pending) every
+                time a laser faces an open spot
+
+        **Returns**
+            cell: **int**
+                The padded index of the UNDECIDED spot tracing paused at, or
+                -1 if tracing is done
+            s, pending: **int, tuple**
+                The laser that faces that spot and the lasers left, when
+                paused
+            covered: **int**
+                Bitmask of the goal points hit. It equals goal_mask only if
+                every goal point was hit.
+        '''
+        trans = self.trans
+        jump = self.jump
+        jump_bent = self.jump_bent
+        jump_front = self.jump_front
+        jump_straight = self.jump_straight
+        reach = self.reach
+        slot_of = self.compiled.slot_of
+        goals = self.jump_goals
+        full = self.goal_mask
+        steps = spawned = 0
+
+        try:
+            while True:
+                while s >= 0:
+                    steps += 1
+                    g = goals[s]
+                    if g:
+                        covered |= g
+                        if covered == full:
+                            # done, drop the lasers left
+                            return -1, -1, None, covered
+                    cell = jump_front[s]
+                    if touch is not None:
+                        k = slot_of[cell]
+                        if k >= 0:
+                            touch(s, k, covered, pending)
+                    t = cells[cell]
+                    if t == UNDECIDED:
+                        return cell, s, pending, covered
+                    if not t and not jump_bent[s]:
+                        s = jump_straight[s]
+                        continue
+                    d = jump[s]
+                    if d < 0 or seen[d]:
+                        # out of the grid, or traced from here already
+                        break
+                    seen[d] = 1
+                    marked.append(d)
+                    if not t:
+                        s = jump_straight[s]
+                        continue
+                    if t == 3:
+                        # the refracted laser carries on straight
+                        nxt = trans[d << 2]
+                        if nxt >= 0:
+                            pending = (nxt, pending)
+                            spawned += 1
+                    s = trans[(d << 2) | t]
+
+                    if fail_fast:
+                        # give up once the goal points left are out of reach
+                        avail = covered
+                        if s >= 0:
+                            avail |= reach[s]
+                        rest = pending
+                        while rest is not None:
+                            avail |= reach[rest[0]]
+                            rest = rest[1]
+                        if avail != full:
+                            return -1, -1, None, covered
+                if pending is None:
+                    return -1, -1, None, covered
+                s, pending = pending
+        finally:
+            self.steps += steps
+            self.spawned += spawned
+
+    def trace_goals(self, cells, fail_fast=True):
+        '''
+        Traces lasers through a board only as far as needed to tell whether
+        it hits every goal point. Tracing returns as soon as all goal points
+        are hit. Lasers jump from one decision state to the next, see
+        get_jumps(), so only open spots and fixed refractive blocks cost a
+        step.
+        * with fail_fast, tracing also stops once the lasers left can not
+          reach the goal points not hit yet, checked every time a laser
+          meets a block
+
+        **Parameters**
+            cells: **bytearray**
+                Padded buffer of block types, see CompiledBoard
+            fail_fast: **bool**
+                Stop early on boards that can no longer be solved.
+                Defaults to True.
+
+        **Returns**
+            covered: **int**
+                Bitmask of the goal points hit. It equals goal_mask only if
+                the board solves the puzzle.
+        '''
+        return self.follow(cells, -1, self.pending_starts, 0,
+                           bytearray(len(self.front)), [], fail_fast)[3]
+
+    def trace_signature(self, cells, fail_fast=True):
+        '''
+        Same as trace_goals(), but also records which open spots the lasers
+        were about to hit, in the order they first did. The result depends
+        only on the blocks in those spots, so it holds for every
+        configuration that agrees on them.
+
+        **Parameters**
+            cells: **bytearray**
+                Padded buffer of block types, see CompiledBoard
+            fail_fast: **bool**
+                Stop early on boards that can no longer be solved, see
+                trace_goals(). Defaults to True.
+
+        **Returns**
+            covered: **int**
+                Bitmask of the goal points hit
+            touched: **list**
+                Numbers of the open spots the lasers reached
+        '''
+        touched = []
+        found = bytearray(len(self.compiled.slots))
+
+        def touch(s, k, covered, pending):
+            if not found[k]:
+                found[k] = 1
+                touched.append(k)
+
+        covered = self.follow(cells, -1, self.pending_starts, 0,
+                              bytearray(len(self.front)), [], fail_fast,
+                              touch=touch)[3]
+        return covered, touched
+
+    def path_array(self, hits):
+        '''
+        Converts hit positions to a laser path array like the one
+        get_laser_path() returns.
+
+        **Parameters**
+            hits: **set**
+                Padded indices of every grid position a laser passed
+
+        **Returns**
+            laser_path: **np.array**
+                0 for no laser, 1 for laser.
+        '''
+        compiled = self.compiled
+        laser_path = np.zeros((compiled.height, compiled.width), dtype=int)
+        for idx in hits:
+            y, x = divmod(idx, compiled.stride)
+            laser_path[y - 1][x - 1] = 1
+
+        return laser_path
+
+
+class AnytimeResult(namedtuple('AnytimeResult', ['solved', 'config', 'hits',
+                                                   'goals', 'cursor',
+                                                   'stats'])):
+    '''
+    What Grid.solve_anytime() found within its budget.
+
+    **Attributes**
+        solved: *bool*
+            True if config hits every goal point
+        config: *tuple or None*
+            The configuration hitting the most goal points, None if no
+            config was checked
+        hits: *int*
+            Number of goal points config hits
+        goals: *int*
+            Number of distinct goal points
+        cursor: *int or None*
+            Rank of the next config to check, to pass back to
+            solve_anytime(), or None once every config has been checked
+        stats: *dict*
+            SolverMetrics.snapshot() at the end of the search
+    '''
+    __slots__ = ()
+
+
+# integer aliases of the block types in block_dict
+BLOCK_ALIASES = {
+    'reflective_blocks': 1,
+    'opaque_blocks': 2,
+    'refractive_blocks': 3,
+}
+
+# the search engines of Grid.find_solution()
+ENGINES = ('scan', 'backtrack', 'bestfirst', 'numpy', 'incremental')
+
+# marks an open spot BacktrackSearch has not decided yet
+UNDECIDED = 4
+
+# laser directions (vx, vy), in the order of direction()
+DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def direction(vx, vy):
+    '''
+    Number a laser direction 0 to 3.
+
+    **Parameters**
+        vx, vy: **int**
+            Laser direction, each 1 or -1
+
+    **Returns**
+        *int*
+            Index of the direction in DIRECTIONS
+    '''
+    return (vx < 0) * 2 + (vy < 0)
+
+
+class BacktrackSearch:
+    def __init__(self, tracer, block_counts, deadline=None, metrics=None):
+        '''
+        A laser-driven backtracking search. Lasers are traced with the
+        LaserTracer tables over a board whose open spots all start
+        undecided. The first time a laser is about to hit an undecided spot,
+        the search branches on what goes there (a block type with blocks
+        left, or nothing) and carries on tracing, undoing the choice when
+        the branch is done. Spots no laser reaches are never decided, so
+        configurations that only differ there are never told apart.
+        * a branch is cut when the lasers left can not reach the goal points
+          not hit yet, using LaserTracer.reach
+        * blocks left over when every goal is hit go in undecided spots,
+          which no laser reached
+
+        **Attributes**
+            tracer: *LaserTracer*
+                The tables to trace with
+            block_counts: *dict*
+                Number of blocks to place, keyed by block alias
+            nodes: *int*
+                Number of open spots decided so far, over all branches
+            path: *list*
+                What was put in each open spot decided on the current
+                branch, in the order they were decided. A search given it
+                with replay() carries on from this branch.
+            deadline: *float*
+                time.time() after which the search raises TimeoutError
+            metrics: *SolverMetrics*
+                Updated with the decisions made, as configs_evaluated
+
+        **Parameters**
+
+            tracer: *LaserTracer*
+                The tables to trace with
+            block_counts: *dict*
+                Keys are block aliases (1, 2 or 3), values are the number of
+                blocks to place
+            deadline: *float, optional*
+                time.time() after which the search raises TimeoutError.
+                Checked every 1024 decisions.
+            metrics: *SolverMetrics, optional*
+                Where to count decisions. Defaults to a new one.
+        '''
+        self.tracer = tracer
+        self.block_counts = dict(block_counts)
+        self.nodes = 0
+        self.path = []
+        self.deadline = deadline
+        self.metrics = metrics if metrics is not None else SolverMetrics()
+        self._next_check = self.metrics.interval
+        self._replay = None
+
+    def replay(self, path):
+        '''
+        Makes solutions() skip the branches a search had finished when its
+        path was saved, and start again at that path's last decision.
+        Branches are always tried in the same order, so every branch before
+        the saved one was already searched.
+
+        **Parameters**
+            path: **list or None**
+                A saved path. None (or an empty list) searches everything.
+        '''
+        self._replay = list(path) if path else None
+
+    def solutions(self):
+        '''
+        Searches for boards that hit every goal point.
+
+        **Returns**
+            *generator*
+                Partial configurations, one per solution found. Each is a
+                tuple with the block alias of every decided spot and None for
+                spots no laser reached. See complete() and completions().
+        '''
+        compiled = self.tracer.compiled
+        self._cells = bytearray(compiled.template)
+        # states met at a block on the current branch, see _walk()
+        self._seen = bytearray(len(self.tracer.front))
+        for cell in compiled.slot_cells:
+            self._cells[cell] = UNDECIDED
+        self._left = [0, 0, 0, 0]
+        for block_type, count in self.block_counts.items():
+            self._left[block_type] = count
+        # undecided spots, and how many of them must take a block
+        self._free = len(compiled.slot_cells)
+        if sum(self._left) > self._free:
+            return
+
+        pending = self.tracer.pending_starts
+        if pending is None:
+            if self.tracer.goal_mask == 0:
+                yield self._assignment()
+            return
+
+        s, pending = pending
+        yield from self._walk(s, pending, 0)
+
+    def _walk(self, s, pending, covered):
+        # trace laser s, then the pending lasers (a linked list of
+        # (state, rest) tuples), branching at every undecided spot. a laser
+        # that meets a block in a state already traced on this branch is
+        # dropped, the states marked here are cleared on the way back
+        seen = self._seen
+        marked = []
+        try:
+            cell, s, pending, covered = self.tracer.follow(
+                self._cells, s, pending, covered, seen, marked)
+            if cell >= 0:
+                yield from self._branch(cell, s, pending, covered)
+            elif covered == self.tracer.goal_mask:
+                yield self._assignment()
+        finally:
+            for d in marked:
+                seen[d] = 0
+
+    def _branch(self, cell, s, pending, covered):
+        # try every block with some left, then leaving the spot empty if
+        # enough undecided spots remain for the blocks left
+        cells = self._cells
+        left = self._left
+        path = self.path
+        self._free -= 1
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            self._next_check = self.metrics.checkpoint(self.nodes,
+                                                       self.deadline)
+
+        skip = ()
+        if self._replay is not None:
+            skip = self._skipped(len(path))
+
+        for block_type in (1, 3, 2):
+            if left[block_type] and block_type not in skip:
+                left[block_type] -= 1
+                cells[cell] = block_type
+                path.append(block_type)
+                yield from self._walk(s, pending, covered)
+                path.pop()
+                left[block_type] += 1
+                # the replayed branch is done, the rest are searched in full
+                self._replay = None
+        if self._free >= left[1] + left[2] + left[3] and 0 not in skip:
+            cells[cell] = 0
+            path.append(0)
+            yield from self._walk(s, pending, covered)
+            path.pop()
+            self._replay = None
+
+        cells[cell] = UNDECIDED
+        self._free += 1
+
+    def _skipped(self, depth):
+        # the choices tried before the replayed one at this depth, which
+        # were searched in full before the path was saved
+        replay = self._replay
+        if depth >= len(replay):
+            self._replay = None
+            return ()
+        order = (1, 3, 2, 0)
+        return order[:order.index(replay[depth])]
+
+    def _assignment(self):
+        cells = self._cells
+        return tuple(None if cells[cell] == UNDECIDED else cells[cell]
+                     for cell in self.tracer.compiled.slot_cells)
+
+    def leftovers(self, assignment):
+        '''
+        Finds the blocks a partial configuration still has to place.
+
+        **Parameters**
+            assignment: **tuple**
+                A partial configuration from solutions()
+
+        **Returns**
+            items: **list**
+                Block aliases, with 0 for spots left empty, that fill the
+                undecided spots
+        '''
+        left = dict(self.block_counts)
+        for val in assignment:
+            if val:
+                left[val] -= 1
+        free = assignment.count(None)
+        items = []
+        for block_type in sorted(left):
+            items.extend([block_type] * left[block_type])
+        return [0] * (free - len(items)) + items
+
+    def completions(self, assignment):
+        '''
+        Every full configuration of a partial one. They all solve the
+        puzzle, since no laser reaches the undecided spots.
+
+        **Parameters**
+            assignment: **tuple**
+                A partial configuration from solutions()
+
+        **Returns**
+            *generator*
+                Configurations as tuples, in lexicographic order of the
+                undecided spots
+        '''
+        for fill in ConfigStream(self.leftovers(assignment)):
+            fill = iter(fill)
+            yield tuple(next(fill) if val is None else val
+                        for val in assignment)
+
+    def count_completions(self, assignment):
+        '''
+        The number of completions(), without listing them.
+
+        **Parameters**
+            assignment: **tuple**
+                A partial configuration from solutions()
+
+        **Returns**
+            *int*
+                Number of full configurations
+        '''
+        counts = {}
+        for val in self.leftovers(assignment):
+            counts[val] = counts.get(val, 0) + 1
+        return multinomial(counts.values())
+
+    def complete(self, assignment):
+        '''
+        The first of completions().
+
+        **Parameters**
+            assignment: **tuple**
+                A partial configuration from solutions()
+
+        **Returns**
+            config: **tuple**
+                A full configuration
+        '''
+        return next(self.completions(assignment))
+
+
+class BestFirstSearch(BacktrackSearch):
+    def __init__(self, tracer, block_counts, deadline=None, metrics=None):
+        '''
+        A best-first version of BacktrackSearch. Lasers are traced over a
+        board of undecided spots in the same way, but every partial
+        placement that stops at an undecided spot is put on a priority
+        queue, and the most promising one is taken off and branched on
+        next, wherever it is in the tree.
+        * partial placements are ranked by the goal points already hit,
+          then by how many of the goal points not hit yet each laser still
+          in flight could reach (LaserTracer.reach), summed over the lasers
+        * ties go to the placement queued last, so equally promising
+          placements are followed down as BacktrackSearch would
+        * the cuts and the partial configurations found are the same as
+          BacktrackSearch's, so completions() works on them
+
+        **Attributes**
+            queued: *int*
+                Most partial placements waiting at once
+
+        **Parameters**
+
+            tracer, block_counts, deadline, metrics:
+                See BacktrackSearch
+        '''
+        BacktrackSearch.__init__(self, tracer, block_counts, deadline,
+                                 metrics)
+        self.queued = 0
+
+    def solutions(self):
+        '''
+        Searches for boards that hit every goal point, most promising
+        placements first.
+
+        **Returns**
+            *generator*
+                Partial configurations, one per solution found, see
+                BacktrackSearch.solutions()
+        '''
+        compiled = self.tracer.compiled
+        slot_cells = compiled.slot_cells
+        self._cells = bytearray(compiled.template)
+        for cell in slot_cells:
+            self._cells[cell] = UNDECIDED
+        # states met at a block by the placement traced last, see _advance()
+        self._seen = bytearray(len(self.tracer.front))
+        self._marked = []
+        total = sum(self.block_counts.values())
+        if total > len(slot_cells):
+            return
+
+        pending = self.tracer.pending_starts
+        if pending is None:
+            if self.tracer.goal_mask == 0:
+                yield self._assignment()
+            return
+
+        # (-hits, -support, order, values, cell, s, pending, covered, marks)
+        heap = []
+        # counts down, so the newest of equal placements comes off first
+        order = itertools.count(0, -1)
+        s, pending = pending
+        values = bytes([UNDECIDED]) * len(slot_cells)
+        result = self._advance(s, pending, 0, ())
+        while True:
+            if result is not None:
+                if result[0] is None:
+                    yield self._assignment()
+                else:
+                    cell, s, pending, covered, marks = result
+                    heapq.heappush(heap, self._score(covered, s, pending) +
+                                   (next(order), values, cell, s, pending,
+                                    covered, marks))
+                    self.queued = max(self.queued, len(heap))
+            if not heap:
+                return
+
+            # branch on the best placement waiting
+            node = heapq.heappop(heap)
+            values, cell, s, pending, covered, marks = node[3:]
+            left = self._load(values)
+            free = values.count(UNDECIDED) - 1
+            k = compiled.slot_of[cell]
+            choices = [t for t in (1, 3, 2) if left[t]]
+            if free >= sum(left):
+                choices.append(0)
+
+            for t in choices:
+                self.nodes += 1
+                if self.nodes >= self._next_check:
+                    self._next_check = self.metrics.checkpoint(
+                        self.nodes, self.deadline)
+                self._cells[cell] = t
+                child = values[:k] + bytes([t]) + values[k + 1:]
+                result = self._advance(s, pending, covered, marks)
+                if result is not None:
+                    if result[0] is None:
+                        yield self._assignment()
+                    else:
+                        heapq.heappush(
+                            heap, self._score(result[3], result[1],
+                                              result[2]) +
+                            (next(order), child) + result)
+                        self.queued = max(self.queued, len(heap))
+            result = None
+
+    def _load(self, values):
+        # write a placement into the board, returns the blocks left by type
+        cells = self._cells
+        left = [0, 0, 0, 0]
+        for block_type, count in self.block_counts.items():
+            left[block_type] = count
+        for cell, val in zip(self.tracer.compiled.slot_cells, values):
+            cells[cell] = val
+            if val and val != UNDECIDED:
+                left[val] -= 1
+        return left
+
+    def _score(self, covered, s, pending):
+        # heap key of a placement, lower is better
+        reach = self.tracer.reach
+        missing = self.tracer.goal_mask & ~covered
+        support = 0
+        if s >= 0:
+            support += bin(reach[s] & missing).count('1')
+        while pending is not None:
+            support += bin(reach[pending[0]] & missing).count('1')
+            pending = pending[1]
+        return (-bin(covered).count('1'), -support)
+
+    def _advance(self, s, pending, covered, marks):
+        # trace from laser s and the pending lasers until an undecided spot
+        # is met. returns (cell, s, pending, covered, marks) paused there,
+        # (None,) if every goal point is hit, or None if the placement is
+        # cut or the lasers run out. marks is a tuple of the states met at
+        # a block, like the seen states of BacktrackSearch._walk()
+        seen = self._seen
+        for d in self._marked:
+            seen[d] = 0
+        for d in marks:
+            seen[d] = 1
+        marked = self._marked = list(marks)
+        cell, s, pending, covered = self.tracer.follow(
+            self._cells, s, pending, covered, seen, marked)
+        if cell >= 0:
+            return cell, s, pending, covered, tuple(marked)
+        if covered == self.tracer.goal_mask:
+            return (None,)
+        return None
+
+
+class BatchTracer:
+    def __init__(self, tracer):
+        '''
+        A NumPy version of LaserTracer that checks many configurations at
+        once. The configurations are rows of a 2-D int array, and the lasers
+        of all of them are stepped together with array gathers, so the
+        Python loop runs once per laser step rather than once per laser step
+        per configuration. Lasers jump between decision states, see
+        LaserTracer.get_jumps().
+        * every (configuration, state) pair is traced at most once, so
+          refracted lasers that meet again are merged
+        * goal bitmasks are int64, so a puzzle can have at most 63 distinct
+          goal points
+        * steps and spawned lasers are added to the LaserTracer counters,
+          one per (configuration, state) pair
+
+        **Attributes**
+            tracer: *LaserTracer*
+                The tables the arrays are copied from
+            front, trans, jump: *np.array*
+                LaserTracer.front, LaserTracer.trans and LaserTracer.jump as
+                int arrays
+            jump_goals: *np.array*
+                LaserTracer.jump_goals as int64
+            starts: *np.array*
+                LaserTracer.starts
+
+        **Parameters**
+
+            tracer: *LaserTracer*
+                The tables to trace with
+        '''
+        if tracer.goal_mask >> 63:
+            raise ValueError("BatchTracer supports at most 63 goal points")
+        self.tracer = tracer
+        self.front = np.array(tracer.front, dtype=np.int64)
+        self.trans = np.array(tracer.trans, dtype=np.int64)
+        self.jump = np.array(tracer.jump, dtype=np.int64)
+        self.jump_goals = np.array(tracer.jump_goals, dtype=np.int64)
+        self.starts = np.array(tracer.starts, dtype=np.int64)
+        self._template = np.frombuffer(bytes(tracer.compiled.template),
+                                       dtype=np.uint8)
+        self._slot_cells = np.array(tracer.compiled.slot_cells,
+                                    dtype=np.int64)
+
+    def solves(self, configs):
+        '''
+        Checks a batch of configurations.
+
+        **Parameters**
+            configs: **np.array**
+                One configuration per row, one column per open spot
+
+        **Returns**
+            *np.array*
+                Boolean vector, True for every configuration that hits all
+                goal points
+        '''
+        configs = np.asarray(configs, dtype=np.uint8)
+        n = len(configs)
+        cells_size = len(self._template)
+        states = len(self.front)
+        tracer = self.tracer
+        full = tracer.goal_mask
+
+        cells = np.tile(self._template, n)
+        slots = (np.arange(n)[:, None] * cells_size +
+                 self._slot_cells[None, :])
+        cells[slots.ravel()] = configs.ravel()
+
+        covered = np.zeros(n, dtype=np.int64)
+        visited = np.zeros(n * states, dtype=bool)
+        beam_cfg = np.repeat(np.arange(n, dtype=np.int64), len(self.starts))
+        beam_state = np.tile(self.starts, n)
+
+        while len(beam_state):
+            # drop beams already traced, and duplicates within this step
+            key = beam_cfg * states + beam_state
+            key, first = np.unique(key, return_index=True)
+            fresh = ~visited[key]
+            visited[key] = True
+            beam_cfg = beam_cfg[first[fresh]]
+            beam_state = beam_state[first[fresh]]
+            tracer.steps += len(beam_state)
+
+            bits = self.jump_goals[beam_state]
+            hit = bits != 0
+            if hit.any():
+                np.bitwise_or.at(covered, beam_cfg[hit], bits[hit])
+                # solved boards need no more tracing
+                open_cfg = covered[beam_cfg] != full
+                beam_cfg = beam_cfg[open_cfg]
+                beam_state = beam_state[open_cfg]
+
+            # jump to the next decision state
+            beam_state = self.jump[beam_state]
+            live = beam_state >= 0
+            beam_cfg = beam_cfg[live]
+            beam_state = beam_state[live]
+
+            block = cells[beam_cfg * cells_size + self.front[beam_state]]
+            nxt = self.trans[beam_state * 4 + block]
+            refract = block == 3
+            split_cfg = beam_cfg[refract]
+            split_state = self.trans[beam_state[refract] * 4]
+            tracer.spawned += int(np.count_nonzero(split_state >= 0))
+
+            beam_cfg = np.concatenate((beam_cfg, split_cfg))
+            beam_state = np.concatenate((nxt, split_state))
+            live = beam_state >= 0
+            beam_cfg = beam_cfg[live]
+            beam_state = beam_state[live]
+
+        return covered == full
+
+
+class IncrementalTracer:
+    def __init__(self, tracer):
+        '''
+        A LaserTracer that remembers how it traced the last board, so a
+        board that differs in a few open spots is only traced again from
+        the first time a laser met one of them. Everything before that
+        point is the same on both boards.
+        * tracing follows LaserTracer.trace_goals(), stopping early the
+          same way, so spots a laser never met before the stop can change
+          without any tracing at all
+        * the lasers still to trace are kept as an immutable linked list of
+          (state, rest) tuples, so saving them at every event is free
+
+        **Attributes**
+            tracer: *LaserTracer*
+                The tables to trace with
+            events: *list*
+                (state, covered, pending lasers, open spot, states marked
+                seen so far) every time a laser met an open spot, in order
+            first_touch: *list*
+                For every open spot, the index of the first event that met
+                it, or NEVER
+            covered: *int*
+                Bitmask of the goal points hit on the last board
+
+        **Parameters**
+
+            tracer: *LaserTracer*
+                The tables to trace with
+        '''
+        self.tracer = tracer
+        self.events = []
+        self.first_touch = [self.NEVER] * len(tracer.compiled.slots)
+        self.covered = 0
+        # states met at a block, and the order they were marked in
+        self._seen = bytearray(len(tracer.front))
+        self._marked = []
+
+    # first_touch of an open spot no laser met
+    NEVER = sys.maxsize
+
+    def trace(self, cells):
+        '''
+        Traces a board from scratch.
+
+        **Parameters**
+            cells: **bytearray**
+                Padded buffer of block types, see CompiledBoard
+
+        **Returns**
+            covered: **int**
+                Bitmask of the goal points hit
+        '''
+        self.events = []
+        self.first_touch = [self.NEVER] * len(self.first_touch)
+        seen = self._seen
+        for d in self._marked:
+            seen[d] = 0
+        self._marked = []
+        pending = self.tracer.pending_starts
+        if pending is None:
+            self.covered = 0
+            return 0
+        s, pending = pending
+        return self._run(cells, s, 0, pending)
+
+    def update(self, cells, changed):
+        '''
+        Traces a board that differs from the last one only in some open
+        spots.
+
+        **Parameters**
+            cells: **bytearray**
+                Padded buffer of block types, see CompiledBoard
+            changed: **iterable**
+                Numbers of the open spots that changed
+
+        **Returns**
+            covered: **int**
+                Bitmask of the goal points hit
+        '''
+        first_touch = self.first_touch
+        event = self.NEVER
+        for k in changed:
+            if first_touch[k] < event:
+                event = first_touch[k]
+        if event == self.NEVER:
+            return self.covered
+
+        events = self.events
+        s, covered, pending, k, marks = events[event]
+        # forget everything from that event on
+        for old in events[event:]:
+            if first_touch[old[3]] >= event:
+                first_touch[old[3]] = self.NEVER
+        del events[event:]
+        seen = self._seen
+        marked = self._marked
+        for d in marked[marks:]:
+            seen[d] = 0
+        del marked[marks:]
+
+        return self._run(cells, s, covered, pending)
+
+    def _run(self, cells, s, covered, pending):
+        # trace_goals() from laser state s onwards, logging events
+        events = self.events
+        first_touch = self.first_touch
+        never = self.NEVER
+        marked = self._marked
+
+        def touch(s, k, covered, pending):
+            if first_touch[k] == never:
+                first_touch[k] = len(events)
+            events.append((s, covered, pending, k, len(marked)))
+
+        covered = self.tracer.follow(cells, s, pending, covered, self._seen,
+                                     marked, touch=touch)[3]
+        self.covered = covered
+        return covered
+
+
+class TraceCache:
+    def __init__(self, maxsize=65536):
+        '''
+        A cache of trace results keyed by the blocks in the open spots the
+        lasers actually reached. It is stored as a decision tree: the root
+        names the first spot every trace reaches, and the block found there
+        picks the branch naming the next spot, and so on down to a stored
+        result. Looking a configuration up only reads the spots its trace
+        would read.
+        * results are evicted least recently used first once more than
+          maxsize are stored
+
+        **Attributes**
+            maxsize: *int*
+                Most results kept
+            hits: *int*
+                Lookups that found a result
+            misses: *int*
+                Lookups that did not
+            evictions: *int*
+                Results dropped to stay under maxsize
+            tracer: *LaserTracer*
+                The puzzle the results belong to, set on first use
+
+        **Parameters**
+
+            maxsize: *int*
+                Most results kept. Defaults to 65536.
+        '''
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tracer = None
+        # an inner node is [spot, {block: child}], a result is a tuple
+        self._root = None
+        self._lru = OrderedDict()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def bind(self, tracer):
+        '''
+        Ties the cache to one puzzle. Results from another puzzle's tracer
+        would be wrong, so binding a second tracer raises ValueError.
+
+        **Parameters**
+            tracer: **LaserTracer**
+                The tracer the cached results come from
+        '''
+        if self.tracer is None:
+            self.tracer = tracer
+        elif self.tracer is not tracer:
+            raise ValueError("TraceCache is already used for another puzzle")
+
+    def lookup(self, config):
+        '''
+        Finds the stored result for a configuration.
+
+        **Parameters**
+            config: **tuple**
+                A configuration of the available spots
+
+        **Returns**
+            *tuple or None*
+                (covered, last) where covered is the goal bitmask and last is
+                the highest spot number the trace reached (-1 for none), or
+                None on a miss
+        '''
+        node = self._root
+        key = []
+        while isinstance(node, list):
+            val = config[node[0]]
+            key.append(val)
+            node = node[1].get(val)
+
+        if node is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._lru.move_to_end(tuple(key))
+        return node
+
+    def store(self, config, touched, covered):
+        '''
+        Stores a trace result.
+
+        **Parameters**
+            config: **tuple**
+                The configuration that was traced
+            touched: **list**
+                Open spots the trace reached, in order, from trace_signature()
+            covered: **int**
+                Bitmask of the goal points hit
+
+        **Returns**
+            result: **tuple**
+                (covered, last), as lookup() would return it
+        '''
+        result = (covered, max(touched) if touched else -1)
+        key = tuple(config[k] for k in touched)
+
+        if not touched:
+            self._root = result
+        else:
+            if self._root is None:
+                self._root = [touched[0], {}]
+            node = self._root
+            for depth, k in enumerate(touched):
+                children = node[1]
+                if depth + 1 == len(touched):
+                    children[key[depth]] = result
+                else:
+                    node = children.setdefault(key[depth],
+                                               [touched[depth + 1], {}])
+
+        self._lru[key] = None
+        if len(self._lru) > self.maxsize:
+            self._evict(self._lru.popitem(last=False)[0])
+
+        return result
+
+    def _evict(self, key):
+        # remove a result and the inner nodes left without children
+        if not key:
+            self._root = None
+            self.evictions += 1
+            return
+
+        path = []
+        node = self._root
+        for val in key:
+            path.append((node, val))
+            node = node[1][val]
+        for node, val in reversed(path):
+            del node[1][val]
+            if node[1]:
+                break
+        else:
+            self._root = None
+        self.evictions += 1
+
+
+class ConfigStream:
+    def __init__(self, items, start=0, stop=None):
+        '''
+        A lazy stream of the distinct permutations of a list of block
+        aliases, in lexicographic order. Permutations are ranked 0 to
+        total - 1, so a stream can start (or resume) at any rank without
+        producing the ones before it.
+
+        **Attributes**
+            items: *tuple*
+                The sorted block aliases being permuted
+            counts: *dict*
+                Number of copies of each alias
+            total: *int*
+                Number of distinct permutations (the multinomial coefficient)
+            start: *int*
+                Rank of the first permutation produced
+            stop: *int*
+                Rank one past the last permutation produced
+
+        **Parameters**
+
+            items: *list*
+                The list of options for open spots
+            start: *int*
+                Rank of the first permutation to produce. Defaults to 0.
+            stop: *int, optional*
+                Rank to stop before. Defaults to the total count.
+        '''
+        self.items = tuple(sorted(items))
+        self.counts = {}
+        for item in self.items:
+            self.counts[item] = self.counts.get(item, 0) + 1
+        self.total = multinomial(self.counts.values())
+
+        if stop is None or stop > self.total:
+            stop = self.total
+        self.start = max(0, start)
+        self.stop = max(self.start, stop)
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        '''
+        Produce the permutations from start to stop one at a time. The first
+        one is unranked directly, the rest follow by stepping to the next
+        permutation in lexicographic order.
+        * sending an index k to the generator (it.send(k)) skips every
+          remaining permutation that shares the first k + 1 items with the
+          last one produced. send() returns the number skipped.
+        '''
+        remaining = self.stop - self.start
+        if remaining <= 0:
+            return
+
+        perm = list(self.unrank(self.start))
+        n = len(perm)
+
+        while True:
+            skip = yield tuple(perm)
+            remaining -= 1
+            if skip is not None:
+                # jump to the last permutation with the same prefix
+                tail = perm[skip + 1:]
+                tail_stream = ConfigStream(tail)
+                skipped = min(remaining, tail_stream.total - 1 -
+                              tail_stream.rank(tail))
+                remaining -= skipped
+                tail.sort(reverse=True)
+                perm[skip + 1:] = tail
+                yield skipped
+            if remaining <= 0:
+                return
+
+            # find the rightmost ascent
+            i = n - 2
+            while i >= 0 and perm[i] >= perm[i + 1]:
+                i -= 1
+            if i < 0:
+                return
+            # swap it with the rightmost larger element and reverse the tail
+            j = n - 1
+            while perm[j] <= perm[i]:
+                j -= 1
+            perm[i], perm[j] = perm[j], perm[i]
+            perm[i + 1:] = perm[:i:-1]
+
+    def unrank(self, rank):
+        '''
+        Find the permutation at a given rank without enumerating the ones
+        before it.
+
+        **Parameters**
+
+            rank: *int*
+                Position of the permutation in lexicographic order
+
+        **Returns**
+
+            config: *tuple*
+                The permutation at that rank
+        '''
+        if rank < 0 or rank >= self.total:
+            raise IndexError("rank %d out of range" % rank)
+
+        counts = dict(self.counts)
+        values = sorted(counts)
+        left = len(self.items)
+        # number of permutations of the items not yet placed
+        block = self.total
+        config = []
+
+        for _ in range(len(self.items)):
+            for val in values:
+                if counts[val] == 0:
+                    continue
+                # permutations that put val in this spot
+                size = block * counts[val] // left
+                if rank < size:
+                    config.append(val)
+                    counts[val] -= 1
+                    block = size
+                    break
+                rank -= size
+            left -= 1
+
+        return tuple(config)
+
+    def rank(self, config):
+        '''
+        Find the rank of a permutation, the inverse of unrank().
+
+        **Parameters**
+
+            config: *list*
+                A permutation of the items
+
+        **Returns**
+
+            rank: *int*
+                Position of the permutation in lexicographic order
+        '''
+        counts = dict(self.counts)
+        values = sorted(counts)
+        left = len(self.items)
+        block = self.total
+        rank = 0
+
+        for item in config:
+            for val in values:
+                if counts[val] == 0:
+                    continue
+                size = block * counts[val] // left
+                if val == item:
+                    counts[val] -= 1
+                    block = size
+                    break
+                rank += size
+            left -= 1
+
+        return rank
+
+
+class GrayConfigStream:
+    def __init__(self, items, start=None):
+        '''
+        A stream of the distinct permutations of a list of block aliases in
+        which every permutation differs from the one before it by swapping
+        two spots, so a solver only has to look at what those two spots
+        changed.
+        * the order is built like the recursion of a Gray code: every
+          alias the last spot can hold is swapped into it once, and between
+          swaps the spots before it run through all their own permutations
+          the same way
+        * any permutation can be the first one
+
+        **Attributes**
+            items: *tuple*
+                The sorted block aliases being permuted
+            counts: *dict*
+                Number of copies of each alias
+            total: *int*
+                Number of distinct permutations
+            start: *tuple*
+                The first permutation produced
+
+        **Parameters**
+
+            items: *list*
+                The list of options for open spots
+            start: *list, optional*
+                The first permutation, an arrangement of items. Defaults to
+                the sorted items.
+        '''
+        self.items = tuple(sorted(items))
+        self.counts = {}
+        for item in self.items:
+            self.counts[item] = self.counts.get(item, 0) + 1
+        self.total = multinomial(self.counts.values())
+        if start is None:
+            start = self.items
+        if sorted(start) != list(self.items):
+            raise ValueError("start is not an arrangement of the items")
+        self.start = tuple(start)
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        '''
+        Produce the permutations one at a time, as tuples.
+        '''
+        for perm, swap in self.changes():
+            yield tuple(perm)
+
+    def changes(self):
+        '''
+        Produce the permutations together with what changed.
+
+        **Returns**
+            *generator*
+                (perm, swap) pairs. perm is the same list every time,
+                changed in place. swap is the (i, j) pair of spots swapped
+                to reach it, or None for the first permutation.
+        '''
+        perm = list(self.start)
+        yield perm, None
+        for i, j in self.swaps():
+            perm[i], perm[j] = perm[j], perm[i]
+            yield perm, (i, j)
+
+    def swaps(self):
+        '''
+        Produce the swaps that walk from start through every permutation.
+
+        **Returns**
+            *generator*
+                (i, j) pairs of spots, i < j, total - 1 of them
+        '''
+        perm = list(self.start)
+        values = sorted(self.counts)
+        # copies of each alias, indexed by alias
+        counts = [0] * (max(values) + 1 if values else 0)
+        for val in values:
+            counts[val] = self.counts[val]
+        # one frame per spot whose alias is being cycled, deepest last: the
+        # spot (length - 1) and the aliases it has not held yet. counts
+        # always holds the aliases before the deepest frame's spot
+        frames = []
+        length = len(perm)
+
+        while True:
+            # go down to the shortest prefix that still has a choice
+            while length > 1:
+                last = perm[length - 1]
+                counts[last] -= 1
+                todo = [val for val in values if counts[val] and val != last]
+                frames.append((length, todo))
+                if not todo:
+                    break
+                length -= 1
+            # back up to the deepest spot with an alias left to try
+            while frames and not frames[-1][1]:
+                length = frames.pop()[0]
+                counts[perm[length - 1]] += 1
+            if not frames:
+                return
+
+            length, todo = frames[-1]
+            val = todo.pop()
+            j = length - 1
+            i = perm.index(val, 0, j)
+            counts[val] -= 1
+            counts[perm[j]] += 1
+            perm[i] = perm[j]
+            perm[j] = val
+            yield i, j
+            length = j
+
+
+def multinomial(counts):
+    '''
+    Number of distinct permutations of a multiset.
+
+    **Parameters**
+
+        counts: *iterable*
+            Number of copies of each distinct element
+
+    **Returns**
+
+        *int*
+            (sum of counts)! / (product of count!)
+    '''
+    total = 1
+    n = 0
+    for count in counts:
+        # build the product of binomials one element at a time
+        for i in range(1, count + 1):
+            n += 1
+            total = total * n // i
+
+    return total
+
+
+class SolverMetrics:
+    def __init__(self, progress=None, every=10000):
+        '''
+        Counters and timings of a solve, with an optional progress callback.
+        A Grid owns one and its find_solution() engines update it as they
+        go, so it can be read during a solve (from the callback) or after
+        it, even after a TimeoutError.
+        * counters are read from the tracer and cache at checkpoints, every
+          1024 configs (or every `every` configs if that is smaller), so
+          the hot loops only pay for a local step count
+        * phase_times may overlap: 'solution' is part of 'search'
+
+        **Attributes**
+            configs_evaluated: *int*
+                Configs checked (open spots decided for 'backtrack')
+            configs_skipped: *int*
+                Configs passed over unchecked, see TraceCache
+            tracer_steps: *int*
+                Laser steps taken by the tracers (the Edge tracer used with
+                slow=True is not counted)
+            beams_spawned: *int*
+                Lasers started by refractive blocks
+            cache_hits, cache_misses: *int*
+                TraceCache lookups that did and did not find a result
+            total: *int or None*
+                Configs the search covers, if known, for the ETA
+            phase_times: *dict*
+                Seconds spent in each phase, keyed by name ('parse',
+                'compile', 'analysis', 'search' and 'solution')
+            progress: *function or None*
+                Called with a snapshot() every `every` configs
+            every: *int*
+                Configs between progress calls
+            saver: *SearchCheckpoint or None*
+                Told the position at every checkpoint() while a search
+                saves to it, see SearchCheckpoint.watch()
+
+        **Parameters**
+
+            progress: *function, optional*
+                Called with a snapshot() dict as the search goes, see
+                print_progress()
+            every: *int*
+                Configs between progress calls. Defaults to 10000.
+        '''
+        self.progress = progress
+        self.every = max(1, every)
+        self.phase_times = {}
+        self.saver = None
+        self.start()
+
+    # names of the counters, as returned by counters()
+    COUNTERS = ('configs_evaluated', 'configs_skipped', 'tracer_steps',
+                'beams_spawned', 'cache_hits', 'cache_misses')
+
+    def start(self, total=None, tracer=None, cache=None):
+        '''
+        Resets the counters for a new search.
+
+        **Parameters**
+            total: **int, optional**
+                Configs the search covers
+            tracer: **LaserTracer, optional**
+                The tracer to read steps and spawned lasers from
+            cache: **TraceCache, optional**
+                The cache to read hits and misses from
+        '''
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.total = total
+        self._tracer = tracer
+        self._cache = cache
+        # counts the tracer and cache had before this search
+        self._base = self._read()
+        self._started = time.perf_counter()
+        self._next_report = self.every
+        self.interval = min(1024, self.every) if self.progress else 1024
+
+    def _read(self):
+        tracer = self._tracer
+        cache = self._cache
+        return (tracer.steps if tracer else 0, tracer.spawned if tracer else 0,
+                cache.hits if cache else 0, cache.misses if cache else 0)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''
+        Adds the time spent in a with block to phase_times[name].
+
+        **Parameters**
+            name: **str**
+                The phase
+        '''
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = (self.phase_times.get(name, 0.0) +
+                                      time.perf_counter() - started)
+
+    def update(self, configs):
+        '''
+        Records the configs checked so far, reads the tracer and cache
+        counters, and calls progress if it is due.
+
+        **Parameters**
+            configs: **int**
+                Configs checked since start()
+        '''
+        self.configs_evaluated = configs
+        now = self._read()
+        (self.tracer_steps, self.beams_spawned,
+         self.cache_hits, self.cache_misses) = [
+            a - b for a, b in zip(now, self._base)]
+        self._report()
+
+    def merge(self, counters):
+        '''
+        Adds counters from another process, see counters(), and calls
+        progress if it is due. Raises ValueError for a name not in
+        COUNTERS, and changes no counter then.
+
+        **Parameters**
+            counters: **dict**
+                Counter values keyed by name
+        '''
+        totals = {}
+        for name, value in counters.items():
+            if name not in self.COUNTERS:
+                raise ValueError("Unknown counter %r" % (name,))
+            totals[name] = getattr(self, name) + value
+        for name, value in totals.items():
+            setattr(self, name, value)
+        self._report()
+
+    def _report(self):
+        if self.progress is not None and \
+                self.configs_evaluated >= self._next_report:
+            self._next_report = self.configs_evaluated + self.every
+            self.progress(self.snapshot())
+
+    def checkpoint(self, count, deadline=None):
+        '''
+        update(), tell saver the position, then raise TimeoutError if the
+        deadline has passed.
+
+        **Parameters**
+            count: **int**
+                Configs checked since start()
+            deadline: **float, optional**
+                time.time() to stop at
+
+        **Returns**
+            *int*
+                The count to call checkpoint() at next
+        '''
+        self.update(count)
+        if self.saver is not None:
+            self.saver.tick(count)
+        if deadline is not None and time.time() > deadline:
+            raise TimeoutError("No Solution Found in time (%d checked)"
+                               % count)
+        return count + self.interval
+
+    def counters(self):
+        '''
+        The counters as a dictionary, keyed by the names in COUNTERS.
+        '''
+        return dict((name, getattr(self, name)) for name in self.COUNTERS)
+
+    def elapsed(self):
+        '''
+        Seconds since start().
+        '''
+        return time.perf_counter() - self._started
+
+    def snapshot(self):
+        '''
+        The state of the search, as passed to progress.
+
+        **Returns**
+            snapshot: **dict**
+                The counters, plus elapsed seconds, rate (configs checked
+                per second), done (configs checked or skipped), total, and
+                eta (seconds left at the current rate). total and eta are
+                None when the total is not known.
+        '''
+        snapshot = self.counters()
+        elapsed = self.elapsed()
+        done = self.configs_evaluated + self.configs_skipped
+        snapshot['elapsed'] = elapsed
+        snapshot['rate'] = self.configs_evaluated / elapsed if elapsed else 0.0
+        snapshot['done'] = done
+        snapshot['total'] = self.total
+        snapshot['eta'] = None
+        if self.total is not None and done:
+            snapshot['eta'] = max(0, self.total - done) * elapsed / done
+
+        return snapshot
+
+
+def print_progress(snapshot):
+    '''
+    A progress callback for SolverMetrics that writes one line to stderr.
+
+    **Parameters**
+        snapshot: **dict**
+            See SolverMetrics.snapshot()
+    '''
+    line = '%d configs checked, %.0f/s' % (snapshot['configs_evaluated'],
+                                           snapshot['rate'])
+    if snapshot['total']:
+        line += ', %.1f%% done' % (100.0 * snapshot['done'] /
+                                   snapshot['total'])
+    if snapshot['eta'] is not None:
+        line += ', ETA %.1fs' % snapshot['eta']
+    print(line, file=sys.stderr)
+
+
+class SearchCheckpoint:
+    def __init__(self, path, every=60.0):
+        '''
+        A small JSON file holding the position of a find_solution() search,
+        so a search that is killed, preempted or timed out can carry on
+        where it stopped instead of starting over.
+        * engine 'scan' saves the rank of the next config to check, engine
+          'backtrack' the decisions on its current branch (see
+          BacktrackSearch.path)
+        * the counters and seconds spent so far and the puzzle's bff text
+          are saved with it, so resume_search() needs nothing but the file
+        * the file is written to a temporary file and moved over the old
+          one, so a search killed while saving leaves the last checkpoint
+          whole
+        * a search that finishes saves its result, status 'solved' with the
+          config or 'no_solution' with the error
+
+        **Attributes**
+            path: *str*
+                The checkpoint file
+            every: *float*
+                Seconds between saves
+            saves: *int*
+                Times the file was written
+            state: *dict or None*
+                The state last read or written: version, digest (see
+                Puzzle.digest()), bff, engine, status ('running', 'solved'
+                or 'no_solution'), position ({'rank': int} or
+                {'path': list}), config, error, counters (summed over every
+                run, keyed like SolverMetrics.counters()), elapsed and saved
+                (time.time())
+            position: *dict*
+                The position saved next
+
+        **Parameters**
+
+            path: *str*
+                The checkpoint file, written when a search starts
+            every: *float*
+                Seconds between saves. Defaults to 60.
+        '''
+        self.path = path
+        self.every = every
+        self.saves = 0
+        self.state = None
+        self.position = None
+        self._puzzle = None
+        self._engine = None
+        self._metrics = None
+        self._position_of = None
+        self._counters = {}
+        self._elapsed = 0.0
+        self._next_save = 0.0
+
+    # format of the file, saved as its version
+    VERSION = 1
+
+    def load(self):
+        '''
+        Reads the checkpoint file into state.
+
+        **Returns**
+            state: **dict or None**
+                The saved state, None if there is no file yet
+        '''
+        try:
+            with open(self.path) as file:
+                self.state = json.load(file)
+        except FileNotFoundError:
+            return None
+
+        return self.state
+
+    def begin(self, grid, engine):
+        '''
+        Ties the checkpoint to a search and reads what was saved before.
+        Raises ValueError if the file was saved for another puzzle or
+        engine, since its position would mean nothing here.
+
+        **Parameters**
+            grid: **Grid**
+                The puzzle searched
+            engine: **str**
+                'scan' or 'backtrack'
+
+        **Returns**
+            state: **dict or None**
+                The saved state, None if the search starts from scratch
+        '''
+        self._puzzle = grid.puzzle
+        self._engine = engine
+        self._metrics = None
+        self.position = {'rank': 0} if engine == 'scan' else {'path': []}
+        self._counters = dict.fromkeys(SolverMetrics.COUNTERS, 0)
+        self._elapsed = 0.0
+        state = self.load()
+        if state is None:
+            return None
+
+        if state.get('version') != self.VERSION:
+            raise ValueError("Checkpoint %r has unknown version %r"
+                             % (self.path, state.get('version')))
+        # the bff text, not the digest: a backtrack path depends on the
+        # order the lasers are listed in
+        if state['bff'] != grid.puzzle.to_bff():
+            raise ValueError("Checkpoint %r is for another puzzle"
+                             % self.path)
+        if state['engine'] != engine:
+            raise ValueError("Checkpoint %r is for engine %r"
+                             % (self.path, state['engine']))
+        self.position = state['position']
+        self._counters.update(state['counters'])
+        self._elapsed = state['elapsed']
+        return state
+
+    def watch(self, metrics, position):
+        '''
+        Starts saving a running search, at once and then every seconds.
+
+        **Parameters**
+            metrics: **SolverMetrics**
+                The search's metrics. Their checkpoint() calls tick().
+            position: **function**
+                Called with the checkpoint() count, returns the position to
+                save
+        '''
+        self._metrics = metrics
+        self._position_of = position
+        metrics.saver = self
+        self.save()
+
+    def tick(self, count):
+        '''
+        Notes the position of the search, and saves it if a save is due.
+
+        **Parameters**
+            count: **int**
+                The count SolverMetrics.checkpoint() was called with
+        '''
+        self.position = self._position_of(count)
+        if time.time() >= self._next_save:
+            self.save()
+
+    def save(self, status='running', config=None, error=None):
+        '''
+        Writes the checkpoint file.
+
+        **Parameters**
+            status: **str**
+                'running', 'solved' or 'no_solution'. Defaults to 'running'.
+            config: **tuple, optional**
+                The solution, for 'solved'
+            error: **str, optional**
+                The message find_solution() raised, for 'no_solution'
+        '''
+        counters = dict(self._counters)
+        elapsed = self._elapsed
+        if self._metrics is not None:
+            for name, value in self._metrics.counters().items():
+                counters[name] = counters.get(name, 0) + value
+            elapsed += self._metrics.elapsed()
+        state = {
+            'version': self.VERSION,
+            'digest': self._puzzle.digest(),
+            'bff': self._puzzle.to_bff(),
+            'engine': self._engine,
+            'status': status,
+            'position': self.position,
+            'config': None if config is None else [int(val)
+                                                   for val in config],
+            'error': error,
+            'counters': counters,
+            'elapsed': elapsed,
+            'saved': time.time(),
+        }
+
+        # a temporary file of its own, searches saving the same checkpoint
+        # at once must not move each other's file away
+        handle, temp = tempfile.mkstemp(
+            suffix='.tmp', prefix=os.path.basename(self.path) + '.',
+            dir=os.path.dirname(self.path) or '.')
+        try:
+            with os.fdopen(handle, 'w') as file:
+                json.dump(state, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp, self.path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        self.state = state
+        self.saves += 1
+        self._next_save = time.time() + self.every
+
+
+def resume_search(path, timeout=None, every=60.0, metrics=None):
+    '''
+    Carries on a search from its checkpoint file alone. The puzzle is
+    rebuilt from the bff text saved in the file and searched with the engine
+    the search was started with, from the saved position.
+
+    **Parameters**
+
+        path: *str*
+            The checkpoint file, see SearchCheckpoint
+        timeout: *float, optional*
+            Seconds to search before raising TimeoutError
+        every: *float*
+            Seconds between saves. Defaults to 60.
+        metrics: *SolverMetrics, optional*
+            Where to record counters and timings of this run
+
+    **Returns**
+
+        See Grid.find_solution()
+    '''
+    checkpoint = SearchCheckpoint(path, every)
+    state = checkpoint.load()
+    if state is None:
+        raise ValueError("No checkpoint at %r" % path)
+    grid = Grid(parse_bff(state['bff']), metrics)
+
+    return grid.find_solution(engine=state['engine'], timeout=timeout,
+                              checkpoint=checkpoint)
+
+
+def min_line_cover(points):
+    '''
+    Smallest number of diagonal lines (the lines lasers travel along) that
+    together pass every point. Every point lies on one line of each
+    diagonal direction, so this is a minimum vertex cover of a bipartite
+    graph, which has the size of a maximum matching (Konig's theorem).
+
+    **Parameters**
+
+        points: *iterable*
+            (x, y) positions
+
+    **Returns**
+
+        *int*
+            Number of lines needed
+    '''
+    # lines of one direction (x + y) and the lines of the other direction
+    # (x - y) crossing them at a point
+    crossing = {}
+    for x, y in points:
+        crossing.setdefault(x + y, []).append(x - y)
+    matched = {}
+
+    def augment(line, tried):
+        # find a matching that also covers line, by kuhn's algorithm
+        for other in crossing[line]:
+            if other in tried:
+                continue
+            tried.add(other)
+            if other not in matched or augment(matched[other], tried):
+                matched[other] = line
+                return True
+        return False
+
+    return sum(1 for line in crossing if augment(line, set()))
+
+
+def split_ranks(total, chunks):
+    '''
+    Splits the ranks 0 to total - 1 into contiguous ranges of nearly equal
+    size.
+
+    **Parameters**
+
+        total: *int*
+            Number of ranks
+        chunks: *int*
+            Number of ranges wanted
+
+    **Returns**
+
+        ranges: *list*
+            (start, stop) tuples, stop excluded. There are never more ranges
+            than ranks.
+    '''
+    chunks = max(1, min(chunks, total))
+    ranges = []
+    for i in range(chunks):
+        start = total * i // chunks
+        stop = total * (i + 1) // chunks
+        if stop > start:
+            ranges.append((start, stop))
+
+    return ranges
+
+
+# state of a find_solution_parallel() worker process
+_worker = {}
+
+
+def _init_worker(puzzle, stop):
+    # build the puzzle once per worker process
+    _worker['grid'] = Grid(puzzle)
+    _worker['cache'] = TraceCache()
+    _worker['stop'] = stop
+
+
+def _scan_range(task):
+    '''
+    Checks the configs in one rank range on a worker process.
+
+    **Parameters**
+
+        task: *tuple*
+            (items, start, stop), the items of the ConfigStream and the
+            rank range to check
+
+    **Returns**
+
+        config: *tuple or None*
+            The first solution in the range, or None if there is none or
+            another worker already found one
+        counters: *dict*
+            SolverMetrics.counters() for the range
+    '''
+    items, start, stop = task
+    grid = _worker['grid']
+    cache = _worker['cache']
+    stop_event = _worker['stop']
+    metrics = grid.metrics
+    metrics.start(stop - start, grid.tracer, cache)
+    if stop_event.is_set():
+        return None, metrics.counters()
+
+    solution = grid.scan_range(items, start, stop, cache, stop_event.is_set)
+    return solution, metrics.counters()
+
+
+def _solutions_range(task):
+    '''
+    Finds the solutions in one rank range on a worker process, see
+    Grid.iter_solutions().
+
+    **Parameters**
+
+        task: *tuple*
+            (items, start, stop, expand), the items of the ConfigStream, the
+            rank range to check, and whether to list every solution
+
+    **Returns**
+
+        found: *list*
+            (config, n) for the solutions in the range, in order, where
+            config stands for n solutions (always 1 if expand)
+        counters: *dict*
+            SolverMetrics.counters() for the range
+    '''
+    items, start, stop, expand = task
+    grid = _worker['grid']
+    metrics = grid.metrics
+    metrics.start(stop - start, grid.tracer)
+    if _worker['stop'].is_set():
+        return [], metrics.counters()
+
+    found = list(grid._solutions_scan(ConfigStream(items, start, stop), None,
+                                      expand))
+    return found, metrics.counters()
+
+
 if __name__ == "__main__":
     dir = os.getcwd()
     fnames = glob.glob(os.path.join(dir, "*.bff"))
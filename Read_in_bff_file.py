@@ -1,10 +1,244 @@
 '''
 Read in and extract all relevant data from bff file
 '''
-        
-import numpy as np              
 
-def get_grid(fname): 
+from collections import namedtuple
+import hashlib
+import numpy as np
+
+
+class Puzzle(namedtuple('Puzzle', ['grid', 'blocks', 'lasers', 'goals'])):
+    '''
+    Everything in a bff file, read in one pass. A Puzzle is an immutable,
+    hashable tuple, so it can be used as a dictionary key or sent to other
+    processes cheaply.
+
+    **Attributes**
+        grid: *tuple*
+            One string per grid row, with 'o', 'x', 'A', 'B' and 'C' and no
+            spaces
+        blocks: *tuple*
+            (letter, number) pairs of the blocks to place, in A, B, C order
+        lasers: *tuple*
+            (x, y, vx, vy) of every laser
+        goals: *tuple*
+            (x, y) of every goal point
+    '''
+    __slots__ = ()
+
+    def block_dict(self):
+        '''
+        The blocks as a dictionary, like Grid.block_dict.
+
+        **Returns**
+
+            block_dict: *dictionary*
+                A dictionary of blocks. Keys are block types and values are
+                the number of blocks.
+        '''
+        return dict((BLOCK_NAMES[letter], count)
+                    for letter, count in self.blocks)
+
+    def laser_dict(self):
+        '''
+        The lasers as a dictionary, like Grid.laser_dict.
+
+        **Returns**
+
+            laser_dict: *dictionary*
+                A dictionary that contains the laser number and its
+                corresponding integer x, y, vx, vy values as a tuple.
+        '''
+        return dict(enumerate(self.lasers))
+
+    def point_dict(self):
+        '''
+        The goal points as a dictionary, like Grid.point_dict.
+
+        **Returns**
+
+            point_dict: *dictionary*
+                A dictionary that contains the goal point number and it's
+                corresponding coordinates.
+        '''
+        return dict(enumerate(self.goals))
+
+    def canonical(self):
+        '''
+        The same puzzle written one way only: lasers and goal points sorted
+        with duplicates dropped, and block types with no blocks left out.
+        Two files that describe the same puzzle, whatever their comments,
+        spacing or line order, have equal canonical Puzzles.
+
+        **Returns**
+
+            puzzle: *Puzzle*
+                The canonical form of this puzzle
+        '''
+        return Puzzle(self.grid,
+                      tuple((letter, count) for letter, count in self.blocks
+                            if count),
+                      tuple(sorted(set(self.lasers))),
+                      tuple(sorted(set(self.goals))))
+
+    def to_bff(self):
+        '''
+        Writes the puzzle back out as the text of a bff file, which
+        parse_bff() reads back into an equal Puzzle.
+
+        **Returns**
+
+            text: *str*
+                The bff file text, without comments
+        '''
+        lines = ['GRID START']
+        lines.extend(' '.join(row) for row in self.grid)
+        lines.append('GRID STOP')
+        lines.extend('%s %d' % (letter, count)
+                     for letter, count in self.blocks)
+        lines.extend('L %d %d %d %d' % laser for laser in self.lasers)
+        lines.extend('P %d %d' % goal for goal in self.goals)
+
+        return '\n'.join(lines) + '\n'
+
+    def digest(self):
+        '''
+        A content hash of the puzzle, the sha256 of its canonical bff text.
+        Renamed or reformatted copies of a puzzle have the same digest.
+
+        **Returns**
+
+            digest: *str*
+                64 hexadecimal digits
+        '''
+        text = self.canonical().to_bff()
+        return hashlib.sha256(text.encode()).hexdigest()
+
+
+# block letters in bff files and the block_dict keys they stand for
+BLOCK_NAMES = {
+    'A': 'reflective_blocks',
+    'B': 'opaque_blocks',
+    'C': 'refractive_blocks',
+}
+
+
+def parse_bff(source):
+    '''
+    Read a bff puzzle in a single pass over its lines.
+    * anything after a # is a comment
+    * block, laser and goal point lines may come before or after the grid
+    * a grid row with a character other than o, x, A, B and C or a width
+      other than the first row's, a block, laser or goal point line that
+      is not the letter and its whole numbers, or a line outside the grid
+      that starts with anything else, raises ValueError naming the line
+      number
+
+    **Parameters**
+
+        source: *str, bytes or iterable*
+            The text of a bff file, as a string or bytes, or anything that
+            yields its lines, such as an open file
+
+    **Returns**
+
+        puzzle: *Puzzle*
+            The grid, blocks, lasers and goal points
+    '''
+    if isinstance(source, bytes):
+        source = source.decode()
+    if isinstance(source, str):
+        source = source.splitlines()
+
+    in_grid = False
+    grid = []
+    blocks = {}
+    lasers = []
+    goals = []
+
+    for number, line in enumerate(source, 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        # start and stop adding rows at GRID START and GRID STOP
+        if line == 'GRID START':
+            in_grid = True
+        elif line == 'GRID STOP':
+            in_grid = False
+        elif in_grid:
+            row = ''.join(line.split())
+            bad = set(row) - set('oxABC')
+            if bad:
+                raise ValueError("Unknown grid character %r on line %d"
+                                 % (min(bad), number))
+            if grid and len(row) != len(grid[0]):
+                raise ValueError("Grid row on line %d is %d wide, the first "
+                                 "row is %d" % (number, len(row),
+                                                len(grid[0])))
+            grid.append(row)
+        else:
+            fields = line.split()
+            if fields[0] in BLOCK_NAMES:
+                count, = _numbers(fields, number, 'block count',
+                                  fields[0] + ' count')
+                if count < 0:
+                    raise ValueError("Negative block count on line %d"
+                                     % number)
+                blocks[fields[0]] = count
+            elif fields[0] == 'L':
+                laser = _numbers(fields, number, 'laser', 'L x y vx vy')
+                if laser[2] not in (1, -1) or laser[3] not in (1, -1):
+                    raise ValueError("Laser direction on line %d is not "
+                                     "1 or -1" % number)
+                lasers.append(laser)
+            elif fields[0] == 'P':
+                goals.append(_numbers(fields, number, 'goal point', 'P x y'))
+            else:
+                raise ValueError("Unknown line %d, expected a block count, "
+                                 "L or P: %r" % (number, line))
+
+    if not grid:
+        raise ValueError("No grid found between GRID START and GRID STOP")
+
+    return Puzzle(tuple(grid),
+                  tuple((letter, blocks[letter]) for letter in 'ABC'
+                        if letter in blocks),
+                  tuple(lasers), tuple(goals))
+
+
+def _numbers(fields, number, what, form):
+    # the whole numbers after the letter of a bff line
+    values = None
+    if len(fields) == len(form.split()):
+        try:
+            values = tuple(int(i) for i in fields[1:])
+        except ValueError:
+            pass
+    if values is None:
+        raise ValueError("Bad %s on line %d, expected '%s': %r"
+                         % (what, number, form, ' '.join(fields)))
+    return values
+
+
+def read_bff(fname):
+    '''
+    Read a bff file into a Puzzle.
+
+    **Parameters**
+
+        fname: *str*
+            The file name to read in
+
+    **Returns**
+
+        puzzle: *Puzzle*
+            The grid, blocks, lasers and goal points
+    '''
+    with open(fname) as infile:
+        return parse_bff(infile)
+
+
+def get_grid(fname):
     '''
     Get an array of grid elements.
 
@@ -18,21 +252,8 @@ def get_grid(fname):
         grid: *array*
             An array of elements. o is an open spot and x is an unavailable
             spot.
-    '''         
-    infile = open(fname)
-    start_search = False
-    grid_list = []
-    for line in infile:
-        if line.strip() == "GRID START":
-            start_search = True
-            continue
-        elif line.strip() == "GRID STOP":
-            start_search = False
-            continue
-        elif start_search:
-            grid_list.append([i for i in line.strip() if i != ' '])
-
-    grid = np.array(grid_list)
+    '''
+    grid = np.array([list(row) for row in read_bff(fname).grid])
     return grid
 
 
@@ -50,51 +271,8 @@ def get_blocks(fname):
         block_dict: *dictionary*
             A dictionary of blocks. Keys are block types and values are the
             number of blocks.
-    '''  
     '''
-        infile = open(fname)
-    is_grid = False
-    grid_list = []
-    for line in infile:
-        if line.strip() == "GRID START":
-            is_grid = True
-            continue
-        elif line.strip() == "GRID STOP":
-            is_grid = False
-            continue
-        elif is_grid:
-            grid_list.append([i for i in line.strip() if i != ' '])
-    '''
-    
-    dict_A = {}
-    dict_B = {}
-    dict_C = {}
-    start_search = False
-    for line in open(fname):
-        if '#' in line:
-            continue
-        elif line.strip() == 'GRID STOP':
-            start_search = True
-        elif start_search:
-            if 'A ' in line:
-                A_line = [i for i in line.strip() if i != ' ']
-                dict_A['reflective_blocks'] = int(A_line[1])
-            elif 'B ' in line:
-                B_line = [i for i in line.strip() if i != ' ']
-                dict_B['opaque_blocks'] = int(B_line[1])
-            elif 'C ' in line:
-                C_line = [i for i in line.strip() if i != ' ']
-                dict_C['refractive_blocks'] = int(C_line[1])
-
-    block_dict = {}
-    if len(dict_A) != 0:
-        block_dict.update(dict_A)
-    if len(dict_B) != 0:
-        block_dict.update(dict_B)
-    if len(dict_C) != 0:
-        block_dict.update(dict_C)
-
-    return block_dict
+    return read_bff(fname).block_dict()
 
 
 def get_laser_pos(fname):
@@ -112,36 +290,8 @@ def get_laser_pos(fname):
         laser_dict: *dictionary*
             A dictionary that contains the laser number and its corresponding
             integer x, y, vx, vy values as a tuple.
-    '''  
-    infile = open(fname)
-    x_list = []
-    y_list = []
-    vx_list = []
-    vy_list = []
-    start_search = False
-    for line in infile:
-        if '#' in line:
-            continue
-        elif line.strip() == 'GRID STOP':
-            start_search = True
-        elif start_search:
-            if 'L ' in line:
-                laser_pos_raw = [i for i in line.strip().split(' ')]
-                x_list.append(int(laser_pos_raw[1]))
-                y_list.append(int(laser_pos_raw[2]))
-                vx_list.append(int(laser_pos_raw[3]))
-                vy_list.append(int(laser_pos_raw[4]))
-
-    laser_num = len(x_list)
-    laser_dict = {}
-    keys = range(laser_num)
-    for i in keys:
-        x = x_list[i]
-        y = y_list[i]
-        vx = vx_list[i]
-        vy = vy_list[i]
-        laser_dict[i] = (x, y, vx, vy)
-    return laser_dict
+    '''
+    return read_bff(fname).laser_dict()
 
 
 def get_goal_points(fname):
@@ -158,31 +308,8 @@ def get_goal_points(fname):
         point_dict: *dictionary*
             A dictionary that contains the goal point number and it's
             corresponding coordinates.
-    '''  
-    infile = open(fname)
-    x_list = []
-    y_list = []
-    start_search = False
-    for line in infile:
-        if '#' in line:
-            continue
-        elif line.strip() == 'GRID STOP':
-            start_search = True
-        elif start_search:
-            if 'P ' in line:
-                point_pos_raw = [i for i in line.strip().split(' ')]
-                x_list.append(int(point_pos_raw[1]))
-                y_list.append(int(point_pos_raw[2]))
-
-    point_num = len(x_list)
-    point_dict = {}
-    keys = range(point_num)
-    for i in keys:
-        x = x_list[i]
-        y = y_list[i]
-        point_dict[i] = (x, y)
-
-    return point_dict
+    '''
+    return read_bff(fname).point_dict()
 
 
 if __name__ == "__main__":
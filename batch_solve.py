@@ -0,0 +1,248 @@
+'''
+Solve every bff file in a set of directories, glob patterns or files on a
+pool of worker processes. One JSON line is written per puzzle as soon as it
+finishes, so long runs can be followed (or piped into other tools) while
+they are still going.
+
+Usage:
+
+    python batch_solve.py levels/ 'generated/*.bff' --workers 8 --timeout 60
+'''
+
+import argparse
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from Final_Solution import Grid, SearchCheckpoint, SolverMetrics, TraceCache
+from Read_in_bff_file import read_bff
+from solution_store import SolutionStore, solved_rows
+
+
+def find_bff_files(paths):
+    '''
+    Expands directories and glob patterns into a list of bff files.
+
+    **Parameters**
+
+        paths: *list*
+            Directories (every *.bff file inside), glob patterns or file names
+
+    **Returns**
+
+        fnames: *list*
+            The bff files, in the order given, without duplicates
+    '''
+    fnames = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(glob.glob(os.path.join(path, '*.bff')))
+        elif glob.has_magic(path):
+            found = sorted(glob.glob(path))
+        else:
+            found = [path]
+        for fname in found:
+            if fname not in fnames:
+                fnames.append(fname)
+
+    return fnames
+
+
+def solve_file(task):
+    '''
+    Solves one bff file and describes the outcome as a record.
+
+    **Parameters**
+
+        task: *tuple*
+            (fname, timeout, engine, cache, count, checkpoints), see
+            batch_solve()
+
+    **Returns**
+
+        record: *dict*
+            file, status ('solved', 'no_solution', 'timeout' or 'error'),
+            elapsed seconds, and the SolverMetrics counters (configs_evaluated,
+            tracer_steps, ...) and phase_times. Solved puzzles also have the
+            config and the solution grid as a list of row strings, the others
+            an error message. With a cache, cached is True for puzzles
+            answered from it. With count, solutions is the number of
+            solving configs instead, and no config or grid is given.
+    '''
+    fname, timeout, engine, cache_path, count, checkpoints = task
+    record = {'file': fname}
+    puzzle = None
+    metrics = SolverMetrics()
+    store = SolutionStore(cache_path) if cache_path and not count else None
+    start = time.time()
+
+    try:
+        puzzle = read_bff(fname)
+        grid = Grid(puzzle, metrics)
+        if count:
+            record['solutions'] = grid.count_solutions(
+                engine if engine in ('scan', 'bestfirst') else 'backtrack',
+                timeout)
+            record['status'] = 'solved' if record['solutions'] \
+                else 'no_solution'
+            return record
+        config = None
+        if store is not None:
+            record['cached'] = True
+            config = store.get(puzzle)
+            # a stale or damaged entry is dropped and searched for again
+            if config is not None and not grid.is_solution(config):
+                store.discard(puzzle)
+                config = None
+        if config is None:
+            record['cached'] = False
+            # find_solution prints, which would corrupt the JSON lines
+            with contextlib.redirect_stdout(io.StringIO()):
+                checkpoint = None
+                if checkpoints:
+                    # named by the exact bff text SearchCheckpoint.begin()
+                    # checks, since a backtrack path depends on the order
+                    # of the lasers, which the digest ignores
+                    name = hashlib.sha256(puzzle.to_bff().encode())
+                    checkpoint = SearchCheckpoint(os.path.join(
+                        checkpoints, '%s_%s.json' % (name.hexdigest(),
+                                                     engine)))
+                cache = TraceCache() if engine == 'scan' and \
+                    checkpoint is None else None
+                board_int, laser_path, config = grid.find_solution(
+                    engine=engine, cache=cache, timeout=timeout,
+                    checkpoint=checkpoint)
+            if store is not None:
+                store.put(puzzle, config)
+        record['status'] = 'solved'
+        record['config'] = list(config)
+        record['solution'] = solved_rows(puzzle, config)
+    except TimeoutError as e:
+        record['status'] = 'timeout'
+        record['error'] = str(e)
+    except ValueError as e:
+        if puzzle is not None and str(e).startswith("No Solution Found"):
+            record['status'] = 'no_solution'
+            if store is not None and not record['cached']:
+                store.put(puzzle, None, str(e))
+        else:
+            record['status'] = 'error'
+        record['error'] = str(e)
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = '%s: %s' % (type(e).__name__, e)
+    finally:
+        if store is not None:
+            store.close()
+        record['elapsed'] = time.time() - start
+        record.update(metrics.counters())
+        record['phase_times'] = metrics.phase_times
+
+    return record
+
+
+def batch_solve(fnames, workers=None, timeout=None, engine='scan',
+                cache=None, count=False, checkpoints=None):
+    '''
+    Solves many bff files on a pool of worker processes.
+
+    **Parameters**
+
+        fnames: *list*
+            The bff files to solve
+        workers: *int, optional*
+            Number of worker processes. Defaults to the CPU count.
+        timeout: *float, optional*
+            Seconds allowed per puzzle
+        engine: *str*
+            The find_solution() engine, 'scan', 'backtrack' or 'bestfirst'.
+            Defaults to 'scan'.
+        cache: *str, optional*
+            A SolutionStore file. Puzzles solved before are answered from
+            it, and new results are added to it.
+        count: *bool*
+            Count every puzzle's solutions with Grid.count_solutions(), to
+            check they are unique, instead of finding one. 'scan' and
+            'bestfirst' count with that engine, the others with
+            'backtrack'. Defaults to False.
+        checkpoints: *str, optional*
+            A directory to keep a SearchCheckpoint per puzzle in, named by
+            the sha256 of its bff text and the engine, so a batch that was
+            stopped carries on each search where it was ('scan' and
+            'backtrack' only, 'scan' then runs without a TraceCache)
+
+    **Returns**
+
+        *generator*
+            One record per puzzle (see solve_file()), in the order they
+            finish
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if checkpoints:
+        os.makedirs(checkpoints, exist_ok=True)
+    tasks = [(fname, timeout, engine, cache, count, checkpoints)
+             for fname in fnames]
+
+    with multiprocessing.Pool(workers) as pool:
+        for record in pool.imap_unordered(solve_file, tasks):
+            yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Solve every bff file in directories or glob patterns, '
+                    'writing one JSON line per puzzle.')
+    parser.add_argument('paths', nargs='*', default=[os.getcwd()],
+                        help='directories, glob patterns or bff files '
+                             '(default: the current directory)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('-t', '--timeout', type=float, default=None,
+                        help='seconds allowed per puzzle')
+    parser.add_argument('-e', '--engine',
+                        choices=('scan', 'backtrack', 'bestfirst'),
+                        default='scan', help='search engine (default: scan)')
+    parser.add_argument('-c', '--cache', default=None,
+                        help='solution store file to read and add results '
+                             'to')
+    parser.add_argument('--count', action='store_true',
+                        help='count the solutions of every puzzle')
+    parser.add_argument('--checkpoint', default=None, metavar='DIR',
+                        help='save search positions in DIR and carry on '
+                             'from them on the next run')
+    parser.add_argument('-o', '--output', default=None,
+                        help='JSON lines file to write (default: stdout)')
+    args = parser.parse_args(argv)
+    if args.checkpoint and args.engine == 'bestfirst':
+        parser.error("--checkpoint needs engine 'scan' or 'backtrack'")
+
+    fnames = find_bff_files(args.paths)
+    out = open(args.output, 'w') if args.output else sys.stdout
+    counts = {}
+
+    try:
+        for record in batch_solve(fnames, args.workers, args.timeout,
+                                  args.engine, args.cache, args.count,
+                                  args.checkpoint):
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            counts[record['status']] = counts.get(record['status'], 0) + 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    summary = ', '.join('%d %s' % (n, status)
+                        for status, n in sorted(counts.items()))
+    print('%d puzzles: %s' % (len(fnames), summary or 'none'),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+'''
+Benchmark the solver phase by phase over the bundled bff puzzles.
+
+Every puzzle is run through parsing, get_configs(), config_to_board(),
+get_laser_path(), check_solution(), the LaserTracer fast path and a full
+find_solution(), each timed on its own. The Edge board path and the
+LaserTracer must agree on every config, and on the solution found, before
+any timing is reported. Each phase is timed several times and the
+fastest run is kept, so one slow run does not pass for a regression.
+Rates, wall time and peak memory are saved as JSON so two runs can be
+compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json --repeat 9
+'''
+
+import argparse
+import contextlib
+import glob
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from Final_Solution import Grid, TraceCache
+from Read_in_bff_file import read_bff
+
+# the order phases are run and reported in
+PHASES = ('parse', 'get_configs', 'config_to_board', 'get_laser_path',
+          'check_solution', 'trace_goals', 'find_solution')
+
+
+def measure(func, count, memory=True, runs=1):
+    '''
+    Times one phase runs times and keeps the fastest, then runs it again
+    under tracemalloc for its peak memory, so tracing overhead does not
+    skew the timing.
+
+    **Parameters**
+
+        func: *function*
+            Runs the phase once over all its items
+        count: *int*
+            Number of items func handles, for the rate
+        memory: *bool*
+            Also measure peak memory. Defaults to True.
+        runs: *int*
+            Number of timed runs. Defaults to 1.
+
+    **Returns**
+
+        result: *dict*
+            count, seconds (of the fastest run), runs, per_sec and
+            peak_bytes (None without memory)
+    '''
+    seconds = None
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if seconds is None or elapsed < seconds:
+            seconds = elapsed
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'count': count,
+        'seconds': seconds,
+        'runs': max(1, runs),
+        'per_sec': count / seconds if seconds > 0 else None,
+        'peak_bytes': peak,
+    }
+
+
+def benchmark_puzzle(fname, limit=2000, repeat=50, memory=True,
+                     solve_timeout=60, runs=5):
+    '''
+    Runs every phase on one puzzle.
+
+    **Parameters**
+
+        fname: *str*
+            The bff file
+        limit: *int*
+            Most configs used by the per-config phases. Defaults to 2000.
+        repeat: *int*
+            Times the file is parsed. Defaults to 50.
+        memory: *bool*
+            Also measure peak memory. Defaults to True.
+        solve_timeout: *float*
+            Seconds allowed for find_solution. Defaults to 60.
+        runs: *int*
+            Timed runs per phase, the fastest is kept. Defaults to 5.
+
+    **Returns**
+
+        results: *dict*
+            One measure() result per phase name. find_solution also has a
+            status ('solved', 'no_solution' or 'timeout').
+    '''
+    results = {}
+    grid = Grid(fname)
+
+    def parse():
+        for _ in range(repeat):
+            read_bff(fname)
+    results['parse'] = measure(parse, repeat, memory, runs)
+
+    configs = list(itertools.islice(grid.get_configs(), limit))
+
+    def get_configs():
+        for _ in itertools.islice(grid.get_configs(), limit):
+            pass
+    results['get_configs'] = measure(get_configs, len(configs), memory,
+                                     runs)
+
+    def config_to_board():
+        for config in configs:
+            grid.config_to_board(config)
+    results['config_to_board'] = measure(config_to_board, len(configs),
+                                         memory, runs)
+
+    boards = [grid.config_to_board(config) for config in configs]
+
+    def get_laser_path():
+        for board in boards:
+            grid.get_laser_path(board)
+    results['get_laser_path'] = measure(get_laser_path, len(boards), memory,
+                                        runs)
+
+    paths = [grid.get_laser_path(board) for board in boards]
+    # the Edge board and the LaserTracer must give the same verdicts, or
+    # the timings below compare two different answers
+    goal_mask = grid.tracer.goal_mask
+    for config, laser_path in zip(configs, paths):
+        fast = grid.tracer.trace_goals(grid.compiled.place_cells(config))
+        assert grid.check_solution(laser_path) == (fast == goal_mask), \
+            '%s: slow and fast paths disagree on %s' % (fname, config)
+
+    def check_solution():
+        for laser_path in paths:
+            grid.check_solution(laser_path)
+    results['check_solution'] = measure(check_solution, len(paths), memory,
+                                        runs)
+
+    def trace_goals():
+        for config in configs:
+            grid.tracer.trace_goals(grid.compiled.place_cells(config))
+    results['trace_goals'] = measure(trace_goals, len(configs), memory,
+                                     runs)
+
+    status = {}
+
+    def find_solution():
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                solution = grid.find_solution(cache=TraceCache(),
+                                              timeout=solve_timeout)
+            status['status'] = 'solved'
+            status['config'] = solution[2]
+        except TimeoutError:
+            status['status'] = 'timeout'
+        except ValueError:
+            status['status'] = 'no_solution'
+    # the count is only known after the first run
+    results['find_solution'] = measure(find_solution, 1, memory, runs)
+    metrics = grid.metrics
+    results['find_solution']['count'] = metrics.configs_evaluated
+    seconds = results['find_solution']['seconds']
+    if seconds > 0:
+        results['find_solution']['per_sec'] = \
+            metrics.configs_evaluated / seconds
+    if 'config' in status:
+        # the solution found must also solve the puzzle on the Edge board
+        config = status.pop('config')
+        board = grid.config_to_board(config)
+        assert grid.check_solution(grid.get_laser_path(board)), \
+            '%s: slow path rejects the solution %s' % (fname, config)
+    results['find_solution'].update(status)
+    results['find_solution']['tracer_steps'] = metrics.tracer_steps
+    results['find_solution']['beams_spawned'] = metrics.beams_spawned
+    results['find_solution']['cache_hits'] = metrics.cache_hits
+
+    return results
+
+
+def run_benchmarks(fnames, limit=2000, memory=True, solve_timeout=60,
+                   runs=5):
+    '''
+    Benchmarks several puzzles.
+
+    **Parameters**
+
+        fnames: *list*
+            The bff files
+        limit, memory, solve_timeout, runs:
+            See benchmark_puzzle()
+
+    **Returns**
+
+        report: *dict*
+            meta (environment and settings) and results, keyed by puzzle
+            name and then phase
+    '''
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'limit': limit,
+            'runs': runs,
+        },
+        'results': {},
+    }
+    for fname in fnames:
+        name = os.path.splitext(os.path.basename(fname))[0]
+        report['results'][name] = benchmark_puzzle(
+            fname, limit, memory=memory, solve_timeout=solve_timeout,
+            runs=runs)
+
+    return report
+
+
+def compare_reports(old, new, threshold=0.25, min_seconds=0.005):
+    '''
+    Finds phases that got slower between two reports. Phases are compared
+    by the time per item of their fastest run, so runs with different
+    limits still line up. Phases that took under min_seconds in both runs
+    are too noisy to compare and are skipped, and a report timed from a
+    single run (see measure()) is best compared with a larger threshold.
+
+    **Parameters**
+
+        old: *dict*
+            The baseline report
+        new: *dict*
+            The report to check
+        threshold: *float*
+            Allowed slowdown as a fraction. Defaults to 0.25 (25 %).
+        min_seconds: *float*
+            Shortest phase time worth comparing. Defaults to 0.005.
+
+    **Returns**
+
+        regressions: *list*
+            (puzzle, phase, old seconds per item, new seconds per item,
+            change as a fraction) for every phase over the threshold
+    '''
+    regressions = []
+    for name, phases in new['results'].items():
+        for phase, result in phases.items():
+            before = old['results'].get(name, {}).get(phase)
+            if not before or not before['count'] or not result['count']:
+                continue
+            if max(before['seconds'], result['seconds']) < min_seconds:
+                continue
+            old_each = before['seconds'] / before['count']
+            new_each = result['seconds'] / result['count']
+            if old_each > 0 and new_each > old_each * (1 + threshold):
+                regressions.append((name, phase, old_each, new_each,
+                                    new_each / old_each - 1))
+
+    return regressions
+
+
+def format_report(report):
+    '''
+    Lays a report out as a text table.
+
+    **Parameters**
+
+        report: *dict*
+            A report from run_benchmarks()
+
+    **Returns**
+
+        *str*
+            One line per puzzle and phase
+    '''
+    lines = ['%-14s %-16s %10s %12s %12s %12s' % (
+        'puzzle', 'phase', 'count', 'seconds', 'per sec', 'peak KiB')]
+    for name, phases in report['results'].items():
+        for phase in PHASES:
+            result = phases[phase]
+            per_sec = result['per_sec']
+            peak = result['peak_bytes']
+            lines.append('%-14s %-16s %10d %12.4f %12s %12s' % (
+                name, phase, result['count'], result['seconds'],
+                '-' if per_sec is None else '%.0f' % per_sec,
+                '-' if peak is None else '%.1f' % (peak / 1024)))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(
+        description='Benchmark the solver phase by phase.')
+    parser.add_argument('paths', nargs='*',
+                        help='bff files (default: the bundled puzzles)')
+    parser.add_argument('-n', '--limit', type=int, default=2000,
+                        help='configs per phase (default: 2000)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the peak memory runs')
+    parser.add_argument('--solve-timeout', type=float, default=60,
+                        help='seconds allowed per find_solution')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='timed runs per phase, the fastest is kept '
+                             '(default: 5)')
+    parser.add_argument('-o', '--output', help='write the report as JSON')
+    parser.add_argument('-c', '--compare',
+                        help='baseline JSON report to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown per phase (default: 0.25)')
+    args = parser.parse_args(argv)
+
+    fnames = args.paths or sorted(glob.glob(os.path.join(here, '*.bff')))
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    report = run_benchmarks(fnames, args.limit, not args.no_memory,
+                            args.solve_timeout, args.repeat)
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare_reports(baseline, report, args.threshold)
+        for name, phase, before, after, change in regressions:
+            print('REGRESSION %s %s: %.3g s -> %.3g s per item (+%.0f%%)'
+                  % (name, phase, before, after, change * 100))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
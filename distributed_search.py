@@ -0,0 +1,541 @@
+'''
+Search one puzzle on many machines. A coordinator splits the ranks of
+get_configs() into ranges and leases them to workers over TCP; workers
+check their ranges with Grid.scan_range(), the same scan the workers of
+find_solution_parallel() run, and the first solution found cancels every
+other worker. A lease a worker does not renew in time, or whose worker
+disconnects, is handed out again, so losing a worker only costs the range
+it held.
+
+    python distributed_search.py coordinator mad_7.bff --host 0.0.0.0 \
+        --port 9100
+    python distributed_search.py worker --host coordinator-host --port 9100
+    python distributed_search.py local mad_7.bff --workers 4
+
+Messages are JSON objects, one per line, and every worker message gets one
+answer:
+
+    {"op": "hello"}                  -> {"op": "puzzle", "bff": ...}
+    {"op": "lease"}                  -> {"op": "range", "lease": id,
+                                         "start": ..., "stop": ...},
+                                        {"op": "wait", "retry": seconds} or
+                                        {"op": "done"}
+    {"op": "progress", "lease": id}  -> {"op": "ok", "cancel": bool}
+    {"op": "result", "lease": id, "config": [...] or null,
+     "counters": {...}}              -> {"op": "ok", "cancel": bool}
+
+There is no authentication, so only listen on networks you trust.
+'''
+
+import argparse
+import collections
+import json
+import multiprocessing
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from Final_Solution import Grid, SolverMetrics, TraceCache, split_ranks
+from Read_in_bff_file import parse_bff, read_bff
+
+
+class Coordinator:
+    def __init__(self, puzzle, host='127.0.0.1', port=0, chunks=1024,
+                 lease_time=30.0):
+        '''
+        Hands out the rank ranges of one puzzle and collects the results.
+        * ranges are leased for lease_time seconds, and a worker renews its
+          lease with every progress message
+        * an expired lease, or one held by a worker that disconnected, goes
+          back to the front of the queue
+        * a result for a range that was done by someone else in the meantime
+          is counted but changes nothing
+        * a solution is checked with Grid.is_solution() before it is
+          accepted, then every worker is told to stop
+
+        **Attributes**
+            grid: *Grid*
+                The puzzle searched
+            ranges: *list*
+                (start, stop) rank ranges, see split_ranks()
+            lease_time: *float*
+                Seconds a lease lasts without progress
+            solution: *tuple or None*
+                The solution, once found
+            reissued: *int*
+                Leases that expired or were dropped and handed out again
+            metrics: *SolverMetrics*
+                The counters sent back by the workers, added up
+            address: *tuple*
+                (host, port) the coordinator listens on
+
+        **Parameters**
+
+            puzzle: *Puzzle or str*
+                The puzzle, or its bff file
+            host: *str*
+                Address to listen on. Defaults to 127.0.0.1.
+            port: *int*
+                Port to listen on, 0 for any free one. Defaults to 0.
+            chunks: *int*
+                Number of rank ranges. Defaults to 1024.
+            lease_time: *float*
+                Seconds a lease lasts without progress. Defaults to 30.
+        '''
+        self.grid = Grid(puzzle)
+        self.grid.check_feasible()
+        self.configs = self.grid.get_configs()
+        self.ranges = split_ranks(self.configs.total, chunks)
+        self.lease_time = lease_time
+        self.solution = None
+        self.reissued = 0
+        self.metrics = SolverMetrics()
+        self.metrics.start(self.configs.total)
+        self._bff = self.grid.puzzle.to_bff()
+        self._lock = threading.Lock()
+        # indexes of ranges not leased yet, and of ranges finished
+        self._pending = collections.deque(range(len(self.ranges)))
+        self._done = set()
+        # lease id: [range index, expiry time, connection] while it is held
+        self._leases = {}
+        # lease id: range index, for every lease handed out
+        self._issued = {}
+        self._next_lease = 0
+        self._cancelled = False
+        self._finished = threading.Event()
+        if not self.ranges:
+            self._finished.set()
+
+        handler = type('Handler', (_CoordinatorHandler,),
+                       {'coordinator': self})
+        self._server = _TCPServer((host, port), handler)
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        '''
+        Stops listening. Workers still connected are told the search is
+        done the next time they ask.
+        '''
+        self.cancel()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def cancel(self):
+        '''
+        Ends the search: workers stop their ranges and get no new ones.
+        '''
+        with self._lock:
+            self._cancelled = True
+        self._finished.set()
+
+    def wait(self, timeout=None):
+        '''
+        Waits for the search to end.
+
+        Raises TimeoutError if it has not ended within timeout seconds,
+        and ValueError ("No Solution Found") if every range was checked
+        without a solution.
+
+        **Parameters**
+            timeout: **float, optional**
+                Seconds to wait. Defaults to waiting until the end.
+
+        **Returns**
+            config: **tuple or None**
+                The solution, None if the search was cancelled
+        '''
+        if not self._finished.wait(timeout):
+            raise TimeoutError("No Solution Found in time (%d of %d ranges "
+                               "checked)" % (len(self._done),
+                                             len(self.ranges)))
+        if self.solution is not None:
+            return self.solution
+        if self._cancelled:
+            return None
+        raise ValueError("No Solution Found")
+
+    def status(self):
+        '''
+        The state of the search.
+
+        **Returns**
+            status: **dict**
+                ranges, done, leased, pending, reissued, solved,
+                cancelled and the added up worker counters
+        '''
+        with self._lock:
+            status = {
+                'ranges': len(self.ranges),
+                'done': len(self._done),
+                'leased': len(self._leases),
+                'pending': len(self._pending),
+                'reissued': self.reissued,
+                'solved': self.solution is not None,
+                'cancelled': self._cancelled,
+            }
+            status.update(self.metrics.counters())
+
+        return status
+
+    def handle(self, message, conn):
+        '''
+        Answers one worker message, see the module docstring.
+
+        **Parameters**
+            message: **dict**
+                The message
+            conn: **object**
+                Identifies the worker's connection, for drop()
+
+        **Returns**
+            reply: **dict**
+                The answer
+        '''
+        op = message.get('op')
+        if op == 'hello':
+            return {'op': 'puzzle', 'bff': self._bff}
+        with self._lock:
+            if op == 'lease':
+                return self._lease(conn)
+            if op == 'progress':
+                return {'op': 'ok',
+                        'cancel': not self._renew(message['lease'])}
+            if op == 'result':
+                config = message.get('config')
+                self._result(message['lease'],
+                             None if config is None else tuple(config),
+                             dict(message.get('counters') or {}))
+                return {'op': 'ok', 'cancel': self._finished.is_set()}
+
+        return {'op': 'error', 'error': 'unknown op %r' % op}
+
+    def drop(self, conn):
+        '''
+        Hands the leases of a disconnected worker out again.
+
+        **Parameters**
+            conn: **object**
+                The connection, as passed to handle()
+        '''
+        with self._lock:
+            for lease, (index, expires, owner) in list(self._leases.items()):
+                if owner is conn:
+                    self._release(lease)
+
+    def _lease(self, conn):
+        # next range for a worker, with the lock held
+        if self._finished.is_set():
+            return {'op': 'done'}
+        now = time.time()
+        for lease, (index, expires, owner) in list(self._leases.items()):
+            if expires < now:
+                self._release(lease)
+        while self._pending and self._pending[0] in self._done:
+            self._pending.popleft()
+        if not self._pending:
+            # the last ranges are out, wait in case one comes back
+            return {'op': 'wait', 'retry': min(1.0, self.lease_time / 4)}
+
+        index = self._pending.popleft()
+        lease = self._next_lease
+        self._next_lease += 1
+        self._leases[lease] = [index, now + self.lease_time, conn]
+        self._issued[lease] = index
+        start, stop = self.ranges[index]
+        return {'op': 'range', 'lease': lease, 'start': start, 'stop': stop}
+
+    def _renew(self, lease):
+        # extend a lease, False if it is no longer held, its range was done
+        # by another worker, or the search ended
+        if self._finished.is_set() or lease not in self._leases or \
+                self._leases[lease][0] in self._done:
+            return False
+        self._leases[lease][1] = time.time() + self.lease_time
+        return True
+
+    def _release(self, lease):
+        # put a lease's range back at the front of the queue
+        index = self._leases.pop(lease)[0]
+        if index not in self._done:
+            self._pending.appendleft(index)
+            self.reissued += 1
+
+    def _result(self, lease, config, counters):
+        # record a finished range, with the lock held
+        self.metrics.merge(counters)
+        self._leases.pop(lease, None)
+        if lease not in self._issued:
+            return
+        # a late result still counts, even if the range was handed out again
+        self._done.add(self._issued[lease])
+        if config is not None and self.solution is None and \
+                self.grid.is_solution(config):
+            self.solution = config
+            self._finished.set()
+        elif len(self._done) == len(self.ranges):
+            self._finished.set()
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+    # set on a subclass by Coordinator
+    coordinator = None
+
+    def handle(self):
+        coordinator = self.coordinator
+        try:
+            for line in self.rfile:
+                try:
+                    reply = coordinator.handle(json.loads(line), self)
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {'op': 'error', 'error': 'bad message: %s' % e}
+                self.wfile.write((json.dumps(reply) + '\n').encode())
+        except OSError:
+            pass
+        finally:
+            coordinator.drop(self)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def run_worker(host='127.0.0.1', port=9100, heartbeat=1.0, timeout=60.0):
+    '''
+    Connects to a coordinator and checks the ranges it hands out until the
+    search is done. A worker that loses the coordinator just returns; an
+    error the coordinator answers with is printed to stderr, and the
+    worker asks for a new lease.
+
+    **Parameters**
+
+        host: *str*
+            Address of the coordinator. Defaults to 127.0.0.1.
+        port: *int*
+            Port of the coordinator. Defaults to 9100.
+        heartbeat: *float*
+            Seconds between progress messages while checking a range,
+            which renew its lease and pick up a cancel. Defaults to 1.
+        timeout: *float*
+            Seconds to wait for an answer before giving the coordinator up
+            for lost. Defaults to 60.
+
+    **Returns**
+
+        ranges: *int*
+            Number of ranges this worker finished
+    '''
+    finished = 0
+    try:
+        with socket.create_connection((host, port), timeout) as sock:
+            stream = sock.makefile('rwb')
+
+            def ask(message):
+                stream.write((json.dumps(message) + '\n').encode())
+                stream.flush()
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("coordinator closed the "
+                                          "connection")
+                reply = json.loads(line)
+                if reply.get('op') == 'error':
+                    raise _CoordinatorError(reply.get('error'))
+                return reply
+
+            grid = Grid(parse_bff(ask({'op': 'hello'})['bff']))
+            items = grid.get_configs().items
+            cache = TraceCache()
+            while True:
+                try:
+                    reply = ask({'op': 'lease'})
+                except _CoordinatorError as e:
+                    print('coordinator error: %s' % e, file=sys.stderr)
+                    time.sleep(heartbeat)
+                    continue
+                if reply['op'] == 'done':
+                    break
+                if reply['op'] == 'wait':
+                    time.sleep(reply['retry'])
+                    continue
+
+                lease = reply['lease']
+                state = {'cancel': False, 'next': time.time() + heartbeat}
+
+                def stopped():
+                    # renew the lease when a heartbeat is due
+                    if time.time() >= state['next']:
+                        state['cancel'] = ask({'op': 'progress',
+                                               'lease': lease})['cancel']
+                        state['next'] = time.time() + heartbeat
+                    return state['cancel']
+
+                metrics = grid.metrics
+                metrics.start(reply['stop'] - reply['start'], grid.tracer,
+                              cache)
+                try:
+                    config = grid.scan_range(items, reply['start'],
+                                             reply['stop'], cache, stopped)
+                    if state['cancel']:
+                        # the range was given to someone else, or the
+                        # search is over; the next lease request says which
+                        continue
+                    answer = ask({'op': 'result', 'lease': lease,
+                                  'config': None if config is None
+                                  else [int(val) for val in config],
+                                  'counters': metrics.counters()})
+                except _CoordinatorError as e:
+                    # the lease is lost, it will be handed out again
+                    print('coordinator error: %s' % e, file=sys.stderr)
+                    continue
+                finished += 1
+                if answer['cancel']:
+                    break
+    except _CoordinatorError as e:
+        # the coordinator would not hand out the puzzle
+        print('coordinator error: %s' % e, file=sys.stderr)
+    except (OSError, ValueError):
+        # the coordinator went away
+        pass
+
+    return finished
+
+
+class _CoordinatorError(Exception):
+    # an {'op': 'error'} answer from the coordinator
+    pass
+
+
+def run_local(puzzle, workers=None, chunks=None, lease_time=30.0,
+              timeout=None):
+    '''
+    Runs a coordinator and several worker processes on this machine, as a
+    stand-in for a cluster.
+
+    **Parameters**
+
+        puzzle: *Puzzle or str*
+            The puzzle, or its bff file
+        workers: *int, optional*
+            Number of worker processes. Defaults to the CPU count.
+        chunks: *int, optional*
+            Number of rank ranges. Defaults to 32 per worker.
+        lease_time: *float*
+            Seconds a lease lasts without progress. Defaults to 30.
+        timeout: *float, optional*
+            Seconds to search before raising TimeoutError
+
+    **Returns**
+
+        *np.array*
+            The board configuration that solves the puzzle.
+        laser_path: *np.array*
+            The laser path of the solution
+        config: *tuple*
+            The configuration of the available spots
+    '''
+    workers = workers or multiprocessing.cpu_count()
+    chunks = chunks or workers * 32
+    with Coordinator(puzzle, chunks=chunks,
+                     lease_time=lease_time) as coordinator:
+        host, port = coordinator.address
+        processes = [multiprocessing.Process(target=run_worker,
+                                             args=(host, port), daemon=True)
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        try:
+            config = coordinator.wait(timeout)
+        finally:
+            coordinator.cancel()
+            for process in processes:
+                process.join(lease_time)
+                if process.is_alive():
+                    process.terminate()
+
+        grid = coordinator.grid
+        print("SOLVED LAZOR!")
+        return grid.get_solution(config)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Search one puzzle with a coordinator and workers on '
+                    'several machines.')
+    sub = parser.add_subparsers(dest='mode', required=True)
+    coord = sub.add_parser('coordinator', help='hand out rank ranges')
+    coord.add_argument('bff', help='the puzzle')
+    coord.add_argument('--host', default='127.0.0.1',
+                       help='address to listen on (default: 127.0.0.1)')
+    coord.add_argument('--port', type=int, default=9100,
+                       help='port to listen on (default: 9100)')
+    coord.add_argument('--chunks', type=int, default=1024,
+                       help='rank ranges (default: 1024)')
+    coord.add_argument('--lease', type=float, default=30.0,
+                       help='seconds a lease lasts (default: 30)')
+    coord.add_argument('-t', '--timeout', type=float, default=None,
+                       help='seconds to search')
+    work = sub.add_parser('worker', help='check ranges for a coordinator')
+    work.add_argument('--host', default='127.0.0.1',
+                      help='coordinator address (default: 127.0.0.1)')
+    work.add_argument('--port', type=int, default=9100,
+                      help='coordinator port (default: 9100)')
+    local = sub.add_parser('local',
+                           help='coordinator and workers on this machine')
+    local.add_argument('bff', help='the puzzle')
+    local.add_argument('-w', '--workers', type=int, default=None,
+                       help='worker processes (default: CPU count)')
+    local.add_argument('--chunks', type=int, default=None,
+                       help='rank ranges (default: 32 per worker)')
+    local.add_argument('-t', '--timeout', type=float, default=None,
+                       help='seconds to search')
+    args = parser.parse_args(argv)
+
+    if args.mode == 'worker':
+        print('%d ranges checked' % run_worker(args.host, args.port))
+    elif args.mode == 'local':
+        try:
+            board_int, laser_path, config = run_local(
+                read_bff(args.bff), args.workers, args.chunks,
+                timeout=args.timeout)
+        except (TimeoutError, ValueError) as e:
+            print(e)
+            return
+        print(' '.join(str(val) for val in config))
+    else:
+        try:
+            coordinator = Coordinator(read_bff(args.bff), args.host,
+                                      args.port, args.chunks, args.lease)
+        except ValueError as e:
+            # proved to have no solution before the search
+            print(e)
+            return
+        with coordinator:
+            print('listening on %s:%d' % coordinator.address)
+            try:
+                config = coordinator.wait(args.timeout)
+            except (TimeoutError, ValueError) as e:
+                # no solution, or none found in time
+                print(json.dumps(coordinator.status()))
+                print(e)
+                return
+            print(json.dumps(coordinator.status()))
+            if config is None:
+                print('Search cancelled')
+            else:
+                print(' '.join(str(val) for val in config))
+
+
+if __name__ == "__main__":
+    main()
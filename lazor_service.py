@@ -0,0 +1,661 @@
+'''
+A local HTTP/JSON service that solves bff puzzles on a warm pool of solver
+processes. Requests wait in a bounded queue and are handed to the workers
+in order, each with its own deadline, so a burst of requests queues up
+instead of slowing every solve down. Workers keep the Grid of recently
+seen puzzles, and a SolutionStore answers repeated puzzles without a
+solve at all.
+
+    python lazor_service.py --port 8765 --workers 4
+
+    POST /solve   bff text, or JSON {"bff": ..., "timeout": ..., "engine": ...}
+    GET  /stats   queue depth, requests in flight, counts by status and
+                  latency percentiles
+    GET  /health  {"ok": true}
+
+From Python, AsyncSolverClient sends requests from an asyncio program.
+'''
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Final_Solution import ENGINES, Grid, SolverMetrics
+from Read_in_bff_file import parse_bff
+from solution_store import SolutionStore, solved_rows
+
+# HTTP status of every record status
+HTTP_STATUS = {
+    'solved': 200,
+    'no_solution': 200,
+    'error': 400,
+    'busy': 503,
+    'timeout': 504,
+}
+
+
+class SolverService:
+    def __init__(self, workers=None, queue_size=256, timeout=30.0,
+                 engine='backtrack', store=None, window=10000):
+        '''
+        The request queue, worker pool and statistics behind the HTTP
+        server. submit() can also be called directly.
+        * one dispatcher thread per worker takes requests off the queue,
+          so at most workers requests are solved at once and the rest wait
+          in order
+        * a request still queued at its deadline is answered with status
+          'timeout' without being solved; one that is solved gets the time
+          left as its find_solution() timeout, and its dispatcher takes no
+          new request until the worker has stopped at it
+        * a full queue answers at once with status 'busy'
+
+        **Attributes**
+            workers: *int*
+                Number of solver processes
+            timeout: *float*
+                Seconds allowed per request when it does not say
+            engine: *str*
+                find_solution() engine when a request does not say
+            store: *SolutionStore or None*
+                Answers puzzles solved before, and keeps new results
+            in_flight: *int*
+                Requests being solved right now
+
+        **Parameters**
+
+            workers: *int, optional*
+                Number of solver processes. Defaults to the CPU count.
+            queue_size: *int*
+                Most requests waiting at once. Defaults to 256.
+            timeout: *float*
+                Default seconds allowed per request, queueing included.
+                Defaults to 30.
+            engine: *str*
+                Default engine. Defaults to 'backtrack'.
+            store: *SolutionStore, optional*
+                Where to look up and keep solutions
+            window: *int*
+                Number of latest requests the percentiles are taken over.
+                Defaults to 10000.
+        '''
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.engine = engine
+        self.store = store
+        self.in_flight = 0
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+        self._latency = collections.deque(maxlen=window)
+        self._waited = collections.deque(maxlen=window)
+        self._started = time.time()
+        # start the processes now, so the first requests find them warm
+        self._pool = multiprocessing.Pool(self.workers)
+        self._pool.map(_ping, range(self.workers))
+        self._threads = [threading.Thread(target=self._dispatch, daemon=True)
+                         for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        '''
+        Stops the dispatcher threads and the worker pool. Requests still
+        queued are answered with status 'error'.
+        '''
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.finish({'status': 'error',
+                            'error': 'service is shutting down'})
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, text, timeout=None, engine=None):
+        '''
+        Solves one puzzle, waiting for a worker if they are all busy.
+
+        **Parameters**
+            text: **str or bytes**
+                The text of a bff file
+            timeout: **float, optional**
+                Seconds allowed, queueing included. Defaults to the
+                service's timeout.
+            engine: **str, optional**
+                The find_solution() engine. Defaults to the service's.
+
+        **Returns**
+            record: **dict**
+                status ('solved', 'no_solution', 'timeout', 'busy' or
+                'error'), elapsed and queued seconds, and the config and
+                solution rows of a solved puzzle or the error of the others.
+                A timeout that is not a positive number or an unknown
+                engine is an 'error'.
+        '''
+        arrived = time.time()
+        try:
+            timeout, engine = check_request(timeout, engine, self.timeout,
+                                            self.engine)
+        except ValueError as e:
+            job = _Job(engine, arrived)
+            return self._finish(job, {'status': 'error', 'error': str(e)})
+        job = _Job(engine, arrived + timeout)
+
+        try:
+            puzzle = parse_bff(text)
+        except Exception as e:
+            return self._finish(job, {'status': 'error', 'error': str(e)})
+
+        if self.store is not None:
+            try:
+                config = self.store.get(puzzle)
+            except ValueError as e:
+                return self._finish(job, {'status': 'no_solution',
+                                          'error': str(e), 'cached': True})
+            # a stale or damaged entry is dropped and searched for again
+            if config is not None and not Grid(puzzle).is_solution(config):
+                self.store.discard(puzzle)
+                config = None
+            if config is not None:
+                return self._finish(job, {
+                    'status': 'solved', 'cached': True,
+                    'config': list(config),
+                    'solution': solved_rows(puzzle, config)})
+
+        job.puzzle = puzzle
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            return self._finish(job, {'status': 'busy',
+                                      'error': 'request queue is full'})
+
+        # the dispatcher answers by the deadline, the slack covers a worker
+        # that is slow to notice it
+        if not job.done.wait(timeout + 5):
+            job.finish({'status': 'timeout',
+                        'error': 'No Solution Found in time'})
+        record = job.record
+        if self.store is not None and not record.get('cached'):
+            if record['status'] == 'solved':
+                self.store.put(puzzle, record['config'])
+            elif record['status'] == 'no_solution':
+                self.store.put(puzzle, None, record.get('error'))
+
+        return self._finish(job, record)
+
+    def stats(self):
+        '''
+        The state of the service, as served on /stats.
+
+        **Returns**
+            stats: **dict**
+                queue_depth, in_flight, workers, uptime, requests by status,
+                and the latency (total) and queued seconds of the latest
+                requests as count, mean, p50, p90, p99 and max
+        '''
+        with self._lock:
+            latency = sorted(self._latency)
+            waited = sorted(self._waited)
+            counts = dict(self._counts)
+            in_flight = self.in_flight
+
+        return {
+            'queue_depth': self._queue.qsize(),
+            'in_flight': in_flight,
+            'workers': self.workers,
+            'uptime': time.time() - self._started,
+            'requests': counts,
+            'latency': summarize(latency),
+            'queued': summarize(waited),
+            'store': None if self.store is None else {
+                'hits': self.store.hits, 'misses': self.store.misses},
+        }
+
+    def _dispatch(self):
+        # dispatcher thread: hand queued jobs to the pool one at a time
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.started = time.time()
+            left = job.deadline - job.started
+            if left <= 0:
+                job.finish({'status': 'timeout',
+                            'error': 'No Solution Found in time '
+                                     '(deadline passed in the queue)'})
+                continue
+
+            with self._lock:
+                self.in_flight += 1
+            try:
+                result = self._pool.apply_async(
+                    _solve_request, ((job.puzzle, job.engine, left),))
+                try:
+                    record = result.get(left + 5)
+                except multiprocessing.TimeoutError:
+                    # answer now, but keep the worker's slot until it is
+                    # done: every engine stops at the timeout it was given,
+                    # so a new job never queues up behind a stale one
+                    job.finish({'status': 'timeout',
+                                'error': 'No Solution Found in time'})
+                    result.wait()
+                    record = job.record
+            except Exception as e:
+                record = {'status': 'error',
+                          'error': '%s: %s' % (type(e).__name__, e)}
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+            job.finish(record)
+
+    def _finish(self, job, record):
+        # add timings to a record and count it
+        now = time.time()
+        record['elapsed'] = now - job.arrived
+        record['queued'] = (job.started or now) - job.arrived
+        with self._lock:
+            self._counts[record['status']] += 1
+            self._latency.append(record['elapsed'])
+            self._waited.append(record['queued'])
+
+        return record
+
+
+class _Job:
+    # one request on its way through the queue
+    def __init__(self, engine, deadline):
+        self.engine = engine
+        self.deadline = deadline
+        self.arrived = time.time()
+        self.started = None
+        self.puzzle = None
+        self.record = None
+        self.done = threading.Event()
+
+    def finish(self, record):
+        if self.record is None:
+            self.record = record
+            self.done.set()
+
+
+def check_request(timeout, engine, default_timeout, default_engine):
+    '''
+    Checks the timeout and engine a request asked for. Raises ValueError
+    if the timeout is not a positive number of seconds or the engine is
+    not a find_solution() engine.
+
+    **Parameters**
+
+        timeout: *float or None*
+            Seconds asked for, None for the default
+        engine: *str or None*
+            Engine asked for, None for the default
+        default_timeout: *float*
+            The service's timeout
+        default_engine: *str*
+            The service's engine
+
+    **Returns**
+
+        timeout: *float*
+            Seconds allowed
+        engine: *str*
+            The engine to solve with
+    '''
+    if timeout is None:
+        timeout = default_timeout
+    # bool is an int, but {"timeout": true} is not a number of seconds
+    if isinstance(timeout, bool) or \
+            not isinstance(timeout, (int, float, str)):
+        raise ValueError("timeout must be a number, not %r" % (timeout,))
+    try:
+        timeout = float(timeout)
+    except ValueError:
+        raise ValueError("timeout must be a number, not %r" % (timeout,))
+    if not 0 < timeout < math.inf:
+        raise ValueError("timeout must be positive and finite, not %r"
+                         % timeout)
+    if engine is None:
+        engine = default_engine
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine %r, use one of %s"
+                         % (engine, ', '.join(ENGINES)))
+
+    return timeout, engine
+
+
+def summarize(values):
+    '''
+    Count, mean, percentiles and maximum of some latencies.
+
+    **Parameters**
+
+        values: *list*
+            Latencies in seconds, sorted
+
+    **Returns**
+
+        summary: *dict*
+            count, mean, p50, p90, p99 and max, None when there are no
+            values
+    '''
+    if not values:
+        return {'count': 0, 'mean': None, 'p50': None, 'p90': None,
+                'p99': None, 'max': None}
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': values[-1],
+    }
+
+
+def percentile(values, q):
+    '''
+    The nearest-rank percentile of sorted values.
+
+    **Parameters**
+
+        values: *list*
+            Sorted values, at least one
+        q: *float*
+            The percentile, 0 to 100
+
+    **Returns**
+
+        *float*
+            The smallest value with at least q percent of the values at or
+            below it
+    '''
+    rank = max(1, -(-len(values) * q // 100))
+    return values[int(rank) - 1]
+
+
+# Grids of the puzzles a worker process solved lately, by puzzle
+_grids = collections.OrderedDict()
+_GRID_CACHE = 64
+
+
+def _ping(i):
+    # makes a pool worker start up and import the solver
+    return i
+
+
+def _solve_request(task):
+    '''
+    Solves one puzzle on a worker process.
+
+    **Parameters**
+
+        task: *tuple*
+            (puzzle, engine, timeout), the Puzzle, the find_solution()
+            engine and the seconds left
+
+    **Returns**
+
+        record: *dict*
+            status, the SolverMetrics counters, and config and solution rows
+            or an error, like batch_solve.solve_file()
+    '''
+    puzzle, engine, timeout = task
+    record = {}
+    metrics = SolverMetrics()
+
+    try:
+        grid = _grids.pop(puzzle, None)
+        if grid is None:
+            grid = Grid(puzzle, metrics)
+        else:
+            grid.metrics = metrics
+        _grids[puzzle] = grid
+        if len(_grids) > _GRID_CACHE:
+            _grids.popitem(last=False)
+
+        # find_solution prints
+        with contextlib.redirect_stdout(io.StringIO()):
+            board_int, laser_path, config = grid.find_solution(
+                engine=engine, timeout=timeout)
+        record['status'] = 'solved'
+        record['config'] = [int(val) for val in config]
+        record['solution'] = solved_rows(puzzle, config)
+    except TimeoutError as e:
+        record['status'] = 'timeout'
+        record['error'] = str(e)
+    except ValueError as e:
+        if str(e).startswith("No Solution Found"):
+            record['status'] = 'no_solution'
+        else:
+            record['status'] = 'error'
+        record['error'] = str(e)
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = '%s: %s' % (type(e).__name__, e)
+
+    record.update(metrics.counters())
+    return record
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    # set on the server class by make_server()
+    service = None
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._reply(200, self.service.stats())
+        elif self.path == '/health':
+            self._reply(200, {'ok': True})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/solve':
+            self._reply(404, {'error': 'not found'})
+            return
+        length = self.headers.get('Content-Length')
+        if length is None or not length.strip().isdigit():
+            # a negative length would read until the client hangs up
+            self._reply(400, {'status': 'error',
+                              'error': 'bad request: Content-Length %r is '
+                                       'not a byte count' % length})
+            return
+        body = self.rfile.read(int(length))
+        timeout = engine = None
+        if 'json' in (self.headers.get('Content-Type') or ''):
+            try:
+                request = json.loads(body)
+                text = request['bff']
+                timeout = request.get('timeout')
+                engine = request.get('engine')
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {'status': 'error',
+                                  'error': 'bad request: %s' % e})
+                return
+        else:
+            text = body.decode(errors='replace')
+
+        record = self.service.submit(text, timeout, engine)
+        self._reply(HTTP_STATUS[record['status']], record)
+
+    def _reply(self, code, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # one line per request on stderr would swamp load tests
+        pass
+
+
+def make_server(service, host='127.0.0.1', port=8765):
+    '''
+    Builds the HTTP server for a service. Call serve_forever() on it.
+
+    **Parameters**
+
+        service: *SolverService*
+            The service that answers the requests
+        host: *str*
+            Address to listen on. Defaults to 127.0.0.1.
+        port: *int*
+            Port to listen on, 0 for any free one. Defaults to 8765.
+
+    **Returns**
+
+        server: *ThreadingHTTPServer*
+            The server, with the port it got in server.server_address
+    '''
+    handler = type('Handler', (ServiceHandler,), {'service': service})
+    server = _Server((host, port), handler)
+    return server
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections under concurrent load,
+    # which the clients only retry after a second
+    request_queue_size = 128
+
+
+class AsyncSolverClient:
+    def __init__(self, host='127.0.0.1', port=8765):
+        '''
+        A small asyncio client for the service, one connection per request.
+
+        **Attributes**
+            host: *str*
+                Address of the service
+            port: *int*
+                Port of the service
+
+        **Parameters**
+
+            host: *str*
+                Address of the service. Defaults to 127.0.0.1.
+            port: *int*
+                Port of the service. Defaults to 8765.
+        '''
+        self.host = host
+        self.port = port
+
+    async def solve(self, text, timeout=None, engine=None):
+        '''
+        Sends one puzzle to be solved.
+
+        **Parameters**
+            text: **str**
+                The text of a bff file
+            timeout: **float, optional**
+                Seconds allowed on the service
+            engine: **str, optional**
+                The find_solution() engine
+
+        **Returns**
+            record: **dict**
+                The service's answer, see SolverService.submit()
+        '''
+        request = {'bff': text}
+        if timeout is not None:
+            request['timeout'] = timeout
+        if engine is not None:
+            request['engine'] = engine
+        return (await self._request('POST', '/solve', request))[1]
+
+    async def stats(self):
+        '''
+        The service's /stats, see SolverService.stats().
+        '''
+        return (await self._request('GET', '/stats'))[1]
+
+    async def _request(self, method, path, payload=None):
+        # one HTTP/1.1 request, returns (status code, decoded JSON body)
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            body = b'' if payload is None else json.dumps(payload).encode()
+            head = ('%s %s HTTP/1.1\r\nHost: %s\r\n'
+                    'Content-Type: application/json\r\n'
+                    'Content-Length: %d\r\nConnection: close\r\n\r\n'
+                    % (method, path, self.host, len(body)))
+            writer.write(head.encode() + body)
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            length = None
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode().partition(':')
+                if name.strip().lower() == 'content-length':
+                    length = int(value)
+            if length is None:
+                data = await reader.read()
+            else:
+                data = await reader.readexactly(length)
+            return status, json.loads(data)
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve the lazor solver over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('-p', '--port', type=int, default=8765,
+                        help='port to listen on (default: 8765)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='solver processes (default: CPU count)')
+    parser.add_argument('-q', '--queue-size', type=int, default=256,
+                        help='most requests waiting (default: 256)')
+    parser.add_argument('-t', '--timeout', type=float, default=30.0,
+                        help='default seconds per request (default: 30)')
+    parser.add_argument('-e', '--engine', default='backtrack',
+                        help='default engine (default: backtrack)')
+    parser.add_argument('-c', '--cache', default=None,
+                        help='solution store file (default: memory only)')
+    args = parser.parse_args(argv)
+
+    store = SolutionStore(args.cache)
+    with SolverService(args.workers, args.queue_size, args.timeout,
+                       args.engine, store) as service:
+        server = make_server(service, args.host, args.port)
+        print('serving on http://%s:%d' % server.server_address[:2])
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
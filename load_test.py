@@ -0,0 +1,161 @@
+'''
+Load test a local lazor solver service. Sends a number of puzzles with a
+fixed number of requests in flight from an asyncio client, then reports
+throughput, latency percentiles as the client saw them, and the service's
+own /stats.
+
+    python load_test.py -n 500 -c 32                   # starts a service
+    python load_test.py -n 500 -c 32 --port 8765       # uses a running one
+'''
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import threading
+import time
+
+from lazor_service import (AsyncSolverClient, SolverService, make_server,
+                           summarize)
+from solution_store import SolutionStore
+
+
+async def run_load(client, texts, requests, concurrency, timeout=None,
+                   engine=None):
+    '''
+    Sends requests puzzles, cycling through texts, with at most concurrency
+    of them in flight.
+
+    **Parameters**
+
+        client: *AsyncSolverClient*
+            Client of the service
+        texts: *list*
+            bff texts to send
+        requests: *int*
+            Number of requests to send
+        concurrency: *int*
+            Most requests in flight at once
+        timeout: *float, optional*
+            Seconds allowed per request on the service
+        engine: *str, optional*
+            The find_solution() engine
+
+    **Returns**
+
+        results: *list*
+            (client seconds, record) for every request, in the order sent
+    '''
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with gate:
+            start = time.perf_counter()
+            try:
+                record = await client.solve(text, timeout, engine)
+            except (OSError, ValueError) as e:
+                record = {'status': 'error', 'error': str(e)}
+            return time.perf_counter() - start, record
+
+    return await asyncio.gather(*[one(texts[i % len(texts)])
+                                  for i in range(requests)])
+
+
+def report(results, seconds, stats):
+    '''
+    Lays out the results of a load test as text.
+
+    **Parameters**
+
+        results: *list*
+            From run_load()
+        seconds: *float*
+            Wall time of the whole test
+        stats: *dict*
+            The service's /stats after the test
+
+    **Returns**
+
+        *str*
+            The report
+    '''
+    counts = {}
+    for _, record in results:
+        counts[record['status']] = counts.get(record['status'], 0) + 1
+    latency = summarize(sorted(elapsed for elapsed, _ in results))
+    lines = [
+        '%d requests in %.2f s (%.1f per second)'
+        % (len(results), seconds, len(results) / seconds if seconds else 0),
+        'status: %s' % ', '.join('%d %s' % (n, status)
+                                 for status, n in sorted(counts.items())),
+    ]
+    if latency['count']:
+        lines.append('client latency ms: p50 %.1f  p90 %.1f  p99 %.1f  '
+                     'max %.1f' % tuple(latency[key] * 1000 for key in
+                                        ('p50', 'p90', 'p99', 'max')))
+    lines.append('service stats: %s' % json.dumps(stats, indent=2))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(
+        description='Load test a local lazor solver service.')
+    parser.add_argument('paths', nargs='*',
+                        help='bff files to send (default: the bundled '
+                             'puzzles)')
+    parser.add_argument('-n', '--requests', type=int, default=200,
+                        help='requests to send (default: 200)')
+    parser.add_argument('-c', '--concurrency', type=int, default=16,
+                        help='requests in flight (default: 16)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='service address (default: 127.0.0.1)')
+    parser.add_argument('-p', '--port', type=int, default=None,
+                        help='port of a running service (default: start '
+                             'one)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='solver processes of a started service')
+    parser.add_argument('-t', '--timeout', type=float, default=None,
+                        help='seconds allowed per request')
+    parser.add_argument('-e', '--engine', default=None,
+                        help='find_solution() engine')
+    parser.add_argument('--cache', action='store_true',
+                        help='let a started service answer repeated '
+                             'puzzles from a solution store')
+    args = parser.parse_args(argv)
+
+    fnames = args.paths or sorted(glob.glob(os.path.join(here, '*.bff')))
+    texts = []
+    for fname in fnames:
+        with open(fname) as file:
+            texts.append(file.read())
+
+    service = server = None
+    port = args.port
+    if port is None:
+        store = SolutionStore() if args.cache else None
+        service = SolverService(args.workers, store=store)
+        server = make_server(service, args.host, 0)
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        client = AsyncSolverClient(args.host, port)
+        start = time.perf_counter()
+        results = asyncio.run(run_load(client, texts, args.requests,
+                                       args.concurrency, args.timeout,
+                                       args.engine))
+        seconds = time.perf_counter() - start
+        stats = asyncio.run(client.stats())
+        print(report(results, seconds, stats))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+'''
+Generate random lazor puzzles with a planted solution, for scaling and
+stress tests. Blocks are dropped into random open spots first, the lasers
+are traced through that board, and the goal points are picked from the
+positions they pass, so every puzzle made is solvable.
+
+    python puzzle_generator.py --size 10 10 --blocks 6 0 2 --lasers 2 \
+        --goals 5 --count 20 --output generated/
+'''
+
+import argparse
+import os
+import random
+
+from Final_Solution import Grid
+from Read_in_bff_file import Puzzle
+
+
+def generate_puzzle(width, height, blocks=(3, 0, 1), fixed=(0, 0, 0),
+                    x_density=0.1, lasers=1, goals=3, seed=None,
+                    require_blocks=True, tries=100):
+    '''
+    Makes a random puzzle and a configuration that solves it.
+
+    **Parameters**
+
+        width, height: *int*
+            Number of grid columns and rows
+        blocks: *tuple*
+            Number of A, B and C blocks to place. Defaults to (3, 0, 1).
+        fixed: *tuple*
+            Number of A, B and C blocks fixed in the grid. Defaults to none.
+        x_density: *float*
+            Fraction of the grid made 'x' (no block allowed). Defaults to
+            0.1.
+        lasers: *int*
+            Number of lasers, each starting on the edge of the grid and
+            pointing in. Defaults to 1.
+        goals: *int*
+            Number of goal points. Defaults to 3.
+        seed: *int, optional*
+            Seed of the random choices, so a puzzle can be made again
+        require_blocks: *bool*
+            Prefer goal points the lasers only pass because of the placed
+            blocks, so the puzzle can not be solved by leaving them out.
+            Defaults to True.
+        tries: *int*
+            Lasers and goal points are picked again until the lasers pass
+            enough positions. Defaults to 100 tries.
+
+    **Returns**
+
+        puzzle: *Puzzle*
+            The puzzle
+        config: *tuple*
+            A configuration of its open spots that solves it
+    '''
+    rng = random.Random(seed)
+    cells = width * height
+    n_fixed = sum(fixed)
+    n_x = int(round(cells * x_density))
+    if sum(blocks) + n_fixed + n_x > cells:
+        raise ValueError("%d blocks, %d fixed blocks and %d 'x' do not fit "
+                         "a %dx%d grid" % (sum(blocks), n_fixed, n_x, width,
+                                           height))
+
+    # lay out the grid
+    kinds = ['A'] * fixed[0] + ['B'] * fixed[1] + ['C'] * fixed[2] + \
+        ['x'] * n_x
+    kinds += ['o'] * (cells - len(kinds))
+    rng.shuffle(kinds)
+    rows = tuple(''.join(kinds[i * width:(i + 1) * width])
+                 for i in range(height))
+
+    # plant a solution
+    items = [1] * blocks[0] + [2] * blocks[1] + [3] * blocks[2]
+    items += [0] * (kinds.count('o') - len(items))
+    rng.shuffle(items)
+    config = tuple(items)
+    letters = [(letter, count) for letter, count in zip('ABC', blocks)
+               if count]
+
+    for _ in range(tries):
+        starts = tuple(edge_laser(width, height, rng) for _ in range(lasers))
+        puzzle = Puzzle(rows, tuple(letters), starts, ())
+        grid = Grid(puzzle)
+        hit = passed(grid, config)
+        # positions the lasers also pass with every open spot left empty
+        free = passed(grid, (0,) * len(config))
+        starts_at = set((x, y) for x, y, vx, vy in starts)
+        choices = sorted(hit - starts_at)
+        if len(choices) < goals:
+            continue
+
+        needed = [pos for pos in choices if pos not in free]
+        if require_blocks and needed:
+            # at least one goal point that needs the blocks
+            first = rng.choice(needed)
+            rest = [pos for pos in choices if pos != first]
+            picked = [first] + rng.sample(rest, goals - 1)
+        else:
+            picked = rng.sample(choices, goals)
+        puzzle = Puzzle(rows, tuple(letters), starts, tuple(sorted(picked)))
+        return puzzle, config
+
+    raise ValueError("no lasers passing %d positions found in %d tries"
+                     % (goals, tries))
+
+
+def edge_laser(width, height, rng):
+    '''
+    A random laser on the edge of the grid, pointing into it.
+
+    **Parameters**
+
+        width, height: *int*
+            Number of grid columns and rows
+        rng: *random.Random*
+            Source of the random choices
+
+    **Returns**
+
+        laser: *tuple*
+            (x, y, vx, vy)
+    '''
+    side = rng.randrange(4)
+    if side < 2:
+        # left or right edge, at the middle of a block side
+        x = 0 if side == 0 else width * 2
+        y = rng.randrange(height) * 2 + 1
+        return (x, y, 1 if side == 0 else -1, rng.choice((1, -1)))
+    # top or bottom edge
+    x = rng.randrange(width) * 2 + 1
+    y = 0 if side == 2 else height * 2
+    return (x, y, rng.choice((1, -1)), 1 if side == 2 else -1)
+
+
+def passed(grid, config):
+    '''
+    The grid positions lasers pass with a configuration's blocks placed.
+
+    **Parameters**
+
+        grid: *Grid*
+            The puzzle
+        config: *tuple*
+            A configuration of its open spots
+
+    **Returns**
+
+        positions: *set*
+            (x, y) of every position passed
+    '''
+    stride = grid.compiled.stride
+    positions = set()
+    for idx in grid.tracer.trace(grid.compiled.place_cells(config)):
+        y, x = divmod(idx, stride)
+        positions.add((x - 1, y - 1))
+
+    return positions
+
+
+def write_puzzle(puzzle, fname, config=None, seed=None):
+    '''
+    Writes a puzzle as a bff file, with the planted solution and seed in
+    its comments.
+
+    **Parameters**
+
+        puzzle: *Puzzle*
+            The puzzle
+        fname: *str*
+            The file to write
+        config: *tuple, optional*
+            The planted solution, to note in a comment
+        seed: *int, optional*
+            The seed the puzzle was made with, to note in a comment
+    '''
+    lines = ['# generated by puzzle_generator.py']
+    if seed is not None:
+        lines.append('# seed %d' % seed)
+    if config is not None:
+        lines.append('# planted solution %s'
+                     % ' '.join(str(val) for val in config))
+    with open(fname, 'w') as file:
+        file.write('\n'.join(lines) + '\n' + puzzle.to_bff())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Generate lazor puzzles with a planted solution.')
+    parser.add_argument('--size', type=int, nargs=2, default=(6, 6),
+                        metavar=('WIDTH', 'HEIGHT'),
+                        help='grid columns and rows (default: 6 6)')
+    parser.add_argument('--blocks', type=int, nargs=3, default=(3, 0, 1),
+                        metavar=('A', 'B', 'C'),
+                        help='blocks to place (default: 3 0 1)')
+    parser.add_argument('--fixed', type=int, nargs=3, default=(0, 0, 0),
+                        metavar=('A', 'B', 'C'),
+                        help='blocks fixed in the grid (default: 0 0 0)')
+    parser.add_argument('--x-density', type=float, default=0.1,
+                        help="fraction of 'x' spots (default: 0.1)")
+    parser.add_argument('--lasers', type=int, default=1,
+                        help='number of lasers (default: 1)')
+    parser.add_argument('--goals', type=int, default=3,
+                        help='number of goal points (default: 3)')
+    parser.add_argument('-n', '--count', type=int, default=1,
+                        help='puzzles to make (default: 1)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first puzzle, the next ones count '
+                             'up (default: 0)')
+    parser.add_argument('-o', '--output', default='.',
+                        help='directory to write to (default: .)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    width, height = args.size
+    for seed in range(args.seed, args.seed + args.count):
+        puzzle, config = generate_puzzle(
+            width, height, tuple(args.blocks), tuple(args.fixed),
+            args.x_density, args.lasers, args.goals, seed)
+        fname = os.path.join(args.output, 'gen_%dx%d_%d.bff'
+                             % (width, height, seed))
+        write_puzzle(puzzle, fname, config, seed)
+        print(fname)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+'''
+Measure how the solver scales with puzzle size, over puzzles made by
+puzzle_generator.py. Each step of the ladder grows the grid and the number
+of blocks; per step, the time per config of get_configs() and
+get_laser_path() and the time of a full find_solution() are measured next
+to the size of the search space (the number of configs).
+
+A per-config time that climbs with the grid is a super-linear blow-up.
+The growth exponents fitted at the end should stay near 0 for
+get_configs() and get_laser_path(): making the next config costs the same
+on any grid, and a laser path is only as long as the beams that run it.
+
+    python scaling_benchmark.py --output scaling.csv --plot scaling.png
+
+The plot needs matplotlib; without it only the CSV is written.
+'''
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import math
+
+from benchmark import measure
+from Final_Solution import Grid, TraceCache
+from puzzle_generator import generate_puzzle
+
+# (grid side, A, B, C) for each step of the default ladder
+LADDER = ((3, 2, 0, 1), (4, 3, 0, 1), (5, 3, 1, 1), (6, 4, 1, 1),
+          (7, 5, 1, 1), (8, 5, 1, 2), (10, 6, 1, 2), (12, 7, 2, 2))
+
+# the columns of the CSV, in order
+FIELDS = ('side', 'seed', 'slots', 'blocks', 'space', 'get_configs',
+          'get_laser_path', 'find_solution', 'status', 'evaluated')
+
+
+def scale_puzzle(side, blocks, seed, engine='backtrack', limit=500,
+                 solve_timeout=30, lasers=2, goals=4, x_density=0.1):
+    '''
+    Makes one puzzle and measures it.
+
+    **Parameters**
+
+        side: *int*
+            Number of grid rows and columns
+        blocks: *tuple*
+            Number of A, B and C blocks
+        seed: *int*
+            Seed of the puzzle
+        engine: *str*
+            The find_solution() engine. Defaults to 'backtrack'.
+        limit: *int*
+            Most configs timed by the per-config phases. Defaults to 500.
+        solve_timeout: *float*
+            Seconds allowed for find_solution. Defaults to 30.
+        lasers, goals, x_density:
+            See generate_puzzle()
+
+    **Returns**
+
+        row: *dict*
+            One value per name in FIELDS. The phase times are seconds per
+            config, except find_solution, which is the whole solve.
+    '''
+    puzzle, planted = generate_puzzle(side, side, blocks,
+                                      x_density=x_density, lasers=lasers,
+                                      goals=goals, seed=seed)
+    grid = Grid(puzzle)
+    configs = list(itertools.islice(grid.get_configs(), limit))
+
+    def get_configs():
+        for _ in itertools.islice(grid.get_configs(), limit):
+            pass
+    make = measure(get_configs, len(configs), memory=False)
+
+    boards = [grid.config_to_board(config) for config in configs]
+
+    def get_laser_path():
+        for board in boards:
+            grid.get_laser_path(board)
+    trace = measure(get_laser_path, len(boards), memory=False)
+
+    status = {}
+
+    def find_solution():
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                grid.find_solution(cache=TraceCache(), timeout=solve_timeout,
+                                   engine=engine)
+            status['status'] = 'solved'
+        except TimeoutError:
+            status['status'] = 'timeout'
+        except ValueError:
+            # never expected, the puzzle has a planted solution
+            status['status'] = 'no_solution'
+    solve = measure(find_solution, 1, memory=False)
+
+    return {
+        'side': side,
+        'seed': seed,
+        'slots': len(planted),
+        'blocks': sum(blocks),
+        'space': grid.get_configs().total,
+        'get_configs': make['seconds'] / max(1, make['count']),
+        'get_laser_path': trace['seconds'] / max(1, trace['count']),
+        'find_solution': solve['seconds'],
+        'status': status['status'],
+        'evaluated': grid.metrics.configs_evaluated,
+    }
+
+
+def run_scaling(ladder=LADDER, seeds=3, **kwargs):
+    '''
+    Measures every step of a ladder.
+
+    **Parameters**
+
+        ladder: *tuple*
+            (grid side, A, B, C) per step. Defaults to LADDER.
+        seeds: *int*
+            Puzzles made per step. Defaults to 3.
+        kwargs:
+            Passed on to scale_puzzle()
+
+    **Returns**
+
+        rows: *list*
+            One scale_puzzle() row per puzzle
+    '''
+    rows = []
+    for side, a, b, c in ladder:
+        for seed in range(seeds):
+            rows.append(scale_puzzle(side, (a, b, c), seed, **kwargs))
+
+    return rows
+
+
+def growth(rows, x, y):
+    '''
+    Fits y = k * x ** p by least squares on the log of both, over the rows
+    with positive values.
+
+    **Parameters**
+
+        rows: *list*
+            Rows from run_scaling()
+        x, y: *str*
+            The field names to fit
+
+    **Returns**
+
+        p: *float or None*
+            The growth exponent, None with under two distinct x values
+    '''
+    points = [(math.log(row[x]), math.log(row[y])) for row in rows
+              if row[x] > 0 and row[y] > 0]
+    if len(set(px for px, py in points)) < 2:
+        return None
+    mean_x = sum(px for px, py in points) / len(points)
+    mean_y = sum(py for px, py in points) / len(points)
+    top = sum((px - mean_x) * (py - mean_y) for px, py in points)
+    bottom = sum((px - mean_x) ** 2 for px, py in points)
+
+    return top / bottom
+
+
+def write_csv(rows, fname):
+    '''
+    Writes the rows as a CSV file, one line per puzzle.
+
+    **Parameters**
+
+        rows: *list*
+            Rows from run_scaling()
+        fname: *str*
+            The file to write
+    '''
+    with open(fname, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def plot(rows, fname):
+    '''
+    Plots solve time against search space size, and the per-config phase
+    times against grid side, both on log scales.
+
+    **Parameters**
+
+        rows: *list*
+            Rows from run_scaling()
+        fname: *str*
+            The image file to write
+
+    **Returns**
+
+        *bool*
+            False if matplotlib is not installed and nothing was plotted
+    '''
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return False
+
+    fig, (left, right) = plt.subplots(1, 2, figsize=(11, 4.5))
+    for status, marker in (('solved', 'o'), ('timeout', 'x')):
+        picked = [row for row in rows if row['status'] == status]
+        if picked:
+            left.scatter([row['space'] for row in picked],
+                         [row['find_solution'] for row in picked],
+                         marker=marker, label=status)
+    left.set_xscale('log')
+    left.set_yscale('log')
+    left.set_xlabel('search space (configs)')
+    left.set_ylabel('find_solution (s)')
+    left.legend()
+
+    for phase in ('get_configs', 'get_laser_path'):
+        right.scatter([row['side'] for row in rows],
+                      [row[phase] for row in rows], label=phase)
+    right.set_xscale('log')
+    right.set_yscale('log')
+    right.set_xlabel('grid side')
+    right.set_ylabel('seconds per config')
+    right.legend()
+
+    fig.tight_layout()
+    fig.savefig(fname)
+    plt.close(fig)
+    return True
+
+
+def format_rows(rows):
+    '''
+    Lays the rows out as a text table.
+
+    **Parameters**
+
+        rows: *list*
+            Rows from run_scaling()
+
+    **Returns**
+
+        *str*
+            One line per puzzle
+    '''
+    lines = ['%4s %4s %5s %6s %12s %12s %12s %10s %-8s' % (
+        'side', 'seed', 'slots', 'blocks', 'space', 'configs us',
+        'laser us', 'solve s', 'status')]
+    for row in rows:
+        lines.append('%4d %4d %5d %6d %12.4g %12.2f %12.2f %10.4f %-8s' % (
+            row['side'], row['seed'], row['slots'], row['blocks'],
+            row['space'], row['get_configs'] * 1e6,
+            row['get_laser_path'] * 1e6, row['find_solution'],
+            row['status']))
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Measure how the solver scales with puzzle size.')
+    parser.add_argument('--seeds', type=int, default=3,
+                        help='puzzles per ladder step (default: 3)')
+    parser.add_argument('--max-side', type=int, default=None,
+                        help='skip ladder steps with a larger grid')
+    parser.add_argument('-e', '--engine', default='backtrack',
+                        help='find_solution engine (default: backtrack)')
+    parser.add_argument('-n', '--limit', type=int, default=500,
+                        help='configs per phase (default: 500)')
+    parser.add_argument('--solve-timeout', type=float, default=30,
+                        help='seconds allowed per find_solution')
+    parser.add_argument('-o', '--output', default='scaling.csv',
+                        help='CSV file to write (default: scaling.csv)')
+    parser.add_argument('--plot', help='image file to plot to')
+    args = parser.parse_args(argv)
+
+    ladder = [step for step in LADDER
+              if args.max_side is None or step[0] <= args.max_side]
+    rows = run_scaling(ladder, args.seeds, engine=args.engine,
+                       limit=args.limit, solve_timeout=args.solve_timeout)
+    print(format_rows(rows))
+    for x, y in (('side', 'get_configs'), ('side', 'get_laser_path'),
+                 ('space', 'find_solution')):
+        p = growth(rows, x, y)
+        if p is not None:
+            print('%s grows as %s ** %.2f' % (y, x, p))
+
+    write_csv(rows, args.output)
+    if args.plot and not plot(rows, args.plot):
+        print('matplotlib is not installed, wrote %s only' % args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+'''
+A store of solved puzzles, kept in memory and in an SQLite file, keyed by
+the content hash of the parsed puzzle (Puzzle.digest()). A puzzle that was
+solved before is answered from the store, even if its file was renamed,
+reformatted or had its lasers and goal points listed in another order.
+
+    store = SolutionStore('solutions.db')
+    grid = Grid('mad_7.bff')
+    grid.output_solution(store=store)    # searches and stores the solution
+    grid.output_solution(store=store)    # answered from the store
+'''
+
+import sqlite3
+import threading
+
+from Read_in_bff_file import parse_bff, Puzzle
+
+
+class SolutionStore:
+    def __init__(self, path=None):
+        '''
+        Solutions found for puzzles, and puzzles proven to have none.
+        * every entry is written to the SQLite file as soon as it is put,
+          so other processes using the same file see it too
+        * entries read once are kept in memory, so repeated lookups only
+          hash the puzzle and read a dictionary
+        * a store can be shared by threads
+
+        **Attributes**
+            path: *str or None*
+                The SQLite file, None to keep entries in memory only
+            hits: *int*
+                Lookups that found an entry
+            misses: *int*
+                Lookups that did not
+
+        **Parameters**
+
+            path: *str, optional*
+                The SQLite file, created if missing. Defaults to None.
+        '''
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        # digest: (config or None, error or None)
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS solutions ('
+                             'digest TEXT PRIMARY KEY, config TEXT, '
+                             'error TEXT, bff TEXT)')
+            self._db.commit()
+
+    def __len__(self):
+        if self._db is None:
+            return len(self._memory)
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM solutions').fetchone()[0]
+
+    def __contains__(self, puzzle):
+        return self._entry(puzzle) is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        '''
+        Closes the SQLite file. Entries already in memory can still be read.
+        '''
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get(self, puzzle):
+        '''
+        Finds the stored solution of a puzzle.
+
+        Raises the ValueError find_solution() raised ("No Solution Found
+        ...") if the puzzle was stored as having no solution.
+
+        **Parameters**
+            puzzle: **Puzzle, str or bytes**
+                The puzzle, or the text of its bff file
+
+        **Returns**
+            config: **tuple or None**
+                The configuration of the open spots that solves it, or None
+                if the puzzle is not in the store
+        '''
+        entry = self._entry(puzzle)
+        if entry is None:
+            return None
+        config, error = entry
+        if config is None:
+            raise ValueError(error)
+
+        return config
+
+    def put(self, puzzle, config, error=None):
+        '''
+        Stores the solution of a puzzle, or that it has none.
+
+        **Parameters**
+            puzzle: **Puzzle, str or bytes**
+                The puzzle, or the text of its bff file
+            config: **tuple or None**
+                The configuration that solves it, None if it has no solution
+            error: **str, optional**
+                The message find_solution() raised for a puzzle without a
+                solution. Defaults to "No Solution Found".
+        '''
+        puzzle = as_puzzle(puzzle)
+        digest = puzzle.digest()
+        if config is None:
+            error = error or "No Solution Found"
+        else:
+            config = tuple(int(val) for val in config)
+            if len(config) != sum(row.count('o') for row in puzzle.grid):
+                raise ValueError("config does not fit the puzzle's open "
+                                 "spots")
+            error = None
+
+        with self._lock:
+            self._memory[digest] = (config, error)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?)',
+                    (digest, None if config is None
+                     else ','.join(str(val) for val in config),
+                     error, puzzle.canonical().to_bff()))
+                self._db.commit()
+
+    def discard(self, puzzle):
+        '''
+        Removes a puzzle from the store, if it is there.
+
+        **Parameters**
+            puzzle: **Puzzle, str or bytes**
+                The puzzle, or the text of its bff file
+        '''
+        digest = as_puzzle(puzzle).digest()
+        with self._lock:
+            self._memory.pop(digest, None)
+            if self._db is not None:
+                self._db.execute('DELETE FROM solutions WHERE digest = ?',
+                                 (digest,))
+                self._db.commit()
+
+    def _entry(self, puzzle):
+        # (config, error) for a puzzle, from memory or the file
+        digest = as_puzzle(puzzle).digest()
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    'SELECT config, error FROM solutions WHERE digest = ?',
+                    (digest,)).fetchone()
+                if row is not None:
+                    config = None if row[0] is None else \
+                        tuple(int(val) for val in row[0].split(',') if val)
+                    entry = self._memory[digest] = (config, row[1])
+
+            # counted under the lock, so threads do not lose updates
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+
+def as_puzzle(puzzle):
+    '''
+    Parses bff text or bytes into a Puzzle. Puzzles are returned as they are.
+
+    **Parameters**
+
+        puzzle: *Puzzle, str or bytes*
+            The puzzle, or the text of its bff file
+
+    **Returns**
+
+        puzzle: *Puzzle*
+            The parsed puzzle
+    '''
+    if isinstance(puzzle, Puzzle):
+        return puzzle
+    return parse_bff(puzzle)
+
+
+def solved_rows(puzzle, config):
+    '''
+    Writes out the grid of a puzzle with a configuration's blocks placed,
+    like Grid.get_solved_board(), without building a Grid.
+
+    **Parameters**
+
+        puzzle: *Puzzle*
+            The puzzle
+        config: *tuple*
+            A configuration of the open spots
+
+    **Returns**
+
+        rows: *list*
+            One string per grid row, with 'o', 'x', 'A', 'B' and 'C'
+    '''
+    letters = iter('oABC'[val] for val in config)
+    return [''.join(next(letters) if ele == 'o' else ele for ele in row)
+            for row in puzzle.grid]
@@ -0,0 +1,112 @@
+'''
+Checks the command line of batch_solve.py on a directory of puzzles.
+
+    python -m unittest test_batch
+'''
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from Final_Solution import Grid, SolverMetrics
+from batch_solve import main
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PUZZLES = ('dark_1.bff', 'mad_1.bff', 'tiny_5.bff')
+# a puzzle with no solution, that prove_infeasible() can not rule out
+NO_SOLUTION = '''GRID START
+o o o
+x o o
+x o o
+GRID STOP
+A 2
+L 0 1 1 1
+P 2 1
+P 3 2
+P 5 2
+'''
+
+
+class BatchSolveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.levels = os.path.join(self.tmp, 'levels')
+        os.mkdir(self.levels)
+        for name in PUZZLES:
+            shutil.copy(os.path.join(HERE, name), self.levels)
+        with open(os.path.join(self.levels, 'none.bff'), 'w') as file:
+            file.write(NO_SOLUTION)
+        with open(os.path.join(self.levels, 'broken.bff'), 'w') as file:
+            file.write('GRID START\no q\nGRID STOP\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def run_batch(self, *args):
+        # the records written to --output, keyed by file name, and the
+        # summary line
+        output = os.path.join(self.tmp, 'out.jsonl')
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            main([self.levels, '--workers', '2', '--output', output] +
+                 list(args))
+        records = {}
+        with open(output) as file:
+            for line in file:
+                record = json.loads(line)
+                records[os.path.basename(record['file'])] = record
+        return records, stderr.getvalue().strip()
+
+    def test_output(self):
+        records, summary = self.run_batch()
+        self.assertEqual(sorted(records), sorted(PUZZLES +
+                                                 ('none.bff', 'broken.bff')))
+        self.assertEqual(summary, '5 puzzles: 1 error, 1 no_solution, '
+                                  '3 solved')
+        for name in PUZZLES:
+            record = records[name]
+            self.assertEqual(record['status'], 'solved', name)
+            grid = Grid(record['file'])
+            self.assertTrue(grid.is_solution(record['config']), name)
+            board = grid.get_solved_board(record['config'])
+            self.assertEqual(record['solution'],
+                             [''.join(row) for row in board], name)
+            for key in SolverMetrics.COUNTERS + ('elapsed', 'phase_times'):
+                self.assertIn(key, record, (name, key))
+            self.assertFalse(record.get('cached'), name)
+        self.assertEqual(records['none.bff']['status'], 'no_solution')
+        self.assertTrue(records['none.bff']['error'].startswith(
+            'No Solution Found'))
+        self.assertEqual(records['broken.bff']['status'], 'error')
+        self.assertIn('line 2', records['broken.bff']['error'])
+
+    def test_count(self):
+        records, summary = self.run_batch('--count')
+        for name in PUZZLES:
+            self.assertEqual(records[name]['solutions'],
+                             4 if name == 'tiny_5.bff' else 1, name)
+            self.assertNotIn('config', records[name])
+        self.assertEqual(records['none.bff']['solutions'], 0)
+        self.assertEqual(records['none.bff']['status'], 'no_solution')
+
+    def test_cache(self):
+        cache = os.path.join(self.tmp, 'solutions.db')
+        first, summary = self.run_batch('--cache', cache)
+        second, summary = self.run_batch('--cache', cache)
+        for name in PUZZLES + ('none.bff',):
+            self.assertFalse(first[name]['cached'], name)
+            self.assertTrue(second[name]['cached'], name)
+            self.assertEqual(second[name]['status'], first[name]['status'])
+            self.assertEqual(second[name].get('config'),
+                             first[name].get('config'), name)
+            # nothing was searched the second time
+            self.assertEqual(second[name]['configs_evaluated'], 0, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+'''
+Checks that a TraceCache gives the verdicts of an uncached trace, and
+evicts its least recently used results.
+
+    python -m unittest test_cache
+'''
+
+import contextlib
+import glob
+import io
+import itertools
+import os
+import unittest
+
+from Final_Solution import Grid, TraceCache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# the bundled puzzles
+LEVELS = sorted(glob.glob(os.path.join(HERE, '*.bff')))
+
+
+def cached_trace(grid, cache, config):
+    # the (covered, last) result for config, traced and stored on a miss
+    result = cache.lookup(config)
+    if result is None:
+        covered, touched = grid.tracer.trace_signature(
+            grid.compiled.place_cells(config))
+        result = cache.store(config, touched, covered)
+    return result
+
+
+def distinct_keys(grid, count):
+    # configs whose traces reach different blocks, so each is its own entry
+    keys = set()
+    found = []
+    for config in grid.get_configs():
+        touched = grid.tracer.trace_signature(
+            grid.compiled.place_cells(config))[1]
+        key = tuple((k, config[k]) for k in touched)
+        if key not in keys:
+            keys.add(key)
+            found.append(config)
+            if len(found) == count:
+                return found
+
+
+class TraceCacheTest(unittest.TestCase):
+
+    def test_verdicts(self):
+        self.assertTrue(LEVELS)
+        for fname in LEVELS:
+            grid = Grid(fname)
+            goal_mask = grid.tracer.goal_mask
+            cache = TraceCache(maxsize=8)
+            cache.bind(grid.tracer)
+            lookups = 0
+            configs = list(itertools.islice(grid.get_configs(), 3000))
+            # a second pass finds what the first one left in the cache
+            for config in configs + configs[::-1]:
+                covered = cached_trace(grid, cache, config)[0]
+                lookups += 1
+                cells = grid.compiled.place_cells(config)
+                self.assertEqual(covered == goal_mask,
+                                 grid.tracer.trace_goals(cells) == goal_mask,
+                                 (fname, config))
+            self.assertLessEqual(len(cache), 8)
+            self.assertEqual(cache.hits + cache.misses, lookups)
+            self.assertEqual(len(cache) + cache.evictions, cache.misses)
+
+    def test_find_solution(self):
+        for fname in LEVELS:
+            grid = Grid(fname)
+            with contextlib.redirect_stdout(io.StringIO()):
+                scan = grid.find_solution()[2]
+                cached = grid.find_solution(cache=TraceCache(maxsize=4))[2]
+            self.assertEqual(tuple(cached), tuple(scan), fname)
+
+    def test_lru(self):
+        grid = Grid(os.path.join(HERE, 'mad_1.bff'))
+        first, second, third = distinct_keys(grid, 3)
+        cache = TraceCache(maxsize=2)
+        cache.bind(grid.tracer)
+        for config in (first, second):
+            cached_trace(grid, cache, config)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        # first was used last, so second is the one evicted
+        self.assertIsNotNone(cache.lookup(first))
+        cached_trace(grid, cache, third)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.lookup(second))
+        self.assertIsNotNone(cache.lookup(first))
+        self.assertIsNotNone(cache.lookup(third))
+        self.assertEqual((cache.hits, cache.misses), (3, 4))
+
+    def test_bind(self):
+        cache = TraceCache()
+        cache.bind(Grid(LEVELS[0]).tracer)
+        with self.assertRaises(ValueError):
+            cache.bind(Grid(LEVELS[0]).tracer)
+
+
+if __name__ == '__main__':
+    unittest.main()
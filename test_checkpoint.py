@@ -0,0 +1,106 @@
+'''
+Checks that a search saved to a SearchCheckpoint carries on where it was
+stopped.
+
+    python -m unittest test_checkpoint
+'''
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from Final_Solution import Grid, SearchCheckpoint, SolverMetrics, \
+    resume_search
+from Read_in_bff_file import read_bff
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stop(Exception):
+    # stands in for a search that is killed
+    pass
+
+
+def stop_after(calls):
+    # a progress callback that stops the search on its calls-th call
+    seen = []
+
+    def progress(snapshot):
+        seen.append(snapshot)
+        if len(seen) >= calls:
+            raise Stop()
+    return progress
+
+
+def solve(grid, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return grid.find_solution(**kwargs)
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'search.json')
+        self.puzzle = read_bff(os.path.join(HERE, 'mad_7.bff'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def round_trip(self, engine, every):
+        # stops a search, resumes it and returns the position it was
+        # stopped at. the solution of a search without checkpoints:
+        want = solve(Grid(self.puzzle), engine=engine)[2]
+
+        grid = Grid(self.puzzle, SolverMetrics(stop_after(3), every))
+        with self.assertRaises(Stop):
+            solve(grid, engine=engine,
+                  checkpoint=SearchCheckpoint(self.path, every=0.0))
+        state = SearchCheckpoint(self.path).load()
+        self.assertEqual(state['status'], 'running')
+        self.assertEqual(state['engine'], engine)
+        self.assertEqual(state['bff'], self.puzzle.to_bff())
+        position = state['position']
+
+        metrics = SolverMetrics()
+        with contextlib.redirect_stdout(io.StringIO()):
+            config = resume_search(self.path, metrics=metrics)[2]
+        self.assertEqual(tuple(config), tuple(want))
+        state = SearchCheckpoint(self.path).load()
+        self.assertEqual(state['status'], 'solved')
+        self.assertEqual(tuple(state['config']), tuple(want))
+
+        # a finished search is answered from the file
+        metrics = SolverMetrics()
+        with contextlib.redirect_stdout(io.StringIO()):
+            config = resume_search(self.path, metrics=metrics)[2]
+        self.assertEqual(tuple(config), tuple(want))
+        self.assertEqual(metrics.configs_evaluated, 0)
+        # no temporary files are left behind
+        self.assertEqual(os.listdir(self.dir), ['search.json'])
+        return position
+
+    def test_scan(self):
+        self.assertGreater(self.round_trip('scan', 1024)['rank'], 0)
+
+    def test_backtrack(self):
+        self.assertTrue(self.round_trip('backtrack', 16)['path'])
+
+    def test_other_puzzle(self):
+        grid = Grid(self.puzzle)
+        solve(grid, engine='backtrack',
+              checkpoint=SearchCheckpoint(self.path))
+        # the same puzzle with its lasers listed the other way round
+        other = self.puzzle._replace(lasers=self.puzzle.lasers[::-1])
+        with self.assertRaises(ValueError):
+            solve(Grid(other), engine='backtrack',
+                  checkpoint=SearchCheckpoint(self.path))
+        with self.assertRaises(ValueError):
+            solve(Grid(self.puzzle), engine='scan',
+                  checkpoint=SearchCheckpoint(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
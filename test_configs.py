@@ -0,0 +1,121 @@
+'''
+Checks the streams of configurations the solvers walk through.
+
+    python -m unittest test_configs
+'''
+
+import itertools
+import math
+import unittest
+
+from Final_Solution import ConfigStream, GrayConfigStream, multinomial
+
+# block alias lists to permute, with repeats like the puzzles have
+ITEMS = [
+    [],
+    [1],
+    [0, 0, 1],
+    [0, 1, 2, 3],
+    [0, 0, 0, 1, 1, 2],
+    [0, 0, 0, 0, 1, 1, 1, 3],
+    [0, 0, 1, 1, 2, 2, 3],
+]
+
+
+def distinct(items):
+    # every distinct permutation, in lexicographic order
+    return sorted(set(itertools.permutations(items)))
+
+
+class ConfigStreamTest(unittest.TestCase):
+
+    def test_order(self):
+        for items in ITEMS:
+            self.assertEqual(list(ConfigStream(items)), distinct(items),
+                             items)
+
+    def test_total(self):
+        for items in ITEMS:
+            stream = ConfigStream(items)
+            counts = [items.count(val) for val in set(items)]
+            expected = math.factorial(len(items))
+            for count in counts:
+                expected //= math.factorial(count)
+            self.assertEqual(stream.total, expected, items)
+            self.assertEqual(multinomial(counts), expected, items)
+            self.assertEqual(len(stream), expected, items)
+
+    def test_rank_unrank(self):
+        for items in ITEMS:
+            stream = ConfigStream(items)
+            for rank, config in enumerate(distinct(items)):
+                self.assertEqual(stream.unrank(rank), config)
+                self.assertEqual(stream.rank(config), rank)
+            for rank in (-1, stream.total):
+                with self.assertRaises(IndexError):
+                    stream.unrank(rank)
+
+    def test_range(self):
+        items = [0, 0, 0, 1, 1, 2]
+        configs = distinct(items)
+        for start, stop in ((0, 5), (7, 30), (55, None), (59, 200)):
+            self.assertEqual(list(ConfigStream(items, start, stop)),
+                             configs[start:stop], (start, stop))
+
+    def test_send(self):
+        items = [0, 0, 0, 1, 1, 2, 3]
+        configs = distinct(items)
+        for k in range(len(items) - 1):
+            for at in (0, 3, 40, len(configs) // 2):
+                it = iter(ConfigStream(items))
+                seen = [next(it) for _ in range(at + 1)]
+                skipped = it.send(k)
+                rest = list(it)
+                # nothing after the skip shares the first k + 1 items
+                prefix = seen[-1][:k + 1]
+                expected = [config for config in configs[at + 1:]
+                            if config[:k + 1] != prefix]
+                self.assertEqual(rest, expected, (k, at))
+                self.assertEqual(skipped,
+                                 len(configs) - at - 1 - len(expected))
+
+        # a skip past stop ends the stream there
+        it = iter(ConfigStream(items, 0, 10))
+        next(it)
+        self.assertEqual(it.send(0), 9)
+        self.assertEqual(list(it), [])
+
+
+class GrayConfigStreamTest(unittest.TestCase):
+
+    def test_every_permutation_once(self):
+        for items in ITEMS:
+            configs = list(GrayConfigStream(items))
+            self.assertEqual(len(configs), len(set(configs)), items)
+            self.assertEqual(sorted(configs), distinct(items), items)
+            self.assertEqual(len(GrayConfigStream(items)), len(configs))
+
+    def test_one_swap(self):
+        for items in ITEMS:
+            changes = GrayConfigStream(items).changes()
+            last = list(next(changes)[0])
+            for perm, (i, j) in changes:
+                self.assertLess(i, j)
+                diff = [k for k in range(len(perm)) if perm[k] != last[k]]
+                # two spots with different aliases traded places
+                self.assertEqual(diff, [i, j], items)
+                self.assertEqual((perm[i], perm[j]), (last[j], last[i]))
+                last = list(perm)
+
+    def test_start(self):
+        items = [0, 0, 1, 1, 2, 3]
+        for start in distinct(items)[::37]:
+            configs = list(GrayConfigStream(items, start))
+            self.assertEqual(configs[0], start)
+            self.assertEqual(sorted(configs), distinct(items), start)
+        with self.assertRaises(ValueError):
+            GrayConfigStream(items, [0, 1, 1, 2, 3, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+'''
+Checks how a distributed_search Coordinator hands out, takes back and
+finishes its leases.
+
+    python -m unittest test_distributed
+'''
+
+import contextlib
+import io
+import json
+import os
+import socket
+import time
+import unittest
+
+from Final_Solution import Grid
+from distributed_search import Coordinator
+from Read_in_bff_file import read_bff
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def lease_all(coordinator):
+    # lease every range, each to a worker of its own
+    leases = []
+    while True:
+        conn = object()
+        reply = coordinator.handle({'op': 'lease'}, conn)
+        if reply['op'] != 'range':
+            return leases
+        leases.append((reply, conn))
+
+
+class CoordinatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.puzzle = read_bff(os.path.join(HERE, 'mad_1.bff'))
+
+    def test_lease_expiry(self):
+        with Coordinator(self.puzzle, chunks=4,
+                         lease_time=0.05) as coordinator:
+            first = coordinator.handle({'op': 'lease'}, object())
+            time.sleep(0.1)
+            # the expired range goes back to the front of the queue
+            again = coordinator.handle({'op': 'lease'}, object())
+            self.assertEqual((again['start'], again['stop']),
+                             (first['start'], first['stop']))
+            self.assertNotEqual(again['lease'], first['lease'])
+            self.assertEqual(coordinator.status()['reissued'], 1)
+            # the first worker is told to give its range up
+            reply = coordinator.handle({'op': 'progress',
+                                        'lease': first['lease']}, object())
+            self.assertTrue(reply['cancel'])
+            reply = coordinator.handle({'op': 'progress',
+                                        'lease': again['lease']}, object())
+            self.assertFalse(reply['cancel'])
+
+    def test_drop(self):
+        with Coordinator(self.puzzle, chunks=4) as coordinator:
+            conn = object()
+            first = coordinator.handle({'op': 'lease'}, conn)
+            coordinator.drop(conn)
+            again = coordinator.handle({'op': 'lease'}, object())
+            self.assertEqual(again['start'], first['start'])
+            self.assertEqual(coordinator.status()['reissued'], 1)
+
+    def test_cancel_on_solution(self):
+        grid = Grid(self.puzzle)
+        with contextlib.redirect_stdout(io.StringIO()):
+            config = tuple(grid.find_solution()[2])
+        rank = grid.get_configs().rank(config)
+
+        with Coordinator(self.puzzle, chunks=4) as coordinator:
+            leases = lease_all(coordinator)
+            self.assertEqual(len(leases), 4)
+            found = [(reply, conn) for reply, conn in leases
+                     if reply['start'] <= rank < reply['stop']]
+            self.assertEqual(len(found), 1)
+            reply, conn = found[0]
+            # a config that does not solve the puzzle is not accepted
+            other, other_conn = [lease for lease in leases
+                                 if lease[0] is not reply][0]
+            wrong = grid.get_configs().unrank(other['start'])
+            self.assertFalse(grid.is_solution(wrong))
+            answer = coordinator.handle(
+                {'op': 'result', 'lease': other['lease'],
+                 'config': list(wrong)}, other_conn)
+            self.assertFalse(answer['cancel'])
+            self.assertFalse(coordinator.status()['solved'])
+
+            answer = coordinator.handle(
+                {'op': 'result', 'lease': reply['lease'],
+                 'config': list(config)}, conn)
+            self.assertTrue(answer['cancel'])
+            self.assertEqual(coordinator.wait(0), config)
+            # every other worker stops, and no range is handed out
+            for other, other_conn in leases:
+                if other is not reply:
+                    progress = coordinator.handle(
+                        {'op': 'progress', 'lease': other['lease']},
+                        other_conn)
+                    self.assertTrue(progress['cancel'])
+            self.assertEqual(
+                coordinator.handle({'op': 'lease'}, object())['op'], 'done')
+
+    def test_no_solution(self):
+        with Coordinator(self.puzzle, chunks=4) as coordinator:
+            leases = lease_all(coordinator)
+            for reply, conn in leases:
+                coordinator.handle({'op': 'result', 'lease': reply['lease'],
+                                    'config': None}, conn)
+            with self.assertRaises(ValueError):
+                coordinator.wait(0)
+
+    def test_bad_counters(self):
+        with Coordinator(self.puzzle, chunks=4) as coordinator:
+            with socket.create_connection(coordinator.address, 5) as sock:
+                stream = sock.makefile('rwb')
+
+                def ask(message):
+                    stream.write((json.dumps(message) + '\n').encode())
+                    stream.flush()
+                    return json.loads(stream.readline())
+
+                lease = ask({'op': 'lease'})['lease']
+                reply = ask({'op': 'result', 'lease': lease, 'config': None,
+                             'counters': {'configs_evaluated': 5,
+                                          'bogus': 1}})
+                self.assertEqual(reply['op'], 'error')
+                self.assertIn('bogus', reply['error'])
+                # the connection is still served, and nothing was counted
+                self.assertEqual(ask({'op': 'hello'})['op'], 'puzzle')
+                status = coordinator.status()
+                self.assertEqual(status['done'], 0)
+                self.assertEqual(status['configs_evaluated'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+'''
+Checks that the ways of solving a puzzle agree with each other.
+
+    python -m unittest test_engines
+'''
+
+import contextlib
+import glob
+import io
+import itertools
+import os
+import unittest
+
+import numpy as np
+
+from Final_Solution import ENGINES, Grid, TraceCache
+from puzzle_generator import generate_puzzle, passed
+
+# the bundled puzzles
+LEVELS = sorted(glob.glob(os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '*.bff')))
+
+
+def solve(grid, **kwargs):
+    # the solution board and laser path, or None without a solution
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            solution = grid.find_solution(**kwargs)
+    except ValueError:
+        return None
+    return solution[0], solution[1]
+
+
+class EngineAgreementTest(unittest.TestCase):
+    '''
+    Every engine solves every bundled puzzle, and the engines that check
+    configs in get_configs() order find the same solution.
+    '''
+
+    def test_levels(self):
+        self.assertTrue(LEVELS)
+        for fname in LEVELS:
+            configs = {}
+            runs = [('slow', {'slow': True}),
+                    ('cache', {'cache': TraceCache()})]
+            runs += [(engine, {'engine': engine}) for engine in ENGINES]
+            for name, kwargs in runs:
+                grid = Grid(fname)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    board_int, laser_path, config = grid.find_solution(
+                        **kwargs)
+                self.assertTrue(grid.is_solution(config), (fname, name))
+                # the Edge board agrees with the LaserTracer
+                board = grid.config_to_board(config)
+                self.assertTrue(grid.check_solution(
+                    grid.get_laser_path(board)), (fname, name))
+                np.testing.assert_array_equal(
+                    board_int, grid.board_to_int(board))
+                configs[name] = tuple(config)
+
+            for name in ('slow', 'cache', 'numpy'):
+                self.assertEqual(configs[name], configs['scan'],
+                                 (fname, name))
+
+
+class FixedBlockTest(unittest.TestCase):
+    '''
+    Puzzles with A, B and C blocks fixed in the grid.
+    '''
+
+    def puzzles(self, count=60):
+        for seed in range(count):
+            try:
+                yield generate_puzzle(3, 3, (1, 0, 1), (1, 1, 1),
+                                      x_density=0.1, lasers=1, goals=2,
+                                      seed=seed)[0]
+            except ValueError:
+                continue
+
+    def test_laser_path(self):
+        for puzzle in self.puzzles():
+            grid = Grid(puzzle)
+            for config in itertools.islice(grid.get_configs(), 20):
+                board = grid.config_to_board(config)
+                ys, xs = grid.get_laser_path(board).nonzero()
+                self.assertEqual(set(zip(xs.tolist(), ys.tolist())),
+                                 passed(grid, config), (puzzle, config))
+
+    def test_slow_matches_default(self):
+        for puzzle in self.puzzles():
+            grid = Grid(puzzle)
+            fast = solve(grid)
+            slow = solve(grid, slow=True)
+            self.assertEqual(fast is None, slow is None, puzzle)
+            if fast is not None:
+                np.testing.assert_array_equal(fast[0], slow[0])
+                np.testing.assert_array_equal(fast[1], slow[1])
+
+
+
+class ParallelTest(unittest.TestCase):
+    '''
+    find_solution_parallel() returns the solution the serial scan finds,
+    however the configs are split up.
+    '''
+
+    def test_lowest_rank(self):
+        # tiny_5 has 4 solutions, so a worker could find a later one first
+        for name in ('tiny_5.bff', 'mad_1.bff'):
+            fname = [level for level in LEVELS
+                     if os.path.basename(level) == name][0]
+            with contextlib.redirect_stdout(io.StringIO()):
+                serial = Grid(fname).find_solution()[2]
+                for processes, chunks in ((2, None), (3, 7), (2, 280)):
+                    config = Grid(fname).find_solution_parallel(
+                        processes, chunks)[2]
+                    self.assertEqual(tuple(config), tuple(serial),
+                                     (name, processes, chunks))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+'''
+Checks that prove_infeasible() only rules out puzzles that have no
+solution.
+
+    python -m unittest test_infeasible
+'''
+
+import contextlib
+import glob
+import io
+import itertools
+import os
+import random
+import unittest
+
+from Final_Solution import Grid, min_line_cover
+from Read_in_bff_file import parse_bff
+from puzzle_generator import generate_puzzle
+
+# the bundled puzzles
+LEVELS = sorted(glob.glob(os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '*.bff')))
+
+
+def puzzle_text(rows, blocks, lasers, goals):
+    # the text of a bff file
+    lines = ['GRID START'] + [' '.join(row) for row in rows] + ['GRID STOP']
+    lines += blocks
+    lines += ['L %d %d %d %d' % laser for laser in lasers]
+    lines += ['P %d %d' % goal for goal in goals]
+    return '\n'.join(lines) + '\n'
+
+
+def brute_line_cover(points):
+    # fewest diagonal lines through every point, trying every set of lines
+    lines = sorted(set([('+', x + y) for x, y in points] +
+                       [('-', x - y) for x, y in points]))
+    for size in range(len(lines) + 1):
+        for chosen in itertools.combinations(lines, size):
+            chosen = set(chosen)
+            if all(('+', x + y) in chosen or ('-', x - y) in chosen
+                   for x, y in points):
+                return size
+
+
+class ProveInfeasibleTest(unittest.TestCase):
+
+    def test_levels(self):
+        self.assertTrue(LEVELS)
+        for fname in LEVELS:
+            self.assertIsNone(Grid(fname).prove_infeasible(), fname)
+
+    def test_generated(self):
+        shapes = [(3, 3, (2, 0, 0), (0, 0, 0), 1, 3),
+                  (4, 4, (3, 1, 1), (0, 1, 0), 2, 5),
+                  (5, 4, (4, 0, 2), (1, 0, 1), 1, 6),
+                  (6, 6, (2, 2, 0), (0, 0, 0), 3, 8)]
+        checked = 0
+        for width, height, blocks, fixed, lasers, goals in shapes:
+            for seed in range(40):
+                try:
+                    puzzle, config = generate_puzzle(
+                        width, height, blocks, fixed, lasers=lasers,
+                        goals=goals, seed=seed)
+                except ValueError:
+                    continue
+                grid = Grid(puzzle)
+                self.assertTrue(grid.is_solution(config), puzzle)
+                self.assertIsNone(grid.prove_infeasible(), puzzle)
+                checked += 1
+        self.assertGreater(checked, 100)
+
+    def test_too_many_blocks(self):
+        grid = Grid(parse_bff(puzzle_text(
+            ['oo'], ['A 3'], [(0, 1, 1, 1)], [(2, 0)])))
+        self.assertIn('3 blocks for 2 open spots', grid.prove_infeasible())
+
+    def test_unreachable(self):
+        # the only laser runs along x = y, and nothing can turn it
+        grid = Grid(parse_bff(puzzle_text(
+            ['xx', 'xx'], [], [(0, 0, 1, 1)], [(2, 2), (2, 0)])))
+        self.assertEqual(grid.prove_infeasible(),
+                         'goal points [(2, 0)] can not be reached')
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(ValueError) as raised:
+                grid.find_solution()
+        self.assertTrue(str(raised.exception).startswith(
+            'No Solution Found (goal points'))
+        self.assertEqual(grid.metrics.configs_evaluated, 0)
+
+    def test_too_many_lines(self):
+        # every goal point can be reached, but one laser and one A block
+        # travel at most 9 lines and the points lie on 10
+        rows = ['o' * 7] * 7
+        goals = [(x, y) for x in range(3, 12, 2) for y in range(2, 13, 2)]
+        self.assertEqual(min_line_cover(goals), 10)
+        grid = Grid(parse_bff(puzzle_text(rows, ['A 1'], [(0, 1, 1, 1)],
+                                          goals)))
+        self.assertEqual(grid.prove_infeasible(),
+                         'goal points need 10 laser lines, at most 9 '
+                         'possible')
+
+    def test_min_line_cover(self):
+        rng = random.Random(0)
+        self.assertEqual(min_line_cover([]), 0)
+        self.assertEqual(min_line_cover([(1, 1), (2, 2), (5, 5)]), 1)
+        self.assertEqual(min_line_cover([(1, 1), (3, 1), (1, 3), (3, 3)]),
+                         2)
+        for _ in range(200):
+            points = set((rng.randrange(8), rng.randrange(8))
+                         for _ in range(rng.randrange(1, 8)))
+            self.assertEqual(min_line_cover(points),
+                             brute_line_cover(points), points)
+
+
+if __name__ == '__main__':
+    unittest.main()
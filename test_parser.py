@@ -0,0 +1,89 @@
+'''
+Checks that parse_bff() reads the bundled puzzles back from their bff text
+and rejects broken files with the number of the line at fault.
+
+    python -m unittest test_parser
+'''
+
+import glob
+import os
+import unittest
+
+from Read_in_bff_file import parse_bff, read_bff
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LEVELS = sorted(glob.glob(os.path.join(HERE, '*.bff')))
+
+GOOD = '''# a comment
+A 2   # blocks may come first
+GRID START
+o o x
+o B o
+GRID STOP
+L 1 0 1 1
+P 3 2
+'''
+
+
+def broken(line, replace):
+    # GOOD with one line swapped for another, and the line's number
+    lines = GOOD.splitlines()
+    number = lines.index(line) + 1
+    lines[number - 1] = replace
+    return '\n'.join(lines), number
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_good(self):
+        puzzle = parse_bff(GOOD)
+        self.assertEqual(puzzle.grid, ('oox', 'oBo'))
+        self.assertEqual(puzzle.blocks, (('A', 2),))
+        self.assertEqual(puzzle.lasers, ((1, 0, 1, 1),))
+        self.assertEqual(puzzle.goals, ((3, 2),))
+        self.assertEqual(parse_bff(GOOD.encode()), puzzle)
+
+    def test_round_trip(self):
+        self.assertTrue(LEVELS)
+        for fname in LEVELS:
+            puzzle = read_bff(fname)
+            self.assertEqual(parse_bff(puzzle.to_bff()), puzzle, fname)
+
+    def assertBadLine(self, line, replace, message):
+        text, number = broken(line, replace)
+        with self.assertRaises(ValueError) as raised:
+            parse_bff(text)
+        error = str(raised.exception)
+        self.assertIn('line %d' % number, error)
+        self.assertIn(message, error)
+
+    def test_bad_grid_character(self):
+        self.assertBadLine('o B o', 'o q o', "'q'")
+
+    def test_uneven_grid(self):
+        self.assertBadLine('o B o', 'o B o o', 'first row is 3')
+        self.assertBadLine('o B o', 'o B', 'first row is 3')
+
+    def test_unknown_line(self):
+        self.assertBadLine('P 3 2', 'Q 3', "'Q 3'")
+
+    def test_bad_block_count(self):
+        self.assertBadLine('A 2   # blocks may come first', 'A two',
+                           'A count')
+        self.assertBadLine('A 2   # blocks may come first', 'A -1',
+                           'Negative block count')
+
+    def test_bad_laser(self):
+        self.assertBadLine('L 1 0 1 1', 'L 1 0 1', 'L x y vx vy')
+        self.assertBadLine('L 1 0 1 1', 'L 1 0 2 1', 'not 1 or -1')
+
+    def test_bad_goal(self):
+        self.assertBadLine('P 3 2', 'P 3 x', 'P x y')
+
+    def test_no_grid(self):
+        with self.assertRaises(ValueError):
+            parse_bff('A 2\nL 1 0 1 1\nP 3 2\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
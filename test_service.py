@@ -0,0 +1,98 @@
+'''
+Checks the HTTP answers of lazor_service.py.
+
+    python -m unittest test_service
+'''
+
+import json
+import os
+import socket
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from lazor_service import SolverService, make_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class ServiceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.service = SolverService(workers=1, timeout=30.0)
+        cls.server = make_server(cls.service, port=0)
+        cls.port = cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever,
+                         daemon=True).start()
+        with open(os.path.join(HERE, 'tiny_5.bff')) as file:
+            cls.bff = file.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.service.close()
+
+    def post(self, body, content_type='application/json'):
+        # (HTTP status, decoded JSON answer)
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        request = urllib.request.Request(
+            'http://127.0.0.1:%d/solve' % self.port, body,
+            {'Content-Type': content_type})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as reply:
+                return reply.status, json.loads(reply.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_solved(self):
+        code, record = self.post({'bff': self.bff, 'timeout': '20',
+                                  'engine': 'scan'})
+        self.assertEqual((code, record['status']), (200, 'solved'))
+        code, record = self.post(self.bff.encode(), 'text/plain')
+        self.assertEqual((code, record['status']), (200, 'solved'))
+
+    def test_bad_timeout(self):
+        for timeout in ('abc', -1, 0, 'nan', 'inf', True, [1], {}):
+            code, record = self.post({'bff': self.bff, 'timeout': timeout})
+            self.assertEqual(code, 400, timeout)
+            self.assertEqual(record['status'], 'error')
+
+    def test_bad_engine(self):
+        for engine in ('warp', 3, ['scan']):
+            code, record = self.post({'bff': self.bff, 'engine': engine})
+            self.assertEqual(code, 400, engine)
+            self.assertEqual(record['status'], 'error')
+
+    def test_bad_request(self):
+        for body in (b'{not json', json.dumps({'timeout': 1}).encode(),
+                     json.dumps([self.bff]).encode()):
+            code, record = self.post(body)
+            self.assertEqual((code, record['status']), (400, 'error'))
+
+    def test_bad_length(self):
+        for length in (None, 'abc', '-1', '1.5', ''):
+            with socket.create_connection(('127.0.0.1', self.port),
+                                          10) as sock:
+                head = 'POST /solve HTTP/1.0\r\n'
+                if length is not None:
+                    head += 'Content-Length: %s\r\n' % length
+                sock.sendall((head + '\r\n').encode())
+                reply = sock.makefile('rb').read().decode()
+            status, body = reply.split('\r\n\r\n', 1)
+            self.assertIn(' 400 ', status.splitlines()[0], length)
+            record = json.loads(body)
+            self.assertEqual(record['status'], 'error')
+            self.assertIn('Content-Length', record['error'])
+
+    def test_bad_bff(self):
+        code, record = self.post({'bff': 'GRID START\nGRID STOP\n'})
+        self.assertEqual((code, record['status']), (400, 'error'))
+        code, record = self.post({'bff': self.bff + 'L 1 2\n'})
+        self.assertEqual((code, record['status']), (400, 'error'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+'''
+Checks the searches that find every solution of a puzzle, and the
+budgeted solve_anytime().
+
+    python -m unittest test_solutions
+'''
+
+import glob
+import os
+import unittest
+
+from Final_Solution import Grid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# the bundled puzzles
+LEVELS = sorted(glob.glob(os.path.join(HERE, '*.bff')))
+# how many configs solve each bundled puzzle
+SOLUTIONS = {'tiny_5.bff': 4}
+ENGINES = ('backtrack', 'bestfirst', 'scan')
+
+
+def record_checks(grid):
+    # the configs the grid places from now on, in order
+    checked = []
+    place_cells = grid.compiled.place_cells
+
+    def recording(config):
+        checked.append(tuple(config))
+        return place_cells(config)
+    grid.compiled.place_cells = recording
+    return checked
+
+
+def anytime_walk(grid, **budget):
+    # solve_anytime() from rank 0 until every config was checked, and the
+    # solutions it found on the way
+    solved = []
+    cursor = 0
+    while cursor is not None:
+        result = grid.solve_anytime(cursor=cursor, **budget)
+        if result.solved:
+            solved.append(result.config)
+        cursor = result.cursor
+    return solved
+
+
+class SolutionsTest(unittest.TestCase):
+
+    def test_count(self):
+        self.assertTrue(LEVELS)
+        for fname in LEVELS:
+            expected = SOLUTIONS.get(os.path.basename(fname), 1)
+            for engine in ENGINES:
+                self.assertEqual(Grid(fname).count_solutions(engine),
+                                 expected, (fname, engine))
+
+    def test_iter(self):
+        for fname in LEVELS:
+            grid = Grid(fname)
+            found = {}
+            for engine in ENGINES:
+                configs = list(grid.iter_solutions(engine))
+                self.assertEqual(len(configs), len(set(configs)),
+                                 (fname, engine))
+                for config in configs:
+                    self.assertTrue(grid.is_solution(config),
+                                    (fname, engine, config))
+                found[engine] = sorted(configs)
+            self.assertEqual(len(found['scan']),
+                             SOLUTIONS.get(os.path.basename(fname), 1))
+            self.assertEqual(found['backtrack'], found['scan'], fname)
+            self.assertEqual(found['bestfirst'], found['scan'], fname)
+
+    def test_iter_parallel(self):
+        grid = Grid(os.path.join(HERE, 'tiny_5.bff'))
+        self.assertEqual(list(grid.iter_solutions('scan', processes=2)),
+                         list(grid.iter_solutions('scan')))
+        self.assertEqual(grid.count_solutions('scan', processes=2), 4)
+
+    def test_anytime_resume(self):
+        for name in ('tiny_5.bff', 'mad_1.bff', 'showstopper_4.bff'):
+            grid = Grid(os.path.join(HERE, name))
+            checked = record_checks(grid)
+            whole = anytime_walk(grid)
+            expected = list(checked)
+            del checked[:]
+            # small budgets check the same configs, each once
+            for budget in (1, 5, 16):
+                pieces = anytime_walk(grid, max_configs=budget)
+                self.assertEqual(checked, expected, (name, budget))
+                self.assertEqual(pieces, whole, (name, budget))
+                del checked[:]
+            self.assertEqual(len(set(expected)), len(expected), name)
+            self.assertEqual(sorted(whole),
+                             sorted(grid.iter_solutions('scan')), name)
+
+    def test_anytime_best(self):
+        grid = Grid(os.path.join(HERE, 'mad_1.bff'))
+        result = grid.solve_anytime(max_configs=1)
+        self.assertFalse(result.solved)
+        self.assertIsNotNone(result.cursor)
+        self.assertLessEqual(result.hits, result.goals)
+        self.assertEqual(result.config, grid.get_configs().unrank(0))
+        result = grid.solve_anytime()
+        self.assertTrue(result.solved)
+        self.assertEqual(result.hits, result.goals)
+        self.assertTrue(grid.is_solution(result.config))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+'''
+Checks that a SolutionStore keeps solutions by puzzle content, and that
+batch_solve.py and lazor_service.py search again for a stored config that
+does not solve its puzzle.
+
+    python -m unittest test_store
+'''
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from Final_Solution import Grid
+from Read_in_bff_file import parse_bff, read_bff
+from batch_solve import solve_file
+from lazor_service import SolverService
+from solution_store import SolutionStore
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def solution(puzzle):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return tuple(Grid(puzzle).find_solution()[2])
+
+
+def wrong_config(puzzle):
+    # a config of the right size that does not solve the puzzle
+    grid = Grid(puzzle)
+    for config in grid.get_configs():
+        if not grid.is_solution(config):
+            return config
+
+
+class SolutionStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'solutions.db')
+        self.puzzle = read_bff(os.path.join(HERE, 'mad_1.bff'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        config = solution(self.puzzle)
+        with SolutionStore(self.path) as store:
+            self.assertIsNone(store.get(self.puzzle))
+            store.put(self.puzzle, config)
+            self.assertEqual(store.get(self.puzzle), config)
+        # read back from the file by a new store
+        with SolutionStore(self.path) as store:
+            self.assertEqual(len(store), 1)
+            self.assertIn(self.puzzle, store)
+            self.assertEqual(store.get(self.puzzle.to_bff()), config)
+            store.discard(self.puzzle)
+            self.assertIsNone(store.get(self.puzzle))
+
+    def test_no_solution(self):
+        with SolutionStore(self.path) as store:
+            store.put(self.puzzle, None, "No Solution Found (checked)")
+        with SolutionStore(self.path) as store:
+            with self.assertRaises(ValueError) as raised:
+                store.get(self.puzzle)
+            self.assertEqual(str(raised.exception),
+                             "No Solution Found (checked)")
+
+    def test_bad_config(self):
+        store = SolutionStore()
+        with self.assertRaises(ValueError):
+            store.put(self.puzzle, (1, 2))
+        self.assertEqual(len(store), 0)
+
+    def test_counters(self):
+        store = SolutionStore()
+        store.get(self.puzzle)
+        store.put(self.puzzle, solution(self.puzzle))
+        store.get(self.puzzle)
+        store.get(self.puzzle)
+        self.assertEqual((store.hits, store.misses), (2, 1))
+
+    def test_same_digest(self):
+        # comments, spacing and the order of lines and entries do not count
+        text = self.puzzle.to_bff()
+        lines = text.splitlines()
+        grid = lines[:lines.index('GRID STOP') + 1]
+        rest = lines[len(grid):]
+        shuffled = '\n'.join(['# the same puzzle'] + rest[::-1] +
+                             ['  ' + line + '  # row' for line in grid] +
+                             rest[-1:])
+        other = parse_bff(shuffled)
+        self.assertNotEqual(other, self.puzzle)
+        self.assertEqual(other.digest(), self.puzzle.digest())
+        store = SolutionStore()
+        store.put(self.puzzle, solution(self.puzzle))
+        self.assertEqual(store.get(other), solution(self.puzzle))
+        # a different puzzle is not
+        changed = self.puzzle._replace(goals=self.puzzle.goals[1:])
+        self.assertNotEqual(changed.digest(), self.puzzle.digest())
+        self.assertIsNone(store.get(changed))
+
+    def test_stale_batch(self):
+        fname = os.path.join(HERE, 'mad_1.bff')
+        with SolutionStore(self.path) as store:
+            store.put(self.puzzle, wrong_config(self.puzzle))
+        record = solve_file((fname, None, 'scan', self.path, False, None))
+        self.assertEqual(record['status'], 'solved')
+        self.assertFalse(record['cached'])
+        self.assertEqual(tuple(record['config']), solution(self.puzzle))
+        # the search replaced the entry
+        with SolutionStore(self.path) as store:
+            self.assertEqual(store.get(self.puzzle), solution(self.puzzle))
+
+    def test_stale_service(self):
+        store = SolutionStore()
+        store.put(self.puzzle, wrong_config(self.puzzle))
+        service = SolverService(workers=1, store=store)
+        try:
+            record = service.submit(self.puzzle.to_bff(), engine='scan')
+            self.assertEqual(record['status'], 'solved')
+            self.assertFalse(record.get('cached'))
+            self.assertEqual(tuple(record['config']), solution(self.puzzle))
+            record = service.submit(self.puzzle.to_bff(), engine='scan')
+            self.assertTrue(record['cached'])
+        finally:
+            service.close()
+
+
+if __name__ == '__main__':
+    unittest.main()